@@ -0,0 +1,289 @@
+# admission.py — admission control and load shedding for the expensive endpoints
+#
+# A search fans out to dozens of blocking upstream calls on FastAPI's threadpool
+# (40 threads by default). Without a limit a burst of searches takes every thread and
+# /api/health, /api/favorites, ... queue behind them. AdmissionMiddleware puts each
+# expensive route in its own bulkhead, before any thread is used:
+#
+#   Rule("search", "POST", "/api/hotels/search", concurrency=8, queue=16,
+#        user_rate=1.0, user_burst=5, ip_rate=2.0, ip_burst=10)
+#
+#   - at most `concurrency` requests of the rule run at once; up to `queue` more wait
+#     (FIFO) for at most `queue_timeout` seconds (and never past the request deadline)
+#   - a full queue or a queue timeout -> 503 + Retry-After, answered immediately
+#   - per-user (bearer token) and per-IP token buckets -> 429 + Retry-After. The IP is
+#     the TCP peer; X-Forwarded-For is only read when the peer is one of
+#     ADMISSION_TRUSTED_PROXIES (then the right-most untrusted hop is the client), so a
+#     client cannot pick a fresh IP per request by sending the header itself
+#   - routes without a rule are not touched, so cheap endpoints keep the rest of the
+#     threadpool (threads - sum of rule concurrencies)
+#
+# Metrics: admission_total{rule,outcome=admitted|queued|shed|timeout|rate_limited},
+#          admission_queue_seconds{rule}
+# Config (env): ADMISSION_ENABLED, ADMISSION_SEARCH_CONCURRENCY, ADMISSION_SEARCH_QUEUE,
+#   ADMISSION_BATCH_CONCURRENCY, ADMISSION_BATCH_QUEUE, ADMISSION_QUEUE_TIMEOUT,
+#   ADMISSION_USER_RATE, ADMISSION_USER_BURST, ADMISSION_IP_RATE, ADMISSION_IP_BURST,
+#   ADMISSION_TRUSTED_PROXIES (comma separated IPs / CIDRs, e.g. "127.0.0.1,10.0.0.0/8")
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import ipaddress
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+import deadline
+from tracing import counter, histogram
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1").lower() not in ("0", "false", "no")
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2"))
+ADMISSION_SEARCH_CONCURRENCY = int(os.getenv("ADMISSION_SEARCH_CONCURRENCY", "8"))
+ADMISSION_SEARCH_QUEUE = int(os.getenv("ADMISSION_SEARCH_QUEUE", "16"))
+ADMISSION_BATCH_CONCURRENCY = int(os.getenv("ADMISSION_BATCH_CONCURRENCY", "2"))
+ADMISSION_BATCH_QUEUE = int(os.getenv("ADMISSION_BATCH_QUEUE", "4"))
+ADMISSION_USER_RATE = float(os.getenv("ADMISSION_USER_RATE", "1"))      # requests / second
+ADMISSION_USER_BURST = float(os.getenv("ADMISSION_USER_BURST", "5"))
+ADMISSION_IP_RATE = float(os.getenv("ADMISSION_IP_RATE", "2"))
+ADMISSION_IP_BURST = float(os.getenv("ADMISSION_IP_BURST", "10"))
+ADMISSION_TRUSTED_PROXIES = os.getenv("ADMISSION_TRUSTED_PROXIES", "")
+
+ADMISSION_TOTAL = counter("admission_total", "Admission decisions per rule")
+ADMISSION_QUEUE_SECONDS = histogram("admission_queue_seconds", "Time spent waiting for a bulkhead slot")
+
+
+# ---------- token buckets ----------
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> Tuple[bool, float]:
+        """(allowed, seconds until a token is available)."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (1 - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+class BucketMap:
+    """key -> TokenBucket, LRU-bounded so one scan of random IPs cannot grow it forever."""
+
+    def __init__(self, rate: float, burst: float, maxsize: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str) -> Tuple[bool, float]:
+        if self.rate <= 0:
+            return True, 0.0
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is None:
+                b = self._buckets[key] = TokenBucket(self.rate, self.burst)
+                if len(self._buckets) > self.maxsize:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return b.take()
+
+
+# ---------- bulkhead ----------
+class Bulkhead:
+    """Concurrency limit + bounded FIFO wait queue. Waiters are plain futures of the
+    running loop, so one instance works across event loops (tests, benchmarks)."""
+
+    def __init__(self, limit: int, queue: int):
+        self.limit = max(1, limit)
+        self.queue = max(0, queue)
+        self.active = 0
+        self._waiters: deque = deque()
+        self._service = 0.5  # EWMA of seconds per request, for Retry-After
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: Optional[float]) -> str:
+        """"admitted" | "queued" (got a slot after waiting) | "shed" | "timeout"."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return "admitted"
+        if len(self._waiters) >= self.queue or (timeout is not None and timeout <= 0):
+            return "shed"
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout)
+            return "queued"  # slot handed over by release()
+        except asyncio.TimeoutError:
+            if fut.done():
+                return "queued"  # handed over just as the timeout fired
+            fut.cancel()
+            return "timeout"
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release(0.0)  # got a slot but the client went away: pass it on
+            else:
+                fut.cancel()
+            raise
+        finally:
+            if fut in self._waiters:
+                self._waiters.remove(fut)
+
+    def release(self, seconds: float):
+        self._service = 0.8 * self._service + 0.2 * seconds
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(True)  # slot passes straight to the next waiter
+                return
+        self.active -= 1
+
+    def retry_after(self) -> int:
+        # time to drain the queue ahead of a new request, at least 1 s
+        return max(1, math.ceil(self._service * (self.waiting + 1) / self.limit))
+
+
+# ---------- rules ----------
+class Rule:
+    def __init__(self, name: str, method: str, path: str, concurrency: int, queue: int,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+                 user_rate: float = 0, user_burst: float = 1,
+                 ip_rate: float = 0, ip_burst: float = 1):
+        self.name = name
+        self.method = method.upper()
+        self.path = path.rstrip("/")
+        self.queue_timeout = queue_timeout
+        self.bulkhead = Bulkhead(concurrency, queue)
+        self.users = BucketMap(user_rate, user_burst)
+        self.ips = BucketMap(ip_rate, ip_burst)
+
+    def matches(self, method: str, path: str) -> bool:
+        return method == self.method and path.rstrip("/") == self.path
+
+def default_rules() -> List[Rule]:
+    return [
+        Rule("search", "POST", "/api/hotels/search",
+             ADMISSION_SEARCH_CONCURRENCY, ADMISSION_SEARCH_QUEUE,
+             user_rate=ADMISSION_USER_RATE, user_burst=ADMISSION_USER_BURST,
+             ip_rate=ADMISSION_IP_RATE, ip_burst=ADMISSION_IP_BURST),
+        Rule("search_batch", "POST", "/api/hotels/search/batch",
+             ADMISSION_BATCH_CONCURRENCY, ADMISSION_BATCH_QUEUE,
+             user_rate=ADMISSION_USER_RATE / 4, user_burst=2,
+             ip_rate=ADMISSION_IP_RATE / 4, ip_burst=4),
+    ]
+
+
+# ---------- ASGI middleware ----------
+class TrustedProxies:
+    """The networks whose X-Forwarded-For we believe (load balancer, reverse proxy)."""
+
+    def __init__(self, spec: str = ADMISSION_TRUSTED_PROXIES):
+        self.networks = [ipaddress.ip_network(p.strip(), strict=False)
+                         for p in spec.split(",") if p.strip()]
+
+    def __contains__(self, ip: str) -> bool:
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        return any(addr in net for net in self.networks)
+
+    def client_ip(self, peer: str, forwarded_for: Optional[str]) -> str:
+        if not forwarded_for or peer not in self:
+            return peer
+        # each proxy appends the address it got the request from: walk back from the
+        # right past our own proxies; everything left of the first foreign hop is
+        # client-controlled and ignored
+        hops = [h.strip() for h in forwarded_for.split(",") if h.strip()]
+        for hop in reversed(hops):
+            if hop not in self:
+                return hop
+        return hops[0] if hops else peer
+
+def _client_keys(scope, proxies: TrustedProxies) -> Tuple[Optional[str], str]:
+    user, forwarded = None, []
+    for name, value in scope.get("headers") or []:
+        if name == b"authorization" and value[:7].lower() == b"bearer ":
+            # the token identifies the session; hash it so it never sits in memory maps
+            user = hashlib.sha1(value[7:].strip()).hexdigest()
+        elif name == b"x-forwarded-for":
+            forwarded.append(value.decode("latin-1"))
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    return user, proxies.client_ip(peer, ",".join(forwarded))
+
+async def _reject(send, status: int, detail: str, retry_after: float):
+    body = json.dumps({"detail": detail}).encode()
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        (b"cache-control", b"no-store"),
+    ]})
+    await send({"type": "http.response.body", "body": body})
+
+class AdmissionMiddleware:
+    def __init__(self, app, rules: Optional[List[Rule]] = None, enabled: bool = ADMISSION_ENABLED,
+                 trusted_proxies: Optional[TrustedProxies] = None):
+        self.app = app
+        self.rules = rules if rules is not None else default_rules()
+        self.enabled = enabled
+        self.proxies = trusted_proxies if trusted_proxies is not None else TrustedProxies()
+
+    def rule_for(self, scope) -> Optional[Rule]:
+        method, path = scope.get("method", ""), scope.get("path", "")
+        for r in self.rules:
+            if r.matches(method, path):
+                return r
+        return None
+
+    async def __call__(self, scope, receive, send):
+        rule = self.rule_for(scope) if self.enabled and scope["type"] == "http" else None
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        user, ip = _client_keys(scope, self.proxies)
+        for buckets, key in ((rule.users, user), (rule.ips, ip)):
+            if key is None:
+                continue
+            ok, wait_s = buckets.take(key)
+            if not ok:
+                ADMISSION_TOTAL.inc(rule=rule.name, outcome="rate_limited")
+                await _reject(send, 429, "Prea multe căutări, încearcă din nou în curând.", wait_s)
+                return
+
+        timeout = rule.queue_timeout
+        left = deadline.remaining()
+        if left is not None:
+            timeout = min(timeout, left)
+        t0 = time.perf_counter()
+        outcome = await rule.bulkhead.acquire(timeout)
+        ADMISSION_QUEUE_SECONDS.observe(time.perf_counter() - t0, rule=rule.name)
+        ADMISSION_TOTAL.inc(rule=rule.name, outcome=outcome)
+        if outcome in ("shed", "timeout"):
+            await _reject(send, 503, "Serverul este ocupat, încearcă din nou.", rule.bulkhead.retry_after())
+            return
+
+        t1 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            rule.bulkhead.release(time.perf_counter() - t1)
+
+    def status(self) -> Dict[str, Dict[str, int]]:
+        return {r.name: {"active": r.bulkhead.active, "waiting": r.bulkhead.waiting,
+                         "limit": r.bulkhead.limit, "queue": r.bulkhead.queue} for r in self.rules}
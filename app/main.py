@@ -11,16 +11,23 @@ import os
 # Add the parent directory to the path so we can import our existing files
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.models.models import get_db, create_tables, User, UserPreferences, SavedBooking, SearchHistory
+from app.models.models import get_db, create_tables, engine, router, SessionLocal, User, UserPreferences, SavedBooking, SearchHistory
 from app.services.auth import (
     authenticate_user, create_user, create_access_token, 
     get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
 )
 
 # Import your existing functionality
-from baza import cauta_oferte_hoteluri, obtine_hoteluri_oras, obtine_city_code_hotel
 from new_transport import cel_mai_apropiat_transport #functia veche in caz ca nu merge!!!!
-from schimb_euro import convert_to_euro
+from applog import RequestIdMiddleware, setup_logging
+from deadline import DeadlineExceeded, DeadlineMiddleware, is_partial
+from search_engine import CityNotFound, NoHotels, SearchEngine, SearchQuery, transit_enricher
+from readiness import Readiness, prime_amadeus, prime_db_pool, prime_fx, prime_gmaps
+from snapshot import get_snapshotter, restore_and_schedule
+from history_store import RetentionWorker
+from app.services import retention
+
+setup_logging()  # JSON lines on stderr from a background thread (LOG_LEVEL, LOG_FORMAT)
 
 app = FastAPI(
     title="Vacation Booking API",
@@ -37,6 +44,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request time budget for upstream calls (X-Request-Deadline-Ms / SEARCH_DEADLINE_MS)
+app.add_middleware(DeadlineMiddleware)
+
+# X-Request-ID in/out; every log line of the request carries it
+app.add_middleware(RequestIdMiddleware)
+
 # Security
 security = HTTPBearer()
 
@@ -101,10 +114,33 @@ def get_current_user_optional(
     except HTTPException:
         return None
 
+# Same pipeline as server.py and the baza.py CLI; transit info from new_transport
+search_engine = SearchEngine(enrichers=[transit_enricher(cel_mai_apropiat_transport)])
+
+# Warm-up before the load balancer sends traffic (see readiness.py)
+readiness = Readiness()
+readiness.register("db_pool", lambda: prime_db_pool(engine))
+# replicas are optional: one that is down only sends its reads back to the primary
+readiness.register("db_replicas", router.probe_replicas, required=False)
+readiness.register("amadeus_token", prime_amadeus, required=False)
+readiness.register("gmaps_connection", prime_gmaps, required=False)
+readiness.register("fx_rates", prime_fx, required=False)
+readiness.register("cache_snapshot", restore_and_schedule, required=False)
+# search_history rollups + raw-window purge (app/services/retention.py)
+history_retention = RetentionWorker(lambda: retention.run(SessionLocal), name="search-history-retention")
+readiness.register("history_retention", history_retention.run_and_schedule, required=False)
+
 @app.on_event("startup")
 async def startup_event():
-    """Create database tables on startup"""
+    """Create database tables on startup, then warm connections in the background"""
     create_tables()
+    readiness.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Write a last cache snapshot so the next worker starts warm"""
+    get_snapshotter().stop()
+    history_retention.stop()
 
 # Authentication endpoints
 @app.post("/auth/register", response_model=UserResponse)
@@ -154,86 +190,41 @@ async def search_hotels(
 ):
     """Search hotels - works for both guest and authenticated users"""
     try:
-        # Get city code
-        city_code = obtine_city_code_hotel(search_data.city)
-        if not city_code:
-            raise HTTPException(status_code=404, detail="City not found")
-        
-        # Get hotel IDs
-        hotel_ids = obtine_hoteluri_oras(city_code)
-        if not hotel_ids:
-            raise HTTPException(status_code=404, detail="No hotels found")
-        
-        # Search hotels using your existing function
         check_in_str = search_data.check_in.isoformat()
         check_out_str = search_data.check_out.isoformat()
-        
-        # Modified version of your hotel search to return data instead of printing
-        hotels = []
-        count = 0
-        
-        for hotel_id in hotel_ids:
-            if count >= 5:  # Limit results
-                break
-                
-            try:
-                from amadeus import Client
-                amadeus = Client(
-                    client_id=os.getenv("AMADEUS_CLIENT_ID"),
-                    client_secret=os.getenv("AMADEUS_CLIENT_SECRET")
-                )
-                
-                response = amadeus.shopping.hotel_offers_search.get(
-                    hotelIds=hotel_id,
-                    checkInDate=check_in_str,
-                    checkOutDate=check_out_str,
-                    adults=search_data.adults
-                )
-                
-                if response.data:
-                    for oferta in response.data:
-                        hotel = oferta["hotel"]
-                        name = hotel["name"]
-                        
-                        if "offers" in oferta and oferta["offers"]:
-                            price = oferta["offers"][0]["price"]["total"]
-                            rating = hotel.get("rating", "N/A")
-                            website = hotel.get("website", "N/A")
-                            currency = oferta["offers"][0]["price"]["currency"]
-                            price_eur = round(convert_to_euro(float(price), currency), 2)
-                            
-                            if price_eur <= search_data.budget_eur:
-                                hotel_data = {
-                                    "hotel_id": hotel_id,
-                                    "name": name,
-                                    "city": search_data.city,
-                                    "price_eur": price_eur,
-                                    "rating": rating,
-                                    "website": website,
-                                    "latitude": None,
-                                    "longitude": None,
-                                    "transport_info": None
-                                }
-                                
-                                # Get coordinates and transport info
-                                geo = hotel.get("geoCode")
-                                if geo:
-                                    lat = geo["latitude"]
-                                    lon = geo["longitude"]
-                                    hotel_data["latitude"] = lat
-                                    hotel_data["longitude"] = lon
-                                    
-                                    # Get transport info using your existing function
-                                    transport_info = cel_mai_apropiat_transport(lat, lon)
-                                    hotel_data["transport_info"] = transport_info
-                                
-                                hotels.append(hotel_data)
-                                count += 1
-                                
-                                if count >= 5:
-                                    break
-            except Exception as e:
-                continue
+
+        # Shared search pipeline (search_engine.py): first 5 priced hotels within budget
+        query = SearchQuery(
+            search_data.city, check_in_str, check_out_str,
+            adults=search_data.adults,
+            budget=search_data.budget_eur,
+            limit=5,
+            require_price=True,
+        )
+        try:
+            result = search_engine.run(query)
+        except CityNotFound:
+            raise HTTPException(status_code=404, detail="City not found")
+        except NoHotels:
+            raise HTTPException(status_code=404, detail="No hotels found")
+        except DeadlineExceeded:
+            # request budget spent while resolving the city; X-Partial: 1 is set by DeadlineMiddleware
+            raise HTTPException(status_code=504, detail="Request deadline exceeded")
+
+        hotels = [
+            {
+                "hotel_id": offer.hotel_id,
+                "name": offer.name,
+                "city": search_data.city,
+                "price_eur": offer.price_eur,
+                "rating": offer.hotel.get("rating", "N/A"),
+                "website": offer.hotel.get("website", "N/A"),
+                "latitude": offer.latitude,
+                "longitude": offer.longitude,
+                "transport_info": offer.transit,
+            }
+            for offer in result.offers
+        ]
         
         # Save search history for logged-in users
         if current_user:
@@ -252,9 +243,12 @@ async def search_hotels(
         return {
             "hotels": hotels,
             "search_id": search_record.id if current_user else None,
-            "user_authenticated": current_user is not None
+            "user_authenticated": current_user is not None,
+            "partial": is_partial()
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
 
@@ -319,10 +313,27 @@ async def get_saved_bookings(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting bookings: {str(e)}")
 
+@app.get("/history")
+async def get_search_history(
+    days: int = 30,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Recent searches (raw window) plus per-day counts from the rollups - requires authentication"""
+    try:
+        return retention.user_history(db, current_user.id, days=min(max(days, 1), 366))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting history: {str(e)}")
+
 @app.get("/")
 async def root():
     return {"message": "Vacation Booking API with Authentication!"}
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy", "db_replicas": router.status()}
+
+@app.get("/ready")
+async def ready_check():
+    """503 until the startup warm-up has finished (per-dependency status and timings)"""
+    return readiness.response()
\ No newline at end of file
@@ -0,0 +1,198 @@
+# app/models/routing.py — primary / read-replica routing for the SQLAlchemy session
+#
+# One primary engine (DATABASE_URL) and zero or more replicas (DATABASE_REPLICA_URLS,
+# comma separated). RoutingSession picks the engine per statement:
+#
+#   - INSERT / UPDATE / DELETE, flushes and SELECT ... FOR UPDATE -> primary
+#   - once a session has written, everything after it in that session -> primary
+#   - per endpoint: get_db() opens a read session for GET / HEAD requests (reads go to
+#     a healthy replica) and a primary session for everything else, as before
+#   - per query: `with db.primary(): ...` pins single queries of a read session
+#   - read-your-writes: a commit that wrote data makes the actor (username / email the
+#     request acts for, see bind_actor) read from the primary for DB_READ_YOUR_WRITES_SECONDS.
+#     Stickiness lives in the "db_sticky" cache namespace, so it is shared by every
+#     worker when CACHE_BACKEND=redis.
+#   - a replica that fails with a disconnect is taken out of rotation and probed again
+#     (SELECT 1) after DB_REPLICA_RETRY_SECONDS; with none healthy reads go to the primary
+#
+# With no replicas configured every statement goes to the primary, exactly as before.
+#
+# Local test with two SQLite files (or two PostgreSQL instances):
+#   DATABASE_URL=sqlite:///primary.db DATABASE_REPLICA_URLS=sqlite:///replica.db
+#
+# Config (env): DATABASE_URL, DATABASE_REPLICA_URLS, DB_READ_YOUR_WRITES_SECONDS,
+#   DB_REPLICA_RETRY_SECONDS
+
+from __future__ import annotations
+
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+from cache import get_cache
+from tracing import counter
+
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+DB_REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", "10"))
+
+DB_ROUTED = counter("db_statements_routed_total", "Statements per target engine")
+DB_REPLICA_DOWN = counter("db_replica_down_total", "Replicas taken out of rotation")
+
+def bind_actor(session: Session, *keys: Optional[str]):
+    """Record who the request acts for (username, email) on its session. Kept on the
+    session, not in a contextvar: FastAPI runs sync dependencies in worker threads."""
+    actors = session.info.setdefault("actors", set())
+    actors.update(k.casefold() for k in keys if k)
+
+def replica_urls() -> List[str]:
+    return [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+
+
+# ---------- replicas ----------
+class Replica:
+    def __init__(self, name: str, engine):
+        self.name = name
+        self.engine = engine
+        self.down_until = 0.0
+        self._probing = threading.Lock()
+
+    @property
+    def healthy(self) -> bool:
+        return not self.down_until
+
+    def due(self) -> bool:
+        """Down, and the retry window has passed."""
+        return bool(self.down_until) and time.monotonic() >= self.down_until
+
+    def mark_down(self):
+        if self.healthy:
+            DB_REPLICA_DOWN.inc(replica=self.name)
+        self.down_until = time.monotonic() + DB_REPLICA_RETRY_SECONDS
+
+    def probe(self) -> bool:
+        try:
+            with self.engine.connect() as c:
+                c.execute(text("SELECT 1"))
+        except Exception:
+            self.mark_down()
+            return False
+        self.down_until = 0.0
+        return True
+
+
+class DatabaseRouter:
+    def __init__(self, primary_url: str, replica_urls: Sequence[str] = (), **engine_kw):
+        self.primary = create_engine(primary_url, **engine_kw)
+        self.replicas = [Replica(f"replica{i}", create_engine(url, **engine_kw))
+                         for i, url in enumerate(replica_urls)]
+        self._rr = itertools.count()
+        self._sticky = get_cache("db_sticky")
+        for r in self.replicas:
+            self._watch(r)
+
+    def _watch(self, replica: Replica):
+        @event.listens_for(replica.engine, "handle_error")
+        def _on_error(ctx):
+            # dropped connection / refused connect: stop sending reads there for a while
+            if ctx.is_disconnect or ctx.connection is None:
+                replica.mark_down()
+
+    def reader(self):
+        """A healthy replica engine (round robin), else the primary."""
+        n = len(self.replicas)
+        for _ in range(n):
+            r = self.replicas[next(self._rr) % n]
+            if r.healthy:
+                return r.engine
+            # back in rotation only after a SELECT 1 succeeds; one thread probes,
+            # the others keep reading from the primary meanwhile
+            if r.due() and r._probing.acquire(blocking=False):
+                try:
+                    if r.probe():
+                        return r.engine
+                finally:
+                    r._probing.release()
+        return self.primary
+
+    def healthy(self, engine) -> bool:
+        return engine is self.primary or any(r.engine is engine and r.healthy for r in self.replicas)
+
+    def engines(self) -> Dict[str, object]:
+        return {"primary": self.primary, **{r.name: r.engine for r in self.replicas}}
+
+    # ---------- read-your-writes ----------
+    def wrote(self, actors: Iterable[str]):
+        for a in actors:
+            self._sticky.set(a, True, ttl=DB_READ_YOUR_WRITES_SECONDS)
+
+    def sticky(self, actors: Iterable[str]) -> bool:
+        return any(self._sticky.get(a) for a in actors)
+
+    def status(self) -> Dict[str, Dict[str, object]]:
+        now = time.monotonic()
+        return {r.name: {"healthy": r.healthy,
+                         "retry_in": max(0.0, round(r.down_until - now, 1)) if r.down_until else 0.0}
+                for r in self.replicas}
+
+    def probe_replicas(self) -> Dict[str, bool]:
+        """Readiness check: connect to every replica (a failing one is only marked down)."""
+        return {r.name: r.probe() for r in self.replicas}
+
+
+# ---------- session ----------
+class RoutingSession(Session):
+    def __init__(self, router: DatabaseRouter, read_replica: bool = False, **kw):
+        super().__init__(**kw)
+        self.router = router
+        self.read_replica = read_replica and bool(router.replicas)
+        self._pinned = 0
+        self._wrote = False
+        self._sticky = False
+        self._checked: frozenset = frozenset()
+        self._reader = None   # one replica per session: its reads see one snapshot
+
+    def _reads_primary(self) -> bool:
+        if not self.read_replica or self._wrote or self._pinned:
+            return True
+        actors = frozenset(self.info.get("actors", ()))
+        if actors != self._checked:   # looked up once per new actor, not per statement
+            self._checked = actors
+            self._sticky = self.router.sticky(actors)
+        return self._sticky
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if not self.router.replicas:
+            return self.router.primary
+        if (self._flushing or isinstance(clause, UpdateBase)
+                or getattr(clause, "_for_update_arg", None) is not None or self._reads_primary()):
+            DB_ROUTED.inc(target="primary")
+            return self.router.primary
+        if self._reader is None or not self.router.healthy(self._reader):
+            self._reader = self.router.reader()
+        DB_ROUTED.inc(target="replica" if self._reader is not self.router.primary else "primary_fallback")
+        return self._reader
+
+    @contextmanager
+    def primary(self):
+        """Run the enclosed queries on the primary (read-after-write inside a read session)."""
+        self._pinned += 1
+        try:
+            yield self
+        finally:
+            self._pinned -= 1
+
+@event.listens_for(RoutingSession, "after_flush")
+def _after_flush(session, flush_context):
+    session._wrote = True
+
+@event.listens_for(RoutingSession, "after_commit")
+def _after_commit(session):
+    if session._wrote and session.router.replicas:
+        session.router.wrote(session.info.get("actors", ()))
@@ -6,6 +6,8 @@ from jose import JWTError, jwt
 from fastapi import HTTPException, status
 import os
 
+from app.models.routing import bind_actor
+
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
 ALGORITHM = "HS256"
@@ -57,6 +59,7 @@ def authenticate_user(db: Session, username: str, password: str):
     """Authenticate user with username/email and password"""
     from app.models.models import User
     
+    bind_actor(db, username)  # read-your-writes right after registering
     user = db.query(User).filter(
         (User.username == username) | (User.email == username)
     ).first()
@@ -71,6 +74,7 @@ def create_user(db: Session, username: str, email: str, password: str):
     """Create a new user"""
     from app.models.models import User, UserPreferences
     
+    bind_actor(db, username, email)
     # Check if username or email already exists
     existing_user = db.query(User).filter(
         (User.username == username) | (User.email == email)
@@ -108,6 +112,7 @@ def get_current_user(db: Session, token: str):
     
     payload = verify_token(token)
     username = payload.get("sub")
+    bind_actor(db, username)  # replica reads unless this user wrote something just now
     
     user = db.query(User).filter(User.username == username).first()
     if user is None:
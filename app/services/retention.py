@@ -0,0 +1,165 @@
+# app/services/retention.py — search_history retention: raw window + daily rollups
+#
+# Same policy as history_store.py for server.py's JSON history, on the SQL tables:
+#
+#   rollup(db)                        -> finished days after the last rolled-up day go into
+#                                        search_daily_user / search_daily_city
+#   purge(db)                         -> raw rows older than HISTORY_RAW_DAYS are deleted in
+#                                        id batches (only days already rolled up), rollups
+#                                        older than HISTORY_ROLLUP_DAYS likewise
+#   run(SessionLocal)                 -> both, on a primary session (RetentionWorker target)
+#   user_history(db, user_id, days)   -> recent raw rows + per-day counts for /history
+#
+# The watermark is the newest day in search_daily_city, so a crash between rollup and
+# purge only means the next pass starts from the same day. Deletes walk the created_at
+# index in batches of HISTORY_PURGE_BATCH with a commit each: no long lock on the table
+# and a constant amount of work per pass once the backlog is gone.
+#
+# Config (env): HISTORY_RAW_DAYS, HISTORY_ROLLUP_DAYS, HISTORY_PURGE_BATCH
+
+import os
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from app.models.models import SearchDailyCity, SearchDailyUser, SearchHistory
+from history_store import HISTORY_RAW_DAYS, HISTORY_ROLLUP_DAYS, city_key
+
+HISTORY_PURGE_BATCH = int(os.getenv("HISTORY_PURGE_BATCH", "5000"))
+
+def _start(d: date) -> datetime:
+    return datetime.combine(d, time.min, tzinfo=timezone.utc)
+
+def _as_date(v) -> date:
+    # func.date() is a DATE on PostgreSQL and a 'YYYY-MM-DD' string on SQLite
+    return v if isinstance(v, date) else date.fromisoformat(str(v)[:10])
+
+def rolled_through(db: Session) -> Optional[date]:
+    last = db.execute(select(func.max(SearchDailyCity.day))).scalar()
+    return _as_date(last) if last is not None else None
+
+
+# ---------- rollup ----------
+def rollup(db: Session, today: Optional[date] = None) -> Dict[str, Any]:
+    """Aggregate every finished day after the watermark, one day per transaction."""
+    today = today or datetime.now(timezone.utc).date()
+    through = rolled_through(db)
+    if through is None:
+        first = db.execute(select(func.min(SearchHistory.created_at))).scalar()
+        if first is None:
+            return {"days": 0, "through": None}
+        day = first.date()
+    else:
+        day = through + timedelta(days=1)
+
+    days = 0
+    while day < today:
+        rows = db.execute(
+            select(SearchHistory.user_id, SearchHistory.city, func.count())
+            .where(SearchHistory.created_at >= _start(day),
+                   SearchHistory.created_at < _start(day + timedelta(days=1)))
+            .group_by(SearchHistory.user_id, SearchHistory.city)
+        ).all()
+        per_user: Dict[Tuple[int, str], int] = defaultdict(int)
+        per_city: Dict[str, int] = defaultdict(int)
+        users: Dict[str, Set[int]] = defaultdict(set)
+        for user_id, city, n in rows:
+            key = city_key(city)   # "Bucuresti" and "Bucharest" count as one city
+            per_user[(user_id, key)] += n
+            per_city[key] += n
+            users[key].add(user_id)
+        db.add_all(SearchDailyUser(user_id=u, day=day, city=c, searches=n) for (u, c), n in per_user.items())
+        db.add_all(SearchDailyCity(day=day, city=c, searches=n, users=len(users[c])) for c, n in per_city.items())
+        db.commit()
+        if per_city:
+            through = day
+        days += 1
+        day += timedelta(days=1)
+    return {"days": days, "through": through.isoformat() if through else None}
+
+
+# ---------- purge ----------
+def _purge(db: Session, model, id_col, column, before) -> int:
+    deleted = 0
+    while True:
+        ids = db.execute(select(id_col).where(column < before).order_by(column)
+                         .limit(HISTORY_PURGE_BATCH)).scalars().all()
+        if not ids:
+            return deleted
+        db.execute(delete(model).where(id_col.in_(ids)))
+        db.commit()
+        deleted += len(ids)
+
+def purge(db: Session, today: Optional[date] = None) -> Dict[str, int]:
+    today = today or datetime.now(timezone.utc).date()
+    through = rolled_through(db)
+    raw = 0
+    if through is not None:
+        # never delete a day that has not been rolled up yet
+        keep_from = min(today - timedelta(days=HISTORY_RAW_DAYS), through + timedelta(days=1))
+        raw = _purge(db, SearchHistory, SearchHistory.id, SearchHistory.created_at, _start(keep_from))
+    oldest = today - timedelta(days=HISTORY_ROLLUP_DAYS)
+    pruned = db.execute(delete(SearchDailyUser).where(SearchDailyUser.day < oldest)).rowcount
+    # the newest city day is the watermark: keep it even when it is very old
+    if through is not None:
+        pruned += db.execute(delete(SearchDailyCity).where(
+            SearchDailyCity.day < min(oldest, through))).rowcount
+    db.commit()
+    return {"raw_deleted": raw, "rollup_rows_pruned": pruned}
+
+def run(session_factory) -> Dict[str, Any]:
+    db = session_factory()   # primary session: every statement here writes or must see writes
+    try:
+        return {**rollup(db), **purge(db)}
+    finally:
+        db.close()
+
+
+# ---------- reads ----------
+def user_history(db: Session, user_id: int, days: int = 30, limit: int = 50,
+                 today: Optional[date] = None) -> Dict[str, Any]:
+    """Latest raw searches plus one count per day: rolled-up days from the rollup table,
+    the rest (today, days the worker has not reached) counted from raw rows."""
+    today = today or datetime.now(timezone.utc).date()
+    since = today - timedelta(days=max(1, days) - 1)
+    raw_since = max(since, today - timedelta(days=HISTORY_RAW_DAYS))
+    recent = db.execute(
+        select(SearchHistory).where(SearchHistory.user_id == user_id,
+                                    SearchHistory.created_at >= _start(raw_since))
+        .order_by(SearchHistory.created_at.desc()).limit(limit)
+    ).scalars().all()
+
+    through = rolled_through(db)
+    per_day: Dict[date, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for day, city, n in db.execute(
+            select(SearchDailyUser.day, SearchDailyUser.city, SearchDailyUser.searches)
+            .where(SearchDailyUser.user_id == user_id, SearchDailyUser.day >= since)):
+        per_day[_as_date(day)][city] += n
+    raw_from = max(since, through + timedelta(days=1)) if through else since
+    for created_at, city in db.execute(
+            select(SearchHistory.created_at, SearchHistory.city)
+            .where(SearchHistory.user_id == user_id, SearchHistory.created_at >= _start(raw_from))):
+        per_day[created_at.date()][city_key(city)] += 1
+
+    return {
+        "recent": [
+            {
+                "id": s.id,
+                "city": s.city,
+                "budget": s.budget,
+                "check_in_date": s.check_in_date,
+                "check_out_date": s.check_out_date,
+                "adults": s.adults,
+                "results_count": s.results_count,
+                "searched_at": s.created_at,
+            }
+            for s in recent
+        ],
+        "daily": [
+            {"day": d.isoformat(), "searches": sum(c.values()), "cities": dict(c)}
+            for d, c in sorted(per_day.items())
+        ],
+    }
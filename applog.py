@@ -0,0 +1,215 @@
+# applog.py — non-blocking structured logging for the backend
+#
+#   from applog import get_logger
+#   log = get_logger(__name__)
+#   log.info("transit_found", extra={"station": name, "minutes": 7})
+#   log.debug("places_search", extra={"lat": lat, "lon": lon, "sample": 0.1})   # keep ~10%
+#
+# setup_logging() (called once by server.py / app/main.py) puts a QueueHandler on the
+# root logger: the request thread only enqueues the record; a QueueListener thread
+# formats it and writes it to stderr. When the queue is full the record is
+# dropped and counted (log_records_dropped_total) instead of blocking the request.
+#
+# Every record carries the request id of the request that produced it (contextvar set
+# by RequestIdMiddleware from X-Request-ID, or a fresh one; echoed in the response),
+# so lines from threadpool workers can be joined back to their request.
+#
+# Sampling: a record with extra={"sample": r} is kept with probability r; LOG_SAMPLE
+# sets rates per logger for DEBUG/INFO ("new_transport=0.1,transport=0.2").
+# Warnings and errors are never sampled.
+#
+# Config (env): LOG_LEVEL (INFO), LOG_FORMAT (json|text), LOG_SAMPLE, LOG_HOT_SAMPLE, LOG_QUEUE_SIZE
+
+from __future__ import annotations
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from tracing import counter
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+def _parse_rates(spec: str) -> Dict[str, float]:
+    out = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            out[name.strip()] = float(value)
+    return out
+
+LOG_SAMPLE = _parse_rates(os.getenv("LOG_SAMPLE", ""))
+# default rate for per-hotel events (one line per transit lookup, ...): extra={"sample": HOT_SAMPLE}
+HOT_SAMPLE = float(os.getenv("LOG_HOT_SAMPLE", "0.1"))
+
+LOG_DROPPED = counter("log_records_dropped_total", "Log records dropped because the log queue was full")
+LOG_SAMPLED_OUT = counter("log_records_sampled_out_total", "Log records skipped by sampling")
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# LogRecord attributes that are not user-supplied extras
+_STD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id", "sample"}
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+def request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+# ---------- filters / formatters ----------
+class ContextFilter(logging.Filter):
+    """Runs in the calling thread: stamps the request id, applies sampling."""
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.rates = rates if rates is not None else LOG_SAMPLE
+
+    def _rate(self, record: logging.LogRecord) -> float:
+        rate = getattr(record, "sample", None)
+        if rate is None:
+            name = record.name
+            while name:
+                if name in self.rates:
+                    return self.rates[name]
+                name = name.rpartition(".")[0]
+            return 1.0
+        return float(rate)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            rate = self._rate(record)
+            if rate < 1.0 and random.random() >= rate:
+                LOG_SAMPLED_OUT.inc(logger=record.name)
+                return False
+        record.request_id = _request_id.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        doc: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        rid = getattr(record, "request_id", None)
+        if rid:
+            doc["request_id"] = rid
+        for k, v in vars(record).items():
+            if k not in _STD_ATTRS and not k.startswith("_"):
+                doc[k] = v
+        if record.exc_text:
+            doc["exc"] = record.exc_text
+        return json.dumps(doc, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = None
+        line = super().format(record)
+        extras = {k: v for k, v in vars(record).items() if k not in _STD_ATTRS and not k.startswith("_")}
+        return line + (" " + json.dumps(extras, ensure_ascii=False, default=str) if extras else "")
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc()
+
+    def prepare(self, record):
+        # freeze the message and the traceback text; the listener thread does the formatting
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# ---------- setup ----------
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, stream=None) -> None:
+    """Idempotent. Root logger -> bounded queue -> background writer thread."""
+    global _listener
+    if _listener is not None:
+        return
+    out = logging.StreamHandler(stream or sys.stderr)
+    out.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    q: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = _DroppingQueueHandler(q)
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [h for h in root.handlers if not isinstance(h, logging.handlers.QueueHandler)]
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, level, logging.INFO))
+
+    _listener = logging.handlers.QueueListener(q, out, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """Flush what is queued and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# ---------- request ids ----------
+class RequestIdMiddleware:
+    """X-Request-ID in (or a new one) -> contextvar for every log line -> X-Request-ID out."""
+
+    def __init__(self, app, header: bytes = b"x-request-id"):
+        self.app = app
+        self.header = header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rid = None
+        for name, value in scope.get("headers") or []:
+            if name == self.header:
+                rid = value.decode("latin-1")[:64]
+                break
+        rid = rid or uuid.uuid4().hex[:16]
+        token = _request_id.set(rid)
+        t0 = time.perf_counter()
+        status_holder = {"status": 500}
+
+        async def wrapped_send(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+                message = dict(message, headers=list(message.get("headers", [])) + [(self.header, rid.encode())])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            logging.getLogger("http").info(
+                "request", extra={"method": scope.get("method"), "path": scope.get("path"),
+                                  "status": status_holder["status"],
+                                  "ms": round((time.perf_counter() - t0) * 1000, 1)})
+            _request_id.reset(token)
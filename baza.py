@@ -1,30 +1,57 @@
-from amadeus import Client, ResponseError
+from amadeus import ResponseError
 from datetime import date
 import sys
 import os
-import googlemaps
-from schimb_euro import convert_to_euro
 from transport import cel_mai_apropiat_transport
 from dotenv import load_dotenv
-
-# Autentificare
-amadeus = Client(
-    client_id=os.getenv("AMADEUS_CLIENT_ID"),
-    client_secret=os.getenv("AMADEUS_CLIENT_SECRET")
-)
-
-# Obtine codul IATA pentru un oras
+from cache import cached
+import deadline
+from tracing import upstream
+from price_stats import get_price_stats
+from providers import get_provider
+from applog import get_logger
+from search_engine import ProviderUnavailable, SearchQuery, search
+import city_index
+from hotel_lists import fetch_by_city, has_hotels
+
+log = get_logger(__name__)
+
+# cat timp tinem minte codurile de oras si listele de hoteluri (secunde)
+CITY_CODE_TTL = int(os.getenv("CITY_CODE_TTL", str(7 * 24 * 3600)))
+HOTEL_LIST_TTL = int(os.getenv("HOTEL_LIST_TTL", str(24 * 3600)))
+# orasele care nu sunt in gazetteer se mai cauta la Amadeus (1) sau deloc (0)
+CITY_REMOTE_LOOKUP = os.getenv("CITY_REMOTE_LOOKUP", "1").lower() not in ("0", "false", "no")
+
+# Autentificare: clientul Amadeus se construieste la prima folosire (providers.py),
+# nu la import -> `import baza` nu cere chei si nu face retea.
+# `baza.amadeus` ramane disponibil pentru cod vechi (server.py) prin __getattr__.
+def __getattr__(name):
+    if name == "amadeus":
+        try:
+            return get_provider("amadeus")
+        except Exception as e:
+            raise AttributeError(f"clientul Amadeus nu poate fi construit: {e}") from e
+    raise AttributeError(f"module 'baza' has no attribute {name!r}")
+
+# Obtine codul IATA pentru un oras: intai din gazetteer-ul local (city_index.py), fara retea
+# si cu diacritice / aliasuri, dar doar potriviri exacte (o greseala de tastare poate fi alt
+# oras real: "Bari" nu e "Bali"); orasele necunoscute ajung la Amadeus
+# (CITY_REMOTE_LOOKUP=0 le opreste si pe acestea).
 def obtine_city_code_hotel(nume_oras: str):
-    if nume_oras=="Bucharest":
-        return "BUH"
-    if nume_oras == "Copenhagen":
-        return "CPH"
-    if nume_oras == "Budapest":
-        return "BUD"
-    
+    city_code = city_index.resolve(nume_oras)
+    if city_code:
+        return city_code
+    if not CITY_REMOTE_LOOKUP or not nume_oras or not nume_oras.strip():
+        return None
+    return _city_code_amadeus(nume_oras)
+
+@cached("city_codes", ttl=CITY_CODE_TTL, key=lambda nume_oras: nume_oras.strip().casefold())
+def _city_code_amadeus(nume_oras: str):
     try:
+        amadeus = get_provider("amadeus")
         # căutăm orașul
-        response = amadeus.reference_data.locations.get(keyword=nume_oras, subType="CITY")
+        with upstream("amadeus", "locations"):
+            response = amadeus.reference_data.locations.get(keyword=nume_oras, subType="CITY")
         if not response.data:
             return None
         
@@ -34,70 +61,58 @@ def obtine_city_code_hotel(nume_oras: str):
         # cityCode-ul pentru a afla hoteluri
         city_code = city.get("iataCode")
         
-        # verific daca exista hoteluri
-        hotel_response = amadeus.reference_data.locations.hotels.by_city.get(cityCode=city_code)
-        if not hotel_response.data:
+        # verific daca exista hoteluri: se citeste doar pana la primul hotel (hotel_lists.py)
+        if not city_code or not has_hotels(city_code):
             return None
         
         return city_code
-    except ResponseError:
+    except (ResponseError, OSError, ValueError) as error:
+        # timeout cu bugetul cererii consumat -> 504, nu "oras negasit" (si nu se pune in cache)
+        deadline.raise_if_expired("city", error)
         return None
 
 #ACEASTA FUNCTIE RETURNEAZA ID URILE HOTELURILOR DIN ORAS.
 #Metoda cu city code(IATA) dadea erori asa ca am gasti aceast alternativa cu id-urile de hotel din orasul x
 def obtine_hoteluri_oras(city_code):
+    return _hoteluri_oras(city_code) or []
+
+# None la eroare -> nu se pune in cache, se reincearca la urmatoarea cautare
+@cached("hotel_lists", ttl=HOTEL_LIST_TTL, key=lambda city_code: str(city_code).upper())
+def _hoteluri_oras(city_code):
+    # raspunsul by_city se parseaza in flux; din fiecare hotel pastram doar ce folosim
     try:
-        response = amadeus.reference_data.locations.hotels.by_city.get(cityCode=city_code)
-        return [hotel["hotelId"] for hotel in response.data]
-    except ResponseError as error:
-        print(f"Eroare la obținerea hotelurilor: {error}")
+        return fetch_by_city(city_code).ids
+    except (ResponseError, OSError, ValueError) as error:
+        deadline.raise_if_expired("hotels", error)
+        log.warning("hotel_list_failed", extra={"city_code": city_code, "error": str(error)})
+        return None
+
+def cauta_oferte_hoteluri(hotel_ids, checkInDate, checkOutDate, adults, buget, city_code=None):
+    # aceeasi cautare ca server.py si app/main.py (search_engine.py): primele 5 hoteluri
+    # cu pret in buget; price_stats / offer_store sar hotelurile fara sanse
+    q = SearchQuery(city_code or "", checkInDate, checkOutDate, adults=adults, budget=buget,
+                    limit=5, require_price=True, enrich=False,
+                    city_code=city_code, hotel_ids=[str(h) for h in hotel_ids])
+    try:
+        rezultat = search(q)
+    except ProviderUnavailable as e:
+        print(f"Clientul Amadeus nu poate fi construit: {e}")
         return []
 
-def cauta_oferte_hoteluri(hotel_ids, checkInDate, checkOutDate, adults, buget):
-    count = 0
-    for hotel_id in hotel_ids:  # doar primele 5
-        if count == 5:
-            break
-        try:        #aici se cauta hotel compatibil cu datele de intrare
-            response = amadeus.shopping.hotel_offers_search.get(
-                hotelIds=hotel_id,
-                checkInDate=checkInDate,
-                checkOutDate=checkOutDate,
-                adults=adults,
-                buget = buget
-            )
-
-            if response.data:
-                for oferta in response.data:
-                    hotel = oferta["hotel"]
-                    name = hotel["name"]
-                    #aici este primita fiecare "statistica" a hotelului
-                    if "offers" in oferta and oferta["offers"]:
-                        price = oferta["offers"][0]["price"]["total"]
-                        rating = hotel.get("rating", "N/A")
-                        website = hotel.get("website" , "N/A")
-                        currency = oferta["offers"][0]["price"]["currency"]
-                        price = round(convert_to_euro(float(price), currency),2) #convertesc pretul in euro
-                        
-                        
-                        if(float(price)< buget): #se compara bugetul cu pretul hotelului, sa stim daca il afisam sau nu
-                            print(f"🏨 {name} (ID: {hotel_id}) - ⭐ {rating} - 💰 {price} EUR - 🌐{website}")
-                            geo = hotel.get("geoCode")
-                            
-                            if geo:
-                            
-                                lat = geo["latitude"]
-                                lon = geo["longitude"]
-                                cel_mai_apropiat_transport(lat, lon)
-                            else: print("Nu am gasit coordonatele acestui hotel!")
-                            print("-" * 40)
-                            count = count +1
-                        else:
-                            #print(f"🏨 {name} (ID: {hotel_id}) - fără preț disponibil")
-                            continue
-                        
-        except ResponseError:
-            continue
+    for oferta in rezultat.offers:
+        rating = oferta.hotel.get("rating", "N/A")
+        website = oferta.website or "N/A"
+        print(f"🏨 {oferta.name} (ID: {oferta.hotel_id}) - ⭐ {rating} - 💰 {oferta.price_eur} EUR - 🌐{website}")
+        if oferta.latitude is not None and oferta.longitude is not None:
+            info = cel_mai_apropiat_transport(oferta.latitude, oferta.longitude)
+            if info:
+                print(f"🚏 Cea mai apropiată stație: {info['station_name']}")
+                print(f"Distanta este {info['distance']}. Timpul estimat este {info['duration']}")
+            else:
+                print("Nu am găsit stații de transport în apropiere.")
+        else: print("Nu am gasit coordonatele acestui hotel!")
+        print("-" * 40)
+    return rezultat.offers
 
 if __name__ == "__main__":
 
@@ -163,5 +178,10 @@ if __name__ == "__main__":
     hotelID = obtine_hoteluri_oras(nume_oras)
 
 
-    cauta_oferte_hoteluri(hotelID, checkInDate_str, checkOutDate_str, adult, buget)
+    # intervalul tipic de pret din cautarile anterioare, pana vin ofertele
+    interval = get_price_stats().typical_range(nume_oras, checkInDate, (checkOutDate - checkInDate).days, adult)
+    if interval:
+        print(f"💶 De obicei: {interval['low']} - {interval['high']} EUR (mediana {interval['median']} EUR)")
+
+    cauta_oferte_hoteluri(hotelID, checkInDate_str, checkOutDate_str, adult, buget, city_code=nume_oras)
 
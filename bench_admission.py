@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Load test for admission control: do cheap endpoints stay fast under a search flood?
+
+Runs server.py in-process with every upstream replaced by upstream_sim.py. For each
+mode (admission on / off) it measures GET /api/health and GET /api/favorites
+latency twice: idle, then while --flood clients send back-to-back searches
+(each from its own TCP peer address, as distinct real clients would be; the
+X-Forwarded-For header is not trusted without ADMISSION_TRUSTED_PROXIES). Reports
+probe percentiles and search status counts. test_admission.py runs a shorter,
+dependency-free version of the same check under pytest.
+
+Examples:
+    python bench_admission.py                                   # 64 flooders, 10 s per phase
+    python bench_admission.py --flood 96 --amadeus-latency-ms 300 --seconds 15
+    python bench_admission.py --modes on --max-ratio 3          # exit 1 if p95 grows > 3x
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).parent.resolve()
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from bench_search import asgi_request, clear_caches, percentile
+from upstream_sim import SimConfig, UpstreamSimulator
+
+PROBES = {"health": ("GET", "/api/health"), "favorites": ("GET", "/api/favorites")}
+
+
+def _ms(values: List[float]) -> Dict[str, Any]:
+    v = sorted(values)
+    return {"n": len(v),
+            "p50": round(percentile(v, 50) * 1000, 1),
+            "p95": round(percentile(v, 95) * 1000, 1),
+            "p99": round(percentile(v, 99) * 1000, 1),
+            "max": round(v[-1] * 1000, 1) if v else None}
+
+
+async def login(app) -> Dict[str, str]:
+    creds = {"email": "bench@example.com", "password": "benchpass123"}
+    await asgi_request(app, "POST", "/api/auth/register", creds)
+    _, _, body = await asgi_request(app, "POST", "/api/auth/login", creds)
+    return {"authorization": f"Bearer {json.loads(body)['token']}"}
+
+
+async def phase(app, auth: Dict[str, str], seconds: float, flood: int, cities: List[str],
+                interval: float) -> Dict[str, Any]:
+    stop = time.perf_counter() + seconds
+    probes: Dict[str, List[float]] = {name: [] for name in PROBES}
+    probe_status: Counter = Counter()
+    search_status: Counter = Counter()
+    search_lat: List[float] = []
+
+    async def prober(name: str):
+        method, path = PROBES[name]
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            status, _, _ = await asgi_request(app, method, path, None, auth)
+            probes[name].append(time.perf_counter() - t0)
+            probe_status[f"{name}:{status}"] += 1
+            await asyncio.sleep(interval)
+
+    async def flooder(i: int):
+        n = 0
+        while time.perf_counter() < stop:
+            check_in = date.today() + timedelta(days=20 + (i + n) % 30)
+            body = {"city": cities[(i + n) % len(cities)], "checkIn": check_in.isoformat(),
+                    "checkOut": (check_in + timedelta(days=2)).isoformat(), "budget": 400, "adults": 2}
+            t0 = time.perf_counter()
+            status, headers, _ = await asgi_request(app, "POST", "/api/hotels/search", body,
+                                                    client=(f"10.0.{i // 250}.{i % 250 + 1}", 40000 + i))
+            search_lat.append(time.perf_counter() - t0)
+            search_status[status] += 1
+            n += 1
+            if status in (429, 503):
+                # a well-behaved client backs off for Retry-After
+                await asyncio.sleep(min(float(headers.get("retry-after", "1")), max(0.0, stop - time.perf_counter())))
+
+    await asyncio.gather(*(prober(n) for n in PROBES), *(flooder(i) for i in range(flood)))
+    return {"probes": {n: _ms(v) for n, v in probes.items()},
+            "probe_status": dict(probe_status),
+            "searches": {"status": {str(k): v for k, v in sorted(search_status.items())},
+                         "latency_ms": _ms(search_lat) if search_lat else None}}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--modes", default="off,on", help="admission modes to run, in order")
+    ap.add_argument("--flood", type=int, default=64, help="concurrent search clients")
+    ap.add_argument("--seconds", type=float, default=10.0, help="duration of each phase")
+    ap.add_argument("--interval", type=float, default=0.02, help="pause between probes")
+    ap.add_argument("--cities", default="Bucharest,Budapest,Copenhagen")
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--amadeus-latency-ms", type=float, default=200.0)
+    ap.add_argument("--hotels-per-city", type=int, default=50)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--max-ratio", type=float, default=None,
+                    help="with admission on, fail if flood p95 > ratio x idle p95 for any probe")
+    ap.add_argument("--json", dest="json_out", default=None)
+    args = ap.parse_args(argv)
+
+    os.environ.setdefault("APP_DATA_DIR", tempfile.mkdtemp(prefix="bench_admission_"))
+    sim = UpstreamSimulator(SimConfig(seed=args.seed, latency_ms=args.latency_ms,
+                                      hotels_per_city=args.hotels_per_city,
+                                      service_latency_ms={"amadeus": args.amadeus_latency_ms}))
+    cities = [c.strip() for c in args.cities.split(",") if c.strip()]
+
+    report: Dict[str, Any] = {"flood": args.flood, "seconds": args.seconds, "modes": {}}
+    with sim.installed():
+        import server
+        sim.patch_loaded_modules()
+        rules = list(server.ADMISSION_RULES)
+        auth = asyncio.run(login(server.app))
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            server.ADMISSION_RULES[:] = rules if mode == "on" else []  # no rules -> pass-through
+            clear_caches()
+            idle = asyncio.run(phase(server.app, auth, args.seconds / 2, 0, cities, args.interval))
+            flood = asyncio.run(phase(server.app, auth, args.seconds, args.flood, cities, args.interval))
+            report["modes"][mode] = {"idle": idle, "flood": flood}
+        server.ADMISSION_RULES[:] = rules
+
+    ok = True
+    for mode, r in report["modes"].items():
+        print(f"[admission {mode}] {args.flood} search clients, {args.seconds}s")
+        for name in PROBES:
+            i, f = r["idle"]["probes"][name], r["flood"]["probes"][name]
+            ratio = f["p95"] / i["p95"] if i["p95"] else float("inf")
+            print(f"    {name:<10} idle p50={i['p50']}ms p95={i['p95']}ms | "
+                  f"flood p50={f['p50']}ms p95={f['p95']}ms p99={f['p99']}ms  (p95 x{ratio:.1f}, n={f['n']})")
+            if mode == "on" and args.max_ratio is not None and ratio > args.max_ratio:
+                ok = False
+        s = r["flood"]["searches"]
+        lat = s["latency_ms"] or {}
+        print(f"    searches   status={s['status']}  p50={lat.get('p50')}ms p95={lat.get('p95')}ms")
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if not ok:
+        print("❌ probe latency grew more than --max-ratio under the search flood")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
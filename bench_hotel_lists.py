@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for by_city ingestion: peak RSS per city size
+
+For each city size a synthetic Amadeus hotels.by_city body (full hotel objects:
+address, geoCode, distance, lastUpdate, ...) is produced chunk by chunk, as a socket
+would deliver it, and ingested in a fresh interpreter in one of three modes:
+
+    sdk     what the Amadeus SDK does: read the whole body, decode, json.loads,
+            then [h["hotelId"] for h in data]
+    stream  hotel_lists.iter_array + collect: one hotel decoded at a time,
+            projected into HotelList columns (ids, names, lat/lon)
+    has     hotel_lists has_hotels-style early stop after the first hotel
+
+Reports the peak RSS growth over the interpreter's baseline (ru_maxrss), the
+time, and how many body bytes were read.
+
+Examples:
+    python bench_hotel_lists.py                                # 500 .. 50000 hotels
+    python bench_hotel_lists.py --sizes 1000,20000 --modes sdk,stream
+    python bench_hotel_lists.py --max-ratio 0.5   # exit 1 if stream peak > 0.5 x sdk peak (largest size)
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).parent.resolve()
+
+# runs inside the child interpreter: argv = mode, hotels, chunk size
+CHILD = r'''
+import json, resource, sys, time
+sys.path.insert(0, sys.argv[4])
+import hotel_lists
+
+mode, n, chunk_size = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+
+def hotel(i):
+    return {
+        "chainCode": "RT", "iataCode": "PAR", "dupeId": 700000000 + i,
+        "name": f"HOTEL PARIS OPERA {i} BY SYNTHETIC CHAIN", "hotelId": f"RT{i:06d}",
+        "geoCode": {"latitude": 48.85 + (i % 997) * 1e-4, "longitude": 2.35 + (i % 991) * 1e-4},
+        "address": {"countryCode": "FR", "postalCode": "75009", "cityName": "PARIS",
+                    "lines": [f"{i % 200} RUE DE LA CHAUSSEE D ANTIN"]},
+        "distance": {"value": round((i % 500) / 37.0, 2), "unit": "KM"},
+        "amenities": ["WIFI", "RESTAURANT", "FITNESS_CENTER", "AIR_CONDITIONING"],
+        "rating": 1 + i % 5, "lastUpdate": "2025-06-01T10:11:12",
+    }
+
+def body_chunks():
+    # produced lazily, like bytes arriving from a socket
+    buf = bytearray(b'{"meta":{"count":%d,"links":{"self":"https://test.api.amadeus.com/v1/x"}},"data":[' % n)
+    for i in range(n):
+        buf += (b"," if i else b"") + json.dumps(hotel(i)).encode()
+        while len(buf) >= chunk_size:
+            yield bytes(buf[:chunk_size])
+            del buf[:chunk_size]
+    buf += b"]}"
+    yield bytes(buf)
+
+read = 0
+def counted(chunks):
+    global read
+    for c in chunks:
+        read += len(c)
+        yield c
+
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+t0 = time.perf_counter()
+if mode == "sdk":
+    body = b"".join(counted(body_chunks())).decode("utf-8")
+    data = json.loads(body)["data"]
+    ids = [h["hotelId"] for h in data]
+    count = len(ids)
+elif mode == "stream":
+    hl = hotel_lists.collect(hotel_lists.iter_array(counted(body_chunks())), "PAR")
+    count = len(hl)
+else:
+    hl = hotel_lists.collect(hotel_lists.iter_array(counted(body_chunks())), "PAR", limit=1)
+    count = len(hl)
+seconds = time.perf_counter() - t0
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"count": count, "seconds": seconds, "read": read, "peak_kb": peak - base}))
+'''
+
+
+def run(mode: str, hotels: int, chunk: int) -> Dict[str, Any]:
+    proc = subprocess.run([sys.executable, "-c", CHILD, mode, str(hotels), str(chunk), str(ROOT)],
+                          capture_output=True, text=True, cwd=str(ROOT))
+    if proc.returncode != 0:
+        raise SystemExit(f"{mode}/{hotels} failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="500,2000,10000,50000", help="hotels per city")
+    ap.add_argument("--modes", default="sdk,stream,has")
+    ap.add_argument("--chunk", type=int, default=64 * 1024, help="bytes per read")
+    ap.add_argument("--max-ratio", type=float, default=None,
+                    help="fail if stream peak RSS > ratio x sdk peak RSS at the largest size")
+    ap.add_argument("--json", dest="json_out", default=None)
+    args = ap.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    rows: List[Dict[str, Any]] = []
+    print(f"{'hotels':>8} {'mode':<7} {'read MB':>8} {'peak RSS +MB':>13} {'ms':>9}")
+    for n in sizes:
+        for mode in modes:
+            r = run(mode, n, args.chunk)
+            rows.append({"hotels": n, "mode": mode, **r})
+            print(f"{n:>8} {mode:<7} {r['read'] / 1e6:>8.2f} {r['peak_kb'] / 1024:>13.1f} "
+                  f"{r['seconds'] * 1000:>9.1f}")
+
+    ok = True
+    if args.max_ratio is not None and {"sdk", "stream"} <= set(modes):
+        last = {r["mode"]: r for r in rows if r["hotels"] == sizes[-1]}
+        ratio = last["stream"]["peak_kb"] / max(1, last["sdk"]["peak_kb"])
+        print(f"stream / sdk peak RSS at {sizes[-1]} hotels: {ratio:.2f}")
+        ok = ratio <= args.max_ratio
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(rows, indent=2), encoding="utf-8")
+    if not ok:
+        print("❌ streaming ingestion used more than --max-ratio of the SDK path's memory")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
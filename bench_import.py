@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: how long until a fresh worker can serve requests
+
+Each run is a new interpreter that imports the module with outbound network
+disabled (socket connect / DNS raise), then sends one in-process request
+(default GET /api/health) to its ASGI ``app``. Reports import and
+first-response times, any network attempts made during import, and the
+slowest modules from ``python -X importtime``.
+
+Examples:
+    python bench_import.py                              # server, /api/health, 5 runs
+    python bench_import.py --module server --path /static/index.html --runs 10
+    python bench_import.py --module baza --path ""      # import only
+    python bench_import.py --max-seconds 1.0            # exit 1 if slower or network used
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).parent.resolve()
+
+# runs inside the child interpreter
+CHILD = r'''
+import json, socket, sys, time
+
+attempts = []
+def _deny(what):
+    attempts.append(str(what)[:120])
+    raise OSError("network disabled by bench_import")
+socket.getaddrinfo = lambda host, *a, **kw: _deny(host)
+socket.create_connection = lambda address, *a, **kw: _deny(address)
+socket.socket.connect = lambda self, address: _deny(address)
+socket.socket.connect_ex = lambda self, address: _deny(address)
+
+module, path = sys.argv[1], sys.argv[2]
+t0 = time.perf_counter()
+import importlib
+mod = importlib.import_module(module)
+import_s = time.perf_counter() - t0
+
+status, first_response_s = None, None
+if path:
+    import asyncio
+
+    async def get(app):
+        sent = False
+        out = {}
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            return {"type": "http.disconnect"}
+        async def send(msg):
+            if msg["type"] == "http.response.start":
+                out["status"] = msg["status"]
+        p, _, q = path.partition("?")
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+                 "method": "GET", "scheme": "http", "path": p, "raw_path": p.encode(),
+                 "query_string": q.encode(), "root_path": "", "headers": [(b"host", b"bench")],
+                 "client": ("127.0.0.1", 50000), "server": ("bench", 80)}
+        await app(scope, receive, send)
+        return out.get("status")
+    status = asyncio.run(get(mod.app))
+    first_response_s = time.perf_counter() - t0
+
+print("BENCH_IMPORT " + json.dumps({"import_s": import_s, "first_response_s": first_response_s,
+                                    "status": status, "network_attempts": attempts}))
+'''
+
+KEY_VARS = ("AMADEUS_CLIENT_ID", "AMADEUS_CLIENT_SECRET", "GOOGLE_MAPS_API_KEY")
+
+
+def run_once(module: str, path: str, keep_keys: bool, importtime: bool) -> Dict[str, Any]:
+    env = dict(os.environ)
+    if not keep_keys:
+        for k in KEY_VARS:
+            env.pop(k, None)
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", CHILD, module, path]
+    proc = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("BENCH_IMPORT "):
+            result = json.loads(line[len("BENCH_IMPORT "):])
+            result["stderr"] = proc.stderr
+            return result
+    raise RuntimeError(f"child failed (exit {proc.returncode}):\n{proc.stderr[-4000:]}")
+
+
+def slowest_imports(stderr: str, top: int) -> List[Dict[str, Any]]:
+    """Parse ``-X importtime`` output: [{module, self_ms, cumulative_ms}] by cumulative time."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+            name = name[1:].rstrip()  # one separator space, then two spaces per nesting level
+            rows.append({"module": name.strip(), "depth": (len(name) - len(name.lstrip())) // 2,
+                         "self_ms": int(self_us) / 1000, "cumulative_ms": int(cum_us) / 1000})
+        except ValueError:
+            continue
+    # top-level imports of the benchmarked module tree are the actionable ones
+    rows = [r for r in rows if r["depth"] <= 1]
+    return sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:top]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--module", default="server")
+    ap.add_argument("--path", default="/api/health", help='first request ("" = import only)')
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    ap.add_argument("--keep-keys", action="store_true", help="keep API keys in the child environment")
+    ap.add_argument("--max-seconds", type=float, default=None,
+                    help="fail if the median time to first response (or import) exceeds this")
+    ap.add_argument("--json", dest="json_out", default=None)
+    args = ap.parse_args(argv)
+
+    runs = [run_once(args.module, args.path, args.keep_keys, importtime=False) for _ in range(args.runs)]
+    profile = run_once(args.module, args.path, args.keep_keys, importtime=True)
+
+    import_med = statistics.median(r["import_s"] for r in runs)
+    ready = [r["first_response_s"] for r in runs if r["first_response_s"] is not None]
+    ready_med = statistics.median(ready) if ready else None
+    attempts = sorted({a for r in runs for a in r["network_attempts"]})
+    report = {
+        "module": args.module, "path": args.path, "runs": args.runs,
+        "import_s": {"median": round(import_med, 4), "max": round(max(r["import_s"] for r in runs), 4)},
+        "first_response_s": {"median": round(ready_med, 4), "max": round(max(ready), 4)} if ready else None,
+        "status": [r["status"] for r in runs],
+        "network_attempts": attempts,
+        "slowest_imports": slowest_imports(profile["stderr"], args.top),
+    }
+
+    print(f"[{args.module}] import median {import_med * 1000:.0f} ms"
+          + (f", first response ({args.path}) median {ready_med * 1000:.0f} ms, status {runs[0]['status']}"
+             if ready else ""))
+    print(f"    network attempts during import: {len(attempts)}")
+    for a in attempts:
+        print(f"      {a}")
+    print("    slowest imports (cumulative ms):")
+    for r in report["slowest_imports"]:
+        print(f"      {r['cumulative_ms']:>9.1f}  {r['module']}")
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    worst = ready_med if ready_med is not None else import_med
+    ok = not attempts and (args.max_seconds is None or worst <= args.max_seconds)
+    if not ok:
+        print("❌ cold start budget not met")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the hotel search path (no API keys, no network)
+
+Runs load scenarios in-process against server.py (POST /api/hotels/search) or
+app/main.py (POST /search) with every upstream replaced by upstream_sim.py, and
+reports latency percentiles plus upstream call counts.
+
+Examples:
+    python bench_search.py --target server --users 8 --cities Bucharest,Budapest --searches 3
+    python bench_search.py --target main --latency-ms 80 --error-rate 0.05 --json out.json
+    python bench_search.py --target server --warm        # keep caches between rounds
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).parent.resolve()
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from upstream_sim import SimConfig, UpstreamSimulator
+
+
+# ---------- in-process ASGI client ----------
+async def asgi_request(app, method: str, path: str, body: Any = None,
+                       headers: Optional[Dict[str, str]] = None,
+                       client: Tuple[str, int] = ("127.0.0.1", 50000)) -> Tuple[int, Dict[str, str], bytes]:
+    """Send one HTTP request straight into an ASGI app; returns (status, headers, body)."""
+    path, _, query = path.partition("?")
+    payload = json.dumps(body).encode() if body is not None else b""
+    hdrs = {"host": "bench", "content-type": "application/json", "content-length": str(len(payload))}
+    hdrs.update({k.lower(): v for k, v in (headers or {}).items()})
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "root_path": "",
+        "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in hdrs.items()],
+        "client": client, "server": ("bench", 80),
+    }
+    done = asyncio.Event()
+    request_sent = False
+    status, resp_headers, chunks = 500, {}, []
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, resp_headers
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            resp_headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                done.set()
+
+    await app(scope, receive, send)
+    done.set()
+    return status, resp_headers, b"".join(chunks)
+
+
+# ---------- targets ----------
+def load_server():
+    import server
+    return server.app, "/api/hotels/search", {}, _server_body
+
+def _server_body(city: str, check_in: date, check_out: date, adults: int, budget: float):
+    return {"city": city, "checkIn": check_in.isoformat(), "checkOut": check_out.isoformat(),
+            "budget": budget, "adults": adults}
+
+def load_main():
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='bench_')}/bench.db")
+    from app import main
+    from app.models.models import create_tables
+    create_tables()
+
+    async def token():
+        user = {"username": "bench", "email": "bench@example.com", "password": "benchpass123"}
+        await asgi_request(main.app, "POST", "/auth/register", user)
+        _, _, body = await asgi_request(main.app, "POST", "/auth/login",
+                                        {"username": "bench", "password": "benchpass123"})
+        return json.loads(body)["access_token"]
+
+    headers = {"authorization": f"Bearer {asyncio.run(token())}"}
+    return main.app, "/search", headers, _main_body
+
+def _main_body(city: str, check_in: date, check_out: date, adults: int, budget: float):
+    return {"city": city, "budget_eur": budget, "check_in": check_in.isoformat(),
+            "check_out": check_out.isoformat(), "adults": adults}
+
+TARGETS = {"server": load_server, "main": load_main}
+
+
+# ---------- stats ----------
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return float("nan")
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+def summarize(latencies: List[float], statuses: Counter, calls: Counter, errors: Counter,
+              wall: float) -> Dict[str, Any]:
+    lat = sorted(latencies)
+    n = len(lat)
+    searches = max(1, n)
+    return {
+        "requests": n,
+        "status": {str(k): v for k, v in sorted(statuses.items())},
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(n / wall, 2) if wall > 0 else None,
+        "latency_ms": {
+            "p50": round(percentile(lat, 50) * 1000, 1),
+            "p95": round(percentile(lat, 95) * 1000, 1),
+            "p99": round(percentile(lat, 99) * 1000, 1),
+            "max": round(lat[-1] * 1000, 1) if lat else None,
+        },
+        "upstream_calls": {f"{s}.{o}": c for (s, o), c in sorted(calls.items())},
+        "upstream_calls_per_search": round(sum(calls.values()) / searches, 2),
+        "upstream_errors_injected": {f"{s}.{o}": c for (s, o), c in sorted(errors.items())},
+    }
+
+
+# ---------- scenario ----------
+async def run_scenario(app, path: str, headers: Dict[str, str], make_body, cities: List[str],
+                       users: int, searches: int, adults: int, budget: float,
+                       days_ahead: int, nights: int):
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+
+    async def user(u: int):
+        for s in range(searches):
+            city = cities[(u + s) % len(cities)]
+            check_in = date.today() + timedelta(days=days_ahead + (s % 3))
+            body = make_body(city, check_in, check_in + timedelta(days=nights), adults, budget)
+            t0 = time.perf_counter()
+            status, _, _ = await asgi_request(app, "POST", path, body, headers)
+            latencies.append(time.perf_counter() - t0)
+            statuses[status] += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(user(u) for u in range(users)))
+    return latencies, statuses, time.perf_counter() - t0
+
+def clear_caches():
+    try:
+        from cache import all_caches
+        for c in all_caches().values():
+            c.clear()
+    except Exception:
+        pass
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--target", choices=sorted(TARGETS), default="server")
+    ap.add_argument("--users", type=int, default=4, help="concurrent users")
+    ap.add_argument("--cities", default="Bucharest,Budapest,Copenhagen")
+    ap.add_argument("--searches", type=int, default=3, help="searches per user")
+    ap.add_argument("--rounds", type=int, default=1)
+    ap.add_argument("--warm", action="store_true", help="do not clear caches between rounds")
+    ap.add_argument("--adults", type=int, default=2)
+    ap.add_argument("--budget", type=float, default=400.0)
+    ap.add_argument("--days-ahead", type=int, default=30)
+    ap.add_argument("--nights", type=int, default=2)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--jitter", type=float, default=0.5)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--amadeus-latency-ms", type=float, default=None)
+    ap.add_argument("--google-latency-ms", type=float, default=None)
+    ap.add_argument("--hotels-per-city", type=int, default=50)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", dest="json_out", default=None, help="write the report as JSON")
+    args = ap.parse_args(argv)
+
+    per_service = {k: v for k, v in (("amadeus", args.amadeus_latency_ms),
+                                     ("google", args.google_latency_ms)) if v is not None}
+    sim = UpstreamSimulator(SimConfig(
+        seed=args.seed, latency_ms=args.latency_ms, latency_jitter=args.jitter,
+        error_rate=args.error_rate, hotels_per_city=args.hotels_per_city,
+        service_latency_ms=per_service,
+    ))
+    cities = [c.strip() for c in args.cities.split(",") if c.strip()]
+
+    reports = []
+    with sim.installed():
+        app, path, headers, make_body = TARGETS[args.target]()
+        sim.patch_loaded_modules()
+        for r in range(args.rounds):
+            if not args.warm:
+                clear_caches()
+            sim.reset_counts()
+            lat, statuses, wall = asyncio.run(run_scenario(
+                app, path, headers, make_body, cities, args.users, args.searches,
+                args.adults, args.budget, args.days_ahead, args.nights))
+            rep = summarize(lat, statuses, sim.calls, sim.errors, wall)
+            rep["round"] = r + 1
+            reports.append(rep)
+
+    result = {"target": args.target, "users": args.users, "cities": cities,
+              "searches_per_user": args.searches, "sim": vars(sim.config), "rounds": reports}
+    for rep in reports:
+        l = rep["latency_ms"]
+        print(f"[{args.target}] round {rep['round']}: {rep['requests']} searches in {rep['wall_s']}s "
+              f"({rep['throughput_rps']} rps)  p50={l['p50']}ms p95={l['p95']}ms p99={l['p99']}ms "
+              f"max={l['max']}ms  status={rep['status']}")
+        print(f"    upstream calls/search: {rep['upstream_calls_per_search']}")
+        for name, n in rep["upstream_calls"].items():
+            print(f"      {name:<36} {n}")
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(result, indent=2, default=str), encoding="utf-8")
+    return result
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,561 @@
+# cache.py — pluggable cache backends shared by baza, schimb_euro and the transport modules
+#
+# Backends (pick with CACHE_BACKEND, default "memory"):
+#   memory  -> MemoryCache: in-process LRU with TTLs (one copy per worker)
+#   sqlite  -> SQLiteCache: one file per host (CACHE_URL or APP_DATA_DIR/cache.sqlite3),
+#              shared by every uvicorn worker on the node
+#   redis   -> RedisCache: any Redis-protocol server (CACHE_URL=redis://host:6379/0),
+#              shared by the whole cluster. Uses redis-py when installed, otherwise a
+#              tiny built-in RESP client; tests can pass client=fakeredis.FakeRedis().
+#
+# Usage:
+#   fx = get_cache("fx")
+#   rate = fx.get_or_set("RON", lambda: fetch_rate("RON"), ttl=3600)
+#
+#   @cached("city_codes", ttl=7 * 24 * 3600)
+#   def obtine_city_code_hotel(nume_oras): ...
+#
+# Concurrent misses for the same key are collapsed (SingleFlight): one caller runs the
+# factory, the others wait for its result instead of repeating the upstream call. A
+# waiter waits at most its own request budget (deadline.py), and when the first caller
+# fails with DeadlineExceeded, which is about that caller's budget, the waiters retry.
+#
+# A cache is an optimisation, never a dependency: when Redis is unreachable or the SQLite
+# file is locked / corrupt, a get is a miss and a set does nothing (logged, and counted
+# in cache_backend_errors_total), and the backend is left alone for CACHE_RETRY_SECONDS
+# so requests do not each wait for a connect or a lock.
+#
+# Config (env): CACHE_BACKEND, CACHE_URL, CACHE_MAXSIZE, CACHE_RETRY_SECONDS
+
+from __future__ import annotations
+
+import functools
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+import deadline
+from applog import get_logger
+from tracing import counter, record_cache
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_URL = os.getenv("CACHE_URL", "")
+CACHE_MAXSIZE = int(os.getenv("CACHE_MAXSIZE", "4096"))
+CACHE_RETRY_SECONDS = float(os.getenv("CACHE_RETRY_SECONDS", "5"))
+
+CACHE_BACKEND_ERRORS = counter("cache_backend_errors_total",
+                               "Cache operations that failed in the backend (served as miss / no-op)")
+
+log = get_logger(__name__)
+
+MISSING = object()
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class SingleFlight:
+    """Concurrent ``do(key, fn)`` calls with the same key share one run of ``fn``.
+    Joining callers wait within their own deadline and never inherit the running
+    caller's DeadlineExceeded: they try again under their own budget."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, Future] = {}
+
+    def do(self, key: Any, fn: Callable[[], Any]) -> Any:
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = Future()
+            if leader:
+                break
+            left = deadline.remaining()
+            try:
+                return call.result(timeout=None if left is None else max(0.0, left))
+            except FutureTimeout:
+                deadline.mark_partial("upstream")
+                raise deadline.DeadlineExceeded(f"{(deadline.remaining() or 0) * 1000:.0f} ms left") from None
+            except deadline.DeadlineExceeded:
+                continue   # the running caller's budget, not ours
+        try:
+            value = fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class CacheBackend:
+    """Common interface; every backend stores values under ``namespace:key``."""
+
+    name = "base"
+    _errors: Tuple[type, ...] = ()   # backend failures served as a miss / no-op
+
+    def __init__(self, namespace: str = "default"):
+        self.namespace = namespace
+        self._flight = SingleFlight()
+        self._down_until = 0.0
+
+    def _call(self, op: str, fn: Callable[[], Any], fallback: Any = None) -> Any:
+        """Run one backend operation; on a backend error log and count it, back off for
+        CACHE_RETRY_SECONDS and return ``fallback`` instead of failing the request."""
+        if self._down_until and time.monotonic() < self._down_until:
+            return fallback
+        try:
+            result = fn()
+        except self._errors as e:
+            CACHE_BACKEND_ERRORS.inc(backend=self.name, op=op)
+            log.warning("cache_backend_error", extra={"backend": self.name, "namespace": self.namespace,
+                                                      "op": op, "error": str(e)})
+            self._down_until = time.monotonic() + CACHE_RETRY_SECONDS
+            return fallback
+        self._down_until = 0.0
+        return result
+
+    def get(self, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def get_many(self, keys: Iterable[str], default: Any = None) -> List[Any]:
+        """Values for ``keys`` in order; backends override this with one round trip."""
+        return [self.get(k, default) for k in keys]
+
+    def get_or_set(self, key: str, factory: Callable[[], Any], ttl: Optional[float] = None,
+                   cache_none: bool = False) -> Any:
+        value = self.get(key, MISSING)
+        record_cache(self.namespace, value is not MISSING)
+        if value is not MISSING:
+            return value
+
+        def load():
+            value = factory()
+            if value is not None or cache_none:
+                self.set(key, value, ttl)
+            return value
+        return self._flight.do(key, load)
+
+
+# ---------- in-process LRU ----------
+class MemoryCache(CacheBackend):
+    name = "memory"
+
+    def __init__(self, namespace: str = "default", maxsize: int = CACHE_MAXSIZE):
+        super().__init__(namespace)
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires is not None and expires <= time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def get_many(self, keys, default=None):
+        now = time.time()
+        out = []
+        with self._lock:
+            for key in keys:
+                item = self._data.get(key)
+                if item is None or (item[0] is not None and item[0] <= now):
+                    out.append(default)
+                    continue
+                self._data.move_to_end(key)
+                out.append(item[1])
+        return out
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def items(self) -> List[Tuple[str, Optional[float], Any]]:
+        """Live entries as (key, absolute expiry or None, value), least recent first."""
+        now = time.time()
+        with self._lock:
+            return [(k, exp, v) for k, (exp, v) in self._data.items() if exp is None or exp > now]
+
+    def restore(self, entries: Iterable[Tuple[str, Optional[float], Any]]) -> int:
+        """Load items() output back; entries that expired meanwhile are dropped.
+        Existing keys win (they are newer than any snapshot)."""
+        now = time.time()
+        n = 0
+        with self._lock:
+            # newest first, each pushed to the LRU end -> snapshot order is kept
+            for k, exp, v in reversed(list(entries)):
+                if (exp is not None and exp <= now) or k in self._data:
+                    continue
+                self._data[k] = (exp, v)
+                self._data.move_to_end(k, last=False)  # older than anything set since boot
+                n += 1
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return n
+
+
+# ---------- one file per host ----------
+class SQLiteCache(CacheBackend):
+    """WAL-mode SQLite file; every process on the host sees the same entries."""
+
+    name = "sqlite"
+    _errors = (sqlite3.Error,)   # locked past the busy timeout, corrupt / unreadable file
+    _PURGE_EVERY = 256
+    _IN_BATCH = 500        # stays under SQLITE_MAX_VARIABLE_NUMBER on old builds
+
+    def __init__(self, namespace: str = "default", path: Optional[str] = None):
+        super().__init__(namespace)
+        if not path:
+            path = str(Path(os.getenv("APP_DATA_DIR", "./app_data")) / "cache.sqlite3")
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._call("init", self._init)
+
+    def _init(self):
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires REAL,"
+            " PRIMARY KEY (ns, key))"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, *statements: Tuple[str, tuple]):
+        conn = self._conn()
+        try:
+            for sql, params in statements:
+                conn.execute(sql, params)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()   # do not leave the connection inside a failed transaction
+            raise
+
+    def get(self, key, default=None):
+        row = self._call("get", lambda: self._conn().execute(
+            "SELECT value, expires FROM cache WHERE ns = ? AND key = ?", (self.namespace, key)
+        ).fetchone())
+        if row is None:
+            return default
+        value, expires = row
+        if expires is not None and expires <= time.time():
+            self.delete(key)
+            return default
+        return json.loads(value)
+
+    def get_many(self, keys, default=None):
+        keys = list(keys)
+        now = time.time()
+
+        def run():
+            found: Dict[str, Any] = {}
+            conn = self._conn()
+            for i in range(0, len(keys), self._IN_BATCH):
+                chunk = keys[i:i + self._IN_BATCH]
+                rows = conn.execute(
+                    f"SELECT key, value, expires FROM cache WHERE ns = ? AND key IN ({','.join('?' * len(chunk))})",
+                    (self.namespace, *chunk),
+                ).fetchall()
+                found.update((k, json.loads(v)) for k, v, exp in rows if exp is None or exp > now)
+            return found
+        found = self._call("get", run, fallback={})
+        return [found.get(k, default) for k in keys]
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        statements = [("INSERT OR REPLACE INTO cache (ns, key, value, expires) VALUES (?, ?, ?, ?)",
+                       (self.namespace, key, _dumps(value), expires))]
+        self._writes += 1
+        if self._writes % self._PURGE_EVERY == 0:
+            statements.append(("DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?", (time.time(),)))
+        self._call("set", lambda: self._write(*statements))
+
+    def delete(self, key):
+        self._call("delete", lambda: self._write(
+            ("DELETE FROM cache WHERE ns = ? AND key = ?", (self.namespace, key))))
+
+    def clear(self):
+        self._call("clear", lambda: self._write(("DELETE FROM cache WHERE ns = ?", (self.namespace,))))
+
+
+# ---------- Redis protocol ----------
+class RespError(Exception):
+    pass
+
+
+class RespClient:
+    """Minimal RESP2 client exposing the redis-py subset RedisCache needs."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, timeout: float = 2.0):
+        self.host, self.port, self.db = host, port, db
+        self.password, self.timeout = password, timeout
+        self._local = threading.local()
+
+    @classmethod
+    def from_url(cls, url: str) -> "RespClient":
+        u = urlparse(url)
+        db = int(u.path.lstrip("/") or 0)
+        password = unquote(u.password) if u.password else None
+        return cls(u.hostname or "127.0.0.1", u.port or 6379, db, password)
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, sock.makefile("rb"))
+        self._local.conn = conn
+        if self.password:
+            self._roundtrip(conn, ("AUTH", self.password))
+        if self.db:
+            self._roundtrip(conn, ("SELECT", self.db))
+        return conn
+
+    @staticmethod
+    def _encode(args: Iterable[Any]) -> bytes:
+        out = []
+        args = list(args)
+        out.append(b"*%d\r\n" % len(args))
+        for a in args:
+            b = a if isinstance(a, bytes) else str(a).encode("utf-8")
+            out.append(b"$%d\r\n%s\r\n" % (len(b), b))
+        return b"".join(out)
+
+    def _read(self, f):
+        line = f.readline()
+        if not line:
+            raise ConnectionError("redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RespError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            data = f.read(n + 2)
+            return data[:-2]
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self._read(f) for _ in range(n)]
+        raise RespError(f"unexpected reply {line!r}")
+
+    def _roundtrip(self, conn, args):
+        sock, f = conn
+        sock.sendall(self._encode(args))
+        return self._read(f)
+
+    def execute(self, *args):
+        conn = getattr(self._local, "conn", None)
+        try:
+            return self._roundtrip(conn or self._connect(), args)
+        except (ConnectionError, OSError):
+            # stale connection (server restart, idle timeout) -> one retry
+            self._local.conn = None
+            return self._roundtrip(self._connect(), args)
+
+    # redis-py compatible subset
+    def get(self, name):
+        return self.execute("GET", name)
+
+    def mget(self, names):
+        return self.execute("MGET", *names) if names else []
+
+    def set(self, name, value, px=None):
+        args = ["SET", name, value] + (["PX", int(px)] if px else [])
+        return self.execute(*args)
+
+    def delete(self, *names):
+        return self.execute("DEL", *names) if names else 0
+
+    def scan_iter(self, match=None, count=500):
+        cursor = "0"
+        while True:
+            args = ["SCAN", cursor, "COUNT", count] + (["MATCH", match] if match else [])
+            cursor, keys = self.execute(*args)
+            cursor = cursor.decode() if isinstance(cursor, bytes) else str(cursor)
+            yield from keys
+            if cursor == "0":
+                break
+
+
+def _redis_errors() -> Tuple[type, ...]:
+    errors: Tuple[type, ...] = (OSError, RespError)   # ConnectionError, timeouts, refused
+    try:
+        import redis  # type: ignore
+
+        errors += (redis.RedisError,)
+    except ImportError:
+        pass
+    return errors
+
+
+class RedisCache(CacheBackend):
+    name = "redis"
+
+    def __init__(self, namespace: str = "default", url: Optional[str] = None, client: Any = None,
+                 prefix: str = "pe5"):
+        super().__init__(namespace)
+        if client is None:
+            url = url or CACHE_URL or "redis://127.0.0.1:6379/0"
+            try:
+                import redis  # type: ignore
+                client = redis.Redis.from_url(url)
+            except ImportError:
+                client = RespClient.from_url(url)
+        self.client = client
+        self.prefix = f"{prefix}:{namespace}:"
+        self._errors = _redis_errors()
+
+    def get(self, key, default=None):
+        raw = self._call("get", lambda: self.client.get(self.prefix + key))
+        if raw is None:
+            return default
+        try:
+            return json.loads(raw)
+        except ValueError:   # truncated / foreign value: a miss, overwritten by the next set
+            CACHE_BACKEND_ERRORS.inc(backend=self.name, op="decode")
+            return default
+
+    def get_many(self, keys, default=None):
+        keys = list(keys)
+        if not keys:
+            return []
+        raws = self._call("get", lambda: self.client.mget([self.prefix + k for k in keys])) or [None] * len(keys)
+        out = []
+        for raw in raws:
+            try:
+                out.append(default if raw is None else json.loads(raw))
+            except ValueError:
+                CACHE_BACKEND_ERRORS.inc(backend=self.name, op="decode")
+                out.append(default)
+        return out
+
+    def set(self, key, value, ttl=None):
+        px = int(ttl * 1000) if ttl else None
+        self._call("set", lambda: self.client.set(self.prefix + key, _dumps(value), px=px))
+
+    def delete(self, key):
+        self._call("delete", lambda: self.client.delete(self.prefix + key))
+
+    def clear(self):
+        def run():
+            batch = []
+            for k in self.client.scan_iter(match=self.prefix + "*"):
+                batch.append(k)
+                if len(batch) >= 500:
+                    self.client.delete(*batch)
+                    batch = []
+            if batch:
+                self.client.delete(*batch)
+        self._call("clear", run)
+
+
+# ---------- factory ----------
+_caches: Dict[str, CacheBackend] = {}
+_caches_lock = threading.Lock()
+
+def make_cache(namespace: str, backend: Optional[str] = None, url: Optional[str] = None,
+               maxsize: int = CACHE_MAXSIZE) -> CacheBackend:
+    backend = (backend or CACHE_BACKEND).lower()
+    url = url if url is not None else CACHE_URL
+    if backend == "sqlite":
+        return SQLiteCache(namespace, path=url or None)
+    if backend == "redis":
+        return RedisCache(namespace, url=url or None)
+    return MemoryCache(namespace, maxsize=maxsize)
+
+def get_cache(namespace: str, maxsize: int = CACHE_MAXSIZE) -> CacheBackend:
+    """Process-wide cache for ``namespace`` using the configured backend."""
+    cache = _caches.get(namespace)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(namespace)
+            if cache is None:
+                cache = make_cache(namespace, maxsize=maxsize)
+                _caches[namespace] = cache
+    if isinstance(cache, MemoryCache) and maxsize > cache.maxsize:
+        # created earlier with the default size (e.g. by a snapshot restore): largest wins
+        cache.maxsize = maxsize
+    return cache
+
+def all_caches() -> Dict[str, CacheBackend]:
+    return dict(_caches)
+
+def coord_key(lat, lon, *_, **__) -> str:
+    """Cache key for a point, rounded to ~11 m so nearby lookups share an entry."""
+    return f"{round(float(lat), 4)},{round(float(lon), 4)}"
+
+def cached(namespace: str, ttl: Optional[float] = None,
+           key: Optional[Callable[..., str]] = None, cache_none: bool = False):
+    """Memoize a function through get_cache(namespace).
+
+    ``key`` builds the cache key from the call arguments (default: repr of args).
+    Results that are None are not cached unless ``cache_none`` is set, so a
+    failed upstream call is retried next time.
+    """
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            k = key(*args, **kwargs) if key else repr((args, sorted(kwargs.items())))
+            return get_cache(namespace).get_or_set(
+                k, lambda: fn(*args, **kwargs), ttl=ttl, cache_none=cache_none)
+        wrapper.uncached = fn  # type: ignore[attr-defined]
+        return wrapper
+    return deco
@@ -0,0 +1,287 @@
+# city_index.py — local city name -> IATA city code gazetteer
+#
+# Resolving a city used to cost an Amadeus reference_data.locations call plus a
+# hotels.by_city probe, and only the exact spelling matched. The gazetteer is loaded
+# once from cities.tsv (bundled) and APP_DATA_DIR/cities/*.tsv (imported) and answers
+# in process:
+#
+#   from city_index import resolve, complete, lookup
+#   resolve("Bucuresti")            -> "BUH"      (diacritics, case and aliases ignored)
+#   resolve("Bari")                 -> None       (not in the gazetteer: the caller asks Amadeus)
+#   complete("bu", limit=5)         -> [City("BUH", "Bucharest", "RO"), City("BUD", ...), ...]
+#   lookup("Viena")                 -> City("VIE", "Vienna", "AT")
+#   suggest("Copenhagn")            -> [City("CPH", "Copenhagen", "DK")]   (typos: hints only)
+#
+#   python city_index.py lookup "Targu Mures"
+#   python city_index.py complete cl
+#   python city_index.py import my_cities.tsv        # -> APP_DATA_DIR/cities/my_cities.tsv
+#   python city_index.py bench
+#
+# Layout: every name and alias is normalized (NFKD, no accents, casefold, punctuation ->
+# space) and kept in one sorted list; a prefix is a bisect range of it, so typeahead
+# is two binary searches plus a short scan. lookup / resolve only accept exact matches
+# of a normalized name or alias: 170 rows cannot tell a typo from a real city we do not
+# list ("Bari" is one edit from "Bali"), so fuzzy matches are only offered as "did you
+# mean" hints. Typos use a one-deletion index (SymSpell):
+# each key is stored under itself and every string with one character removed, the
+# query does the same, and the candidates are verified with Damerau-Levenshtein.
+#
+# File format (tab separated, '#' comments, header line optional):
+#   iata  country  name  aliases separated by |
+# Imported files are loaded before the bundled one, so they win on conflicting names.
+#
+# Config (env): APP_DATA_DIR, CITY_INDEX_FILE, CITY_FUZZY
+
+from __future__ import annotations
+
+import os
+import shutil
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+ROOT = Path(__file__).parent.resolve()
+CITY_INDEX_FILE = Path(os.getenv("CITY_INDEX_FILE", str(ROOT / "cities.tsv")))
+IMPORT_DIR = Path(os.getenv("APP_DATA_DIR", "./app_data")) / "cities"
+CITY_FUZZY = os.getenv("CITY_FUZZY", "1").lower() not in ("0", "false", "no")
+
+
+class City(NamedTuple):
+    code: str
+    name: str
+    country: str
+
+class CityMatch(NamedTuple):
+    city: City
+    matched: str     # the normalized name or alias that matched
+    distance: int    # edit distance, 0 = exact
+
+
+# ---------- normalization ----------
+# letters NFKD does not decompose
+_FOLD = str.maketrans({"ø": "o", "æ": "ae", "œ": "oe", "ł": "l", "đ": "d", "ð": "d", "þ": "th", "ı": "i"})
+
+def normalize(name: str) -> str:
+    s = unicodedata.normalize("NFKD", name.casefold().translate(_FOLD))
+    s = "".join(" " if not (c.isalnum() or unicodedata.combining(c)) else c
+                for c in s if not unicodedata.combining(c))
+    return " ".join(s.split())
+
+def _max_distance(key: str) -> int:
+    n = len(key)
+    return 0 if n <= 3 else 1 if n <= 6 else 2
+
+def _deletes(key: str) -> Set[str]:
+    return {key[:i] + key[i + 1:] for i in range(len(key))}
+
+def damerau_levenshtein(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance; returns limit + 1 once it is exceeded."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cost = 0 if ca == cb else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+# ---------- index ----------
+class CityIndex:
+    def __init__(self, rows: Iterable[Tuple[str, str, str, Sequence[str]]]):
+        self.cities: List[City] = []
+        by_key: Dict[str, int] = {}
+        for code, country, name, aliases in rows:
+            ci = len(self.cities)
+            self.cities.append(City(code.upper(), name, country.upper()))
+            for label in (name, code, *aliases):
+                key = normalize(label)
+                if key and key not in by_key:   # first file / line wins
+                    by_key[key] = ci
+                    compact = key.replace(" ", "")
+                    if compact != key:
+                        by_key.setdefault(compact, ci)
+
+        self._exact = by_key
+        self._keys: List[str] = sorted(by_key)
+        self._owner = array("H", (by_key[k] for k in self._keys))
+        self._variants: Dict[str, List[int]] = {}
+        for pos, key in enumerate(self._keys):
+            if _max_distance(key):
+                for v in _deletes(key) | {key}:
+                    self._variants.setdefault(v, []).append(pos)
+
+    def __len__(self):
+        return len(self.cities)
+
+    def lookup(self, name: str, fuzzy: bool = False) -> Optional[City]:
+        key = normalize(name)
+        ci = self._exact.get(key)
+        if ci is None:
+            ci = self._exact.get(key.replace(" ", ""))
+        if ci is not None:
+            return self.cities[ci]
+        if not fuzzy:
+            return None
+        matches = self.fuzzy(key)
+        # only an unambiguous best match resolves; "Bern" vs "Bergen" style ties do not
+        if matches and (len(matches) == 1 or matches[1].distance > matches[0].distance
+                        or matches[1].city == matches[0].city):
+            return matches[0].city
+        return None
+
+    def fuzzy(self, name: str) -> List[CityMatch]:
+        key = normalize(name)
+        limit = _max_distance(key)
+        if not limit:
+            return []
+        positions: Set[int] = set()
+        for v in _deletes(key) | {key}:
+            positions.update(self._variants.get(v, ()))
+        best: Dict[int, CityMatch] = {}
+        for pos in positions:
+            cand = self._keys[pos]
+            d = damerau_levenshtein(key, cand, min(limit, _max_distance(cand)))
+            if d <= min(limit, _max_distance(cand)):
+                ci = self._owner[pos]
+                if ci not in best or d < best[ci].distance:
+                    best[ci] = CityMatch(self.cities[ci], cand, d)
+        return [best[ci] for ci in sorted(best, key=lambda ci: (best[ci].distance, ci))]
+
+    def complete(self, prefix: str, limit: int = 10) -> List[City]:
+        """Cities with a name or alias starting with ``prefix``, in file order."""
+        key = normalize(prefix)
+        if not key or limit <= 0:
+            return []
+        lo = bisect_left(self._keys, key)
+        hi = bisect_left(self._keys, key + "\uffff", lo)
+        found = sorted({self._owner[i] for i in range(lo, hi)})
+        return [self.cities[ci] for ci in found[:limit]]
+
+
+# ---------- loading ----------
+def read_tsv(path: Path) -> List[Tuple[str, str, str, List[str]]]:
+    rows = []
+    for n, line in enumerate(path.read_text(encoding="utf-8-sig").splitlines(), 1):
+        if not line.strip() or line.startswith("#"):
+            continue
+        parts = line.split("\t")
+        if parts[0].strip().lower() == "iata":
+            continue  # header
+        if len(parts) < 3 or len(parts[0].strip()) != 3:
+            raise ValueError(f"{path}:{n}: expected 'iata<TAB>country<TAB>name[<TAB>aliases]'")
+        aliases = [a.strip() for a in parts[3].split("|")] if len(parts) > 3 else []
+        rows.append((parts[0].strip(), parts[1].strip(), parts[2].strip(), [a for a in aliases if a]))
+    return rows
+
+def _sources() -> List[Path]:
+    extra = sorted(IMPORT_DIR.glob("*.tsv")) if IMPORT_DIR.exists() else []
+    return extra + ([CITY_INDEX_FILE] if CITY_INDEX_FILE.exists() else [])
+
+_index: Optional[CityIndex] = None
+_lock = threading.Lock()
+
+def get_index() -> CityIndex:
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                rows: List[Tuple[str, str, str, List[str]]] = []
+                for path in _sources():
+                    rows.extend(read_tsv(path))
+                _index = CityIndex(rows)
+    return _index
+
+def reload():
+    global _index
+    with _lock:
+        _index = None
+
+def lookup(name: str) -> Optional[City]:
+    return get_index().lookup(name) if name and name.strip() else None
+
+def resolve(name: str) -> Optional[str]:
+    """City name (any spelling we know) -> IATA city code, or None. No network."""
+    city = lookup(name)
+    return city.code if city else None
+
+def complete(prefix: str, limit: int = 10) -> List[City]:
+    return get_index().complete(prefix, limit)
+
+def suggest(name: str, limit: int = 3) -> List[City]:
+    """Closest cities for a name that did not resolve ("did you mean")."""
+    if not CITY_FUZZY:
+        return []
+    return [m.city for m in get_index().fuzzy(name)[:limit]]
+
+def import_file(src: Path, import_dir: Path = IMPORT_DIR) -> Dict[str, object]:
+    rows = read_tsv(src)  # validate before it can break every worker's index
+    import_dir.mkdir(parents=True, exist_ok=True)
+    dst = import_dir / (src.stem + ".tsv")
+    shutil.copyfile(src, dst)
+    reload()
+    return {"file": str(dst), "cities": len(rows)}
+
+
+# ---------- CLI ----------
+def main(argv=None):
+    import argparse
+    import json
+
+    ap = argparse.ArgumentParser(description="City name -> IATA gazetteer")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("lookup", help="resolve a city name")
+    p.add_argument("name")
+    p = sub.add_parser("complete", help="typeahead for a prefix")
+    p.add_argument("prefix")
+    p.add_argument("--limit", type=int, default=10)
+    p = sub.add_parser("import", help="add a TSV file to APP_DATA_DIR/cities")
+    p.add_argument("file", type=Path)
+    p = sub.add_parser("bench", help="µs per complete() / lookup()")
+    p.add_argument("--n", type=int, default=20000)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "lookup":
+        city = lookup(args.name)
+        if city:
+            print(f"{city.code}  {city.name} ({city.country})")
+        else:
+            hints = ", ".join(c.name for c in suggest(args.name))
+            print(f"not found{f' (did you mean: {hints})' if hints else ''}")
+            return 1
+    elif args.cmd == "complete":
+        for c in complete(args.prefix, args.limit):
+            print(f"{c.code}  {c.name} ({c.country})")
+    elif args.cmd == "import":
+        print(json.dumps(import_file(args.file)))
+    elif args.cmd == "bench":
+        t0 = time.perf_counter()
+        idx = get_index()
+        load_ms = (time.perf_counter() - t0) * 1000
+        names = [c.name for c in idx.cities]
+        prefixes = [n[:k] for n in names for k in (1, 2, 3)]
+        typos = [n[:-2] + n[-1] for n in names if len(n) > 4]
+        for label, fn, inputs in (("complete", lambda s: idx.complete(s, 10), prefixes),
+                                  ("lookup", idx.lookup, names),
+                                  ("fuzzy typo", idx.fuzzy, typos)):
+            t0 = time.perf_counter()
+            for i in range(args.n):
+                fn(inputs[i % len(inputs)])
+            print(f"{label:<12} {(time.perf_counter() - t0) / args.n * 1e6:8.1f} µs")
+        print(f"{len(idx)} cities, {len(idx._keys)} names, loaded in {load_ms:.1f} ms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
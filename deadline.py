@@ -0,0 +1,180 @@
+# deadline.py — one time budget per request, shared by every stage and upstream call
+#
+# DeadlineMiddleware sets the budget when a request arrives: X-Request-Deadline-Ms
+# header (clamped to SEARCH_DEADLINE_MAX_MS), else SEARCH_DEADLINE_MS. It lives in a
+# contextvar, so threadpool workers started with a copy of the request context
+# (search_engine._submit, server._submit) see the same deadline.
+#
+#   requests.get(url, timeout=deadline.timeout())     # remaining budget, capped
+#   if deadline.expired():                             # stage cannot finish: skip it
+#       deadline.mark_partial("transit")
+#   {"results": ..., "partial": deadline.is_partial()}
+#
+# timeout() raises DeadlineExceeded (and marks the request partial) when less than
+# MIN_CALL_TIMEOUT is left, so no call is started that cannot finish. Outside a request
+# (CLI, jobs) there is no deadline and timeout() returns UPSTREAM_TIMEOUT.
+#
+# A call already running when the budget runs out fails with a socket timeout, which is
+# an OSError. Code that turns upstream errors into "no answer" must call
+# raise_if_expired() first, or a spent budget becomes a 404 (and may get cached):
+#
+#   except (ResponseError, OSError) as e:
+#       deadline.raise_if_expired("city", e)
+#       return None
+#
+# Config (env): SEARCH_DEADLINE_MS, SEARCH_DEADLINE_MAX_MS, UPSTREAM_TIMEOUT, MIN_CALL_TIMEOUT
+
+from __future__ import annotations
+
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from tracing import counter
+
+SEARCH_DEADLINE_MS = int(os.getenv("SEARCH_DEADLINE_MS", "10000"))
+SEARCH_DEADLINE_MAX_MS = int(os.getenv("SEARCH_DEADLINE_MAX_MS", "30000"))
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "10"))     # per call, also without a deadline
+MIN_CALL_TIMEOUT = float(os.getenv("MIN_CALL_TIMEOUT", "0.2"))
+DEADLINE_HEADER = b"x-request-deadline-ms"
+
+DEADLINE_SKIPPED = counter("deadline_skipped_total", "Stages or calls skipped because the request deadline ran out")
+
+
+class DeadlineExceeded(Exception):
+    """The request's budget is spent; the caller should skip the stage."""
+
+
+# (absolute time.monotonic() deadline, mutable state shared with worker threads)
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+_state: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("deadline_state", default=None)
+
+
+def start(ms: Optional[float] = None) -> tuple:
+    """Begin a budget of ``ms`` milliseconds (default SEARCH_DEADLINE_MS); returns the
+    tokens for end()."""
+    ms = SEARCH_DEADLINE_MS if ms is None else ms
+    return (_deadline.set(time.monotonic() + ms / 1000.0),
+            _state.set({"partial": False, "skipped": []}))
+
+def end(tokens: tuple):
+    _deadline.reset(tokens[0])
+    _state.reset(tokens[1])
+
+@contextmanager
+def budget(ms: Optional[float] = None):
+    tokens = start(ms)
+    try:
+        yield
+    finally:
+        end(tokens)
+
+def remaining() -> Optional[float]:
+    """Seconds left, or None outside a request."""
+    d = _deadline.get()
+    return None if d is None else d - time.monotonic()
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left < MIN_CALL_TIMEOUT
+
+def timeout(cap: float = UPSTREAM_TIMEOUT) -> float:
+    """Timeout for the next upstream call: the remaining budget, at most ``cap``."""
+    left = remaining()
+    if left is None:
+        return cap
+    if left < MIN_CALL_TIMEOUT:
+        mark_partial("upstream")
+        raise DeadlineExceeded(f"{left * 1000:.0f} ms left")
+    return min(cap, left)
+
+def raise_if_expired(stage: str = "upstream", cause: Optional[BaseException] = None):
+    """Raise DeadlineExceeded from ``cause`` (and mark ``stage`` partial) when the budget
+    is spent: an upstream error at that point is our own timeout, not an answer."""
+    if expired():
+        mark_partial(stage)
+        raise DeadlineExceeded(f"{remaining() * 1000:.0f} ms left") from cause
+
+def mark_partial(stage: str):
+    DEADLINE_SKIPPED.inc(stage=stage)
+    st = _state.get()
+    if st is not None:
+        st["partial"] = True
+        if stage not in st["skipped"]:
+            st["skipped"].append(stage)
+
+def is_partial() -> bool:
+    st = _state.get()
+    return bool(st and st["partial"])
+
+def skipped() -> List[str]:
+    st = _state.get()
+    return list(st["skipped"]) if st else []
+
+
+# ---------- HTTP client adapters ----------
+def urlopen(request):
+    """``http`` callable for amadeus.Client: urllib with the remaining budget as timeout."""
+    from urllib.request import urlopen as _urlopen
+
+    try:
+        return _urlopen(request, timeout=timeout())
+    except OSError as e:   # URLError / socket timeout after the budget ran out
+        raise_if_expired("upstream", e)
+        raise
+
+def requests_session():
+    """requests.Session whose calls default to the remaining budget (for googlemaps)."""
+    import requests
+
+    class DeadlineSession(requests.Session):
+        def request(self, method, url, **kwargs):
+            kwargs["timeout"] = min(kwargs.get("timeout") or UPSTREAM_TIMEOUT, timeout())
+            return super().request(method, url, **kwargs)
+
+    return DeadlineSession()
+
+
+# ---------- ASGI middleware ----------
+class DeadlineMiddleware:
+    """Starts the request budget from X-Request-Deadline-Ms (or SEARCH_DEADLINE_MS)
+    and echoes it back, plus X-Partial: 1 when a stage was skipped."""
+
+    def __init__(self, app, default_ms: int = SEARCH_DEADLINE_MS, max_ms: int = SEARCH_DEADLINE_MAX_MS):
+        self.app = app
+        self.default_ms = default_ms
+        self.max_ms = max_ms
+
+    def _budget_ms(self, scope) -> int:
+        for name, value in scope.get("headers") or []:
+            if name == DEADLINE_HEADER:
+                try:
+                    return max(1, min(int(value), self.max_ms))
+                except ValueError:
+                    break
+        return self.default_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        ms = self._budget_ms(scope)
+        tokens = start(ms)
+        state = _state.get()
+
+        async def wrapped_send(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((DEADLINE_HEADER, str(ms).encode()))
+                if state and state["partial"]:
+                    headers.append((b"x-partial", b"1"))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            end(tokens)
@@ -0,0 +1,207 @@
+# hedging.py — hedged requests: start a backup call when the first one is slow
+#
+#   TRANSIT = Hedger("transit_places")
+#   info = TRANSIT.run(lambda: places_api(lat, lon),        # primary
+#                      lambda: geocode_fallback(lat, lon))  # backup (None = same call again)
+#
+# run() starts the primary and waits for `delay` — the HEDGE_QUANTILE (p90) of the
+# primary's recent latencies, counted from when the call starts running, not from when
+# it was queued. If it has not answered by then, the backup is started in parallel and
+# the first *good* answer wins (is_good, default: truthy result); the slower call is
+# cancelled if it has not started yet, otherwise its result is dropped.
+#
+# Without a hedge the primary's answer stands, good or not ("no station nearby" is an
+# answer). Only a primary that *raises* goes on to the backup, and not for quota
+# (HTTP 429 / OVER_QUERY_LIMIT) or deadline errors: repeating those only burns quota.
+#
+# Hedges are capped by a token budget: every call earns HEDGE_MAX_RATE tokens (up to
+# HEDGE_BURST) and a hedge spends one, so at most ~10% extra upstream quota is used.
+# Waits never run past the request deadline (deadline.py). Every Hedger has its own
+# pool of HEDGE_WORKERS threads, so one caller's backlog cannot delay another's calls.
+#
+# Metrics: hedge_calls_total{name,winner=primary|backup|none}, hedge_fired_total{name,reason}
+# Config (env): HEDGE_QUANTILE, HEDGE_MAX_RATE, HEDGE_BURST, HEDGE_DEFAULT_DELAY, HEDGE_MIN_DELAY,
+#   HEDGE_WORKERS
+
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Optional
+
+import deadline
+from tracing import counter
+
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.9"))
+HEDGE_MAX_RATE = float(os.getenv("HEDGE_MAX_RATE", "0.1"))
+HEDGE_BURST = float(os.getenv("HEDGE_BURST", "5"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "0.8"))   # until enough samples
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.05"))
+HEDGE_WORKERS = int(os.getenv("HEDGE_WORKERS", "16"))
+
+HEDGE_CALLS = counter("hedge_calls_total", "Hedged calls by which attempt answered first")
+HEDGE_FIRED = counter("hedge_fired_total",
+                      "Backup calls started (reason=slow|failed) or refused (reason=budget|quota)")
+
+_QUOTA_STATUSES = ("OVER_QUERY_LIMIT", "OVER_DAILY_LIMIT", "RESOURCE_EXHAUSTED")
+
+def is_quota_error(e: BaseException) -> bool:
+    """HTTP 429 (requests / amadeus errors carry a response) or a Google quota status."""
+    for obj in (e, getattr(e, "response", None)):
+        if getattr(obj, "status_code", None) == 429 or getattr(obj, "status", None) == 429:
+            return True
+    return getattr(e, "status", None) in _QUOTA_STATUSES or "OverQueryLimit" in type(e).__name__
+
+def should_fall_back(e: BaseException) -> bool:
+    return not (is_quota_error(e) or isinstance(e, deadline.DeadlineExceeded))
+
+
+class Hedger:
+    def __init__(self, name: str, quantile: float = HEDGE_QUANTILE, max_rate: float = HEDGE_MAX_RATE,
+                 burst: float = HEDGE_BURST, default_delay: float = HEDGE_DEFAULT_DELAY,
+                 min_delay: float = HEDGE_MIN_DELAY, window: int = 200, min_samples: int = 20,
+                 workers: int = HEDGE_WORKERS):
+        self.name = name
+        self.quantile = quantile
+        self.max_rate = max_rate
+        self.burst = burst
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._latencies: deque = deque(maxlen=window)
+        self._tokens = burst
+        self._lock = threading.Lock()
+        self.workers = workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                                thread_name_prefix=f"hedge-{self.name}")
+            return self._pool
+
+    # ---------- policy ----------
+    def delay(self) -> float:
+        """p90 (``quantile``) of the primary's recent latencies (calls that returned)."""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < self.min_samples:
+            return self.default_delay
+        idx = min(len(samples) - 1, int(self.quantile * len(samples)))
+        return max(self.min_delay, samples[idx])
+
+    def _earn(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.max_rate)
+
+    def _spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def _observe(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    # ---------- running ----------
+    def run(self, primary: Callable[[], Any], backup: Optional[Callable[[], Any]] = None,
+            is_good: Callable[[Any], bool] = bool,
+            fall_back: Callable[[BaseException], bool] = should_fall_back) -> Any:
+        """Result of whichever attempt answers well first. Without a hedge that is the
+        primary's result; if it raised and ``fall_back(exc)``, the backup's. If neither
+        is good, the last result is returned (or the last attempt's exception re-raised)."""
+        backup = backup or primary
+        self._earn()
+        started = threading.Event()
+
+        def timed():
+            t0 = time.perf_counter()
+            started.set()
+            r = primary()
+            self._observe(time.perf_counter() - t0)
+            return r
+
+        first = self._executor().submit(contextvars.copy_context().run, timed)
+        # time spent queued for a pool thread is not upstream latency: the p90 clock
+        # starts with the call, so a busy pool does not make every call look slow
+        started.wait(self._bounded(None))
+        done, _ = wait([first], timeout=self._bounded(self.delay()))
+        if not done:
+            if self._spend():
+                HEDGE_FIRED.inc(name=self.name, reason="slow")
+                return self._race(first, backup, is_good)
+            HEDGE_FIRED.inc(name=self.name, reason="budget")
+            wait([first], timeout=self._bounded(None))
+            if not first.done():
+                HEDGE_CALLS.inc(name=self.name, winner="none")
+                raise deadline.DeadlineExceeded(f"{self.name}: no answer before the deadline")
+
+        error = first.exception()
+        if error is None:
+            HEDGE_CALLS.inc(name=self.name, winner="primary")
+            return first.result()
+        if not fall_back(error):
+            HEDGE_FIRED.inc(name=self.name, reason="quota" if is_quota_error(error) else "deadline")
+            HEDGE_CALLS.inc(name=self.name, winner="none")
+            return _result(first)
+        # the primary failed: plain fallback, not counted against the hedge budget
+        HEDGE_FIRED.inc(name=self.name, reason="failed")
+        return self._finish_backup(backup, is_good, first)
+
+    def _race(self, first, backup, is_good):
+        second = self._executor().submit(contextvars.copy_context().run, backup)
+        pending = {first: "primary", second: "backup"}
+        last = first
+        while pending:
+            done, _ = wait(list(pending), timeout=self._bounded(None), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for fut in done:
+                label = pending.pop(fut)
+                last = fut
+                ok, value = _outcome(fut, is_good)
+                if ok:
+                    for other in pending:
+                        other.cancel()
+                    HEDGE_CALLS.inc(name=self.name, winner=label)
+                    return value
+        HEDGE_CALLS.inc(name=self.name, winner="none")
+        if pending:
+            raise deadline.DeadlineExceeded(f"{self.name}: no answer before the deadline")
+        return _result(last)
+
+    def _finish_backup(self, backup, is_good, first):
+        try:
+            value = backup()
+        except Exception:
+            HEDGE_CALLS.inc(name=self.name, winner="none")
+            return _result(first)
+        HEDGE_CALLS.inc(name=self.name, winner="backup" if is_good(value) else "none")
+        return value
+
+    @staticmethod
+    def _bounded(seconds: Optional[float]) -> Optional[float]:
+        left = deadline.remaining()
+        if left is None:
+            return seconds
+        left = max(0.0, left)
+        return left if seconds is None else min(seconds, left)
+
+
+def _outcome(fut, is_good) -> tuple:
+    try:
+        value = fut.result()
+    except Exception:
+        return False, None
+    return is_good(value), value
+
+def _result(fut):
+    # re-raises the attempt's exception, like calling it directly
+    return fut.result()
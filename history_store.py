@@ -0,0 +1,319 @@
+# history_store.py — search history with a raw window, daily rollups and monthly partitions
+#
+# server.py used to keep every search of every user in one history.json that was read
+# and rewritten whole on each search, and GET /api/history returned all of it. Now:
+#
+#   APP_DATA_DIR/history/2026-10.json    raw entries of one month  {email: {id: entry}}
+#   APP_DATA_DIR/history/rollups.json    daily aggregates:
+#       users:  {email: {day: {"searches": n, "cities": {city: n}}}}
+#       cities: {day: {city: {"searches": n, "users": n}}}
+#       through: last day already rolled up
+#
+#   store = HistoryStore(DATA_DIR / "history", legacy=DATA_DIR / "history.json")
+#   store.add(email, entry)              -> id (entry gets "savedAt")
+#   store.list(email)                    -> entries of the last HISTORY_RAW_DAYS days
+#   store.summary(email, days=30)        -> per-day counts + top cities (rollups + recent raw)
+#   store.city_summary(days=30)          -> per-city totals for everyone
+#   store.rollup()                       -> roll finished days up, drop expired partitions
+#
+# A write touches only the current month's file, and a listing reads at most the
+# months inside the raw window. Expiring a month is one unlink; rollups older than
+# HISTORY_ROLLUP_DAYS are pruned the same way, so the files stop growing with the user
+# base's age. RetentionWorker runs rollup() every HISTORY_ROLLUP_INTERVAL seconds.
+#
+# Config (env): HISTORY_RAW_DAYS, HISTORY_ROLLUP_DAYS, HISTORY_ROLLUP_INTERVAL
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import uuid
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import city_index
+from applog import get_logger
+
+log = get_logger(__name__)
+
+HISTORY_RAW_DAYS = int(os.getenv("HISTORY_RAW_DAYS", "90"))
+HISTORY_ROLLUP_DAYS = int(os.getenv("HISTORY_ROLLUP_DAYS", "730"))
+HISTORY_ROLLUP_INTERVAL = float(os.getenv("HISTORY_ROLLUP_INTERVAL", "3600"))
+
+ROLLUPS = "rollups.json"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _month(d: date) -> str:
+    return f"{d.year:04d}-{d.month:02d}"
+
+def _months(first: date, last: date) -> List[str]:
+    out, y, m = [], first.year, first.month
+    while (y, m) <= (last.year, last.month):
+        out.append(f"{y:04d}-{m:02d}")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return out
+
+def _day(entry: Dict[str, Any]) -> Optional[str]:
+    saved = entry.get("savedAt")
+    return saved[:10] if isinstance(saved, str) and len(saved) >= 10 else None
+
+def city_key(city: Any) -> str:
+    """One spelling per city in the aggregates ("Bucuresti" and "Bucharest" together)."""
+    name = str(city or "").strip()
+    found = city_index.lookup(name)
+    return found.name if found else (name.title() or "?")
+
+
+class HistoryStore:
+    def __init__(self, root: Path, legacy: Optional[Path] = None,
+                 raw_days: int = HISTORY_RAW_DAYS, rollup_days: int = HISTORY_ROLLUP_DAYS):
+        self.root = root
+        self.legacy = legacy
+        self.raw_days = raw_days
+        self.rollup_days = rollup_days
+        self._lock = threading.RLock()
+
+    # ---------- files ----------
+    def _path(self, month: str) -> Path:
+        return self.root / f"{month}.json"
+
+    def _read(self, path: Path, default):
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    def _write(self, path: Path, data):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        tmp.replace(path)
+
+    def partitions(self) -> List[str]:
+        if not self.root.exists():
+            return []
+        return sorted(p.stem for p in self.root.glob("[0-9][0-9][0-9][0-9]-[0-9][0-9].json"))
+
+    def cutoff(self, now: Optional[datetime] = None) -> date:
+        """First day still kept raw."""
+        return (now or _utcnow()).date() - timedelta(days=self.raw_days - 1)
+
+    def generation(self, now: Optional[datetime] = None) -> str:
+        """Changes whenever a listing can change: a write to the current month (any
+        worker) or the window sliding past a day. For ETags."""
+        now = now or _utcnow()
+        try:
+            st = self._path(_month(now.date())).stat()
+            stamp = f"{st.st_mtime_ns}-{st.st_size}"
+        except OSError:
+            stamp = "0"
+        return f"{stamp}-{self.cutoff(now).isoformat()}"
+
+    # ---------- raw entries ----------
+    def add(self, email: str, entry: Dict[str, Any], now: Optional[datetime] = None) -> str:
+        now = now or _utcnow()
+        self.migrate()
+        key = uuid.uuid4().hex
+        path = self._path(_month(now.date()))
+        with self._lock:
+            data = self._read(path, {})
+            data.setdefault(email, {})[key] = dict(entry, savedAt=now.isoformat(timespec="seconds"))
+            self._write(path, data)
+        return key
+
+    def _entries(self, email: Optional[str], since: date, now: datetime) -> Iterable[Tuple[str, Dict[str, Any]]]:
+        """(email, entry) pairs saved on or after ``since``, oldest month first."""
+        for month in _months(since, now.date()):
+            data = self._read(self._path(month), {})
+            users = [email] if email is not None else list(data)
+            for user in users:
+                for entry in (data.get(user) or {}).values():
+                    day = _day(entry)
+                    if day is not None and day >= since.isoformat():
+                        yield user, entry
+
+    def list(self, email: str, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        now = now or _utcnow()
+        self.migrate()
+        return [e for _, e in self._entries(email, self.cutoff(now), now)]
+
+    # ---------- aggregates ----------
+    def _rollups(self) -> Dict[str, Any]:
+        doc = self._read(self.root / ROLLUPS, {})
+        doc.setdefault("users", {})
+        doc.setdefault("cities", {})
+        doc.setdefault("through", None)
+        return doc
+
+    def summary(self, email: str, days: int = 30, now: Optional[datetime] = None) -> Dict[str, Any]:
+        now = now or _utcnow()
+        self.migrate()
+        since = now.date() - timedelta(days=max(1, days) - 1)
+        doc = self._rollups()
+        per_day: Dict[str, Dict[str, Any]] = {}
+        for day, agg in (doc["users"].get(email) or {}).items():
+            if day >= since.isoformat():
+                per_day[day] = {"searches": agg["searches"], "cities": Counter(agg["cities"])}
+        # days not rolled up yet come from the raw partitions
+        through = doc["through"]
+        raw_since = max(since, date.fromisoformat(through) + timedelta(days=1)) if through else since
+        for _, entry in self._entries(email, raw_since, now):
+            d = per_day.setdefault(_day(entry), {"searches": 0, "cities": Counter()})
+            d["searches"] += 1
+            d["cities"][city_key(entry.get("city"))] += 1
+        cities: Counter = Counter()
+        for d in per_day.values():
+            cities.update(d["cities"])
+        return {
+            "days": [{"date": day, "searches": d["searches"], "cities": dict(d["cities"])}
+                     for day, d in sorted(per_day.items(), reverse=True)],
+            "total": sum(d["searches"] for d in per_day.values()),
+            "topCities": [{"city": c, "searches": n} for c, n in cities.most_common(5)],
+            "rawWindowDays": self.raw_days,
+        }
+
+    def city_summary(self, days: int = 30, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Searches and distinct users per city over the last ``days`` days, today included
+        (same window as summary(); only rolled-up days count, so today is always empty)."""
+        now = now or _utcnow()
+        since = (now.date() - timedelta(days=max(1, days) - 1)).isoformat()
+        totals: Dict[str, Counter] = {}
+        for day, per_city in self._rollups()["cities"].items():
+            if day >= since:
+                for city, agg in per_city.items():
+                    totals.setdefault(city, Counter()).update(agg)
+        return sorted(({"city": c, "searches": t["searches"], "userDays": t["users"]}
+                       for c, t in totals.items()), key=lambda r: -r["searches"])
+
+    # ---------- retention ----------
+    def rollup(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Aggregate every finished day after the last rollup, then drop partitions that
+        are entirely outside the raw window and rollup days past HISTORY_ROLLUP_DAYS."""
+        now = now or _utcnow()
+        self.migrate()
+        yesterday = now.date() - timedelta(days=1)
+        with self._lock:
+            doc = self._rollups()
+            through = date.fromisoformat(doc["through"]) if doc["through"] else None
+            first = through + timedelta(days=1) if through else None
+            rolled = 0
+            if first is None:
+                months = self.partitions()
+                first = date.fromisoformat(months[0] + "-01") if months else yesterday + timedelta(days=1)
+            if first <= yesterday:
+                users: Dict[str, Dict[str, Dict[str, Any]]] = doc["users"]
+                day_users: Dict[Tuple[str, str], set] = {}
+                for email, entry in self._entries(None, first, now):
+                    day = _day(entry)
+                    if day > yesterday.isoformat():
+                        continue  # today is still open
+                    city = city_key(entry.get("city"))
+                    agg = users.setdefault(email, {}).setdefault(day, {"searches": 0, "cities": {}})
+                    agg["searches"] += 1
+                    agg["cities"][city] = agg["cities"].get(city, 0) + 1
+                    c = doc["cities"].setdefault(day, {}).setdefault(city, {"searches": 0, "users": 0})
+                    c["searches"] += 1
+                    seen = day_users.setdefault((day, city), set())
+                    if email not in seen:
+                        seen.add(email)
+                        c["users"] += 1
+                    rolled += 1
+                doc["through"] = yesterday.isoformat()
+
+            # raw partitions: a month goes once its last day is before the window
+            # (only after its days were rolled up)
+            cutoff = self.cutoff(now)
+            dropped = []
+            for month in self.partitions():
+                y, m = map(int, month.split("-"))
+                last_day = (date(y + (m == 12), m % 12 + 1, 1) - timedelta(days=1))
+                if last_day < cutoff and doc["through"] and last_day.isoformat() <= doc["through"]:
+                    self._path(month).unlink(missing_ok=True)
+                    dropped.append(month)
+
+            # rollup retention
+            oldest = (now.date() - timedelta(days=self.rollup_days)).isoformat()
+            pruned = 0
+            for email in list(doc["users"]):
+                old = [d for d in doc["users"][email] if d < oldest]
+                for d in old:
+                    del doc["users"][email][d]
+                pruned += len(old)
+                if not doc["users"][email]:
+                    del doc["users"][email]
+            for d in [d for d in doc["cities"] if d < oldest]:
+                del doc["cities"][d]
+            self._write(self.root / ROLLUPS, doc)
+        stats = {"rolled": rolled, "through": doc["through"], "dropped_partitions": dropped,
+                 "pruned_user_days": pruned}
+        log.info("history_rollup", extra=stats)
+        return stats
+
+    # ---------- legacy history.json ----------
+    def migrate(self):
+        """Move the old single-file history into monthly partitions (once). Entries
+        had no timestamp; they are dated by the file's last modification."""
+        if self.legacy is None or not self.legacy.exists():
+            return
+        with self._lock:
+            if not self.legacy.exists():
+                return
+            old = self._read(self.legacy, {})
+            stamp = datetime.fromtimestamp(self.legacy.stat().st_mtime, timezone.utc)
+            path = self._path(_month(stamp.date()))
+            data = self._read(path, {})
+            for email, entries in (old or {}).items():
+                for key, entry in (entries or {}).items():
+                    if isinstance(entry, dict):
+                        data.setdefault(email, {})[key] = dict(
+                            entry, savedAt=entry.get("savedAt") or stamp.isoformat(timespec="seconds"))
+            self._write(path, data)
+            self.legacy.replace(self.legacy.with_suffix(".json.migrated"))
+            log.info("history_migrated", extra={"users": len(old or {}), "partition": path.name})
+
+
+# ---------- periodic ----------
+class RetentionWorker:
+    """Calls ``fn`` every ``interval`` seconds on a daemon thread (errors are logged)."""
+
+    def __init__(self, fn: Callable[[], Any], interval: float = HISTORY_ROLLUP_INTERVAL,
+                 name: str = "history-retention"):
+        self.fn = fn
+        self.interval = interval
+        self.name = name
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.fn()
+            except Exception as e:
+                log.warning("history_retention_failed", extra={"worker": self.name, "error": str(e)})
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def run_and_schedule(self):
+        """Readiness check: one pass now, then every ``interval`` seconds."""
+        try:
+            return self.fn()
+        finally:
+            self.start()
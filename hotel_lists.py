@@ -0,0 +1,243 @@
+# hotel_lists.py — streaming ingestion of Amadeus hotels.by_city responses
+#
+# by_city returns every hotel of a city (thousands for London or Paris), each with
+# address, geoCode, distance, chain code, ... The SDK reads the whole body, decodes it
+# and json.loads it before we look at a single id. Here the body is read in chunks
+# and the "data" array is decoded one hotel at a time, keeping only what we use:
+#
+#   from hotel_lists import fetch_by_city, has_hotels
+#   hl = fetch_by_city("PAR")        -> HotelList: ids, names, lat/lon as array('d')
+#   hl.ids[:3], len(hl)
+#   has_hotels("PAR")                -> True after the first hotel; the connection is closed
+#
+# With the real SDK client the request is made directly (same host, bearer token and
+# `http` hook -> deadline.urlopen), because the SDK cannot hand back an unread body.
+# Other clients (upstream_sim, test fakes) go through
+# reference_data.locations.hotels.by_city.get and are projected the same way.
+#
+# Config (env): HOTEL_LIST_CHUNK, HOTEL_LIST_MAX_ITEM
+
+from __future__ import annotations
+
+import codecs
+import json
+import math
+import os
+from array import array
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode
+from urllib.request import Request
+
+import deadline
+from providers import get_provider
+from tracing import counter, upstream
+
+HOTEL_LIST_CHUNK = int(os.getenv("HOTEL_LIST_CHUNK", str(64 * 1024)))
+# one hotel object larger than this means a broken body, not a big city
+HOTEL_LIST_MAX_ITEM = int(os.getenv("HOTEL_LIST_MAX_ITEM", str(1024 * 1024)))
+
+BY_CITY_PATH = "/v1/reference-data/locations/hotels/by-city"
+
+HOTEL_LIST_ITEMS = counter("hotel_list_items_total", "Hotels decoded from by_city responses")
+HOTEL_LIST_BYTES = counter("hotel_list_bytes_total", "by_city response bytes read")
+
+
+class HotelList:
+    """The projection of a by_city answer: ids, names and coordinates in flat columns
+    (NaN where a hotel has no geoCode)."""
+
+    __slots__ = ("city_code", "ids", "names", "lat", "lon", "complete")
+
+    def __init__(self, city_code: str):
+        self.city_code = city_code
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.lat = array("d")
+        self.lon = array("d")
+        self.complete = True   # False when reading stopped at `limit`
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, hotel: Dict[str, Any]):
+        hotel_id = hotel.get("hotelId")
+        if not hotel_id:
+            return
+        geo = hotel.get("geoCode") or {}
+        self.ids.append(str(hotel_id))
+        self.names.append(str(hotel.get("name") or ""))
+        self.lat.append(_float(geo.get("latitude")))
+        self.lon.append(_float(geo.get("longitude")))
+
+    def coordinates(self, i: int) -> Optional[Tuple[float, float]]:
+        lat, lon = self.lat[i], self.lon[i]
+        return None if math.isnan(lat) or math.isnan(lon) else (lat, lon)
+
+def _float(v) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+# ---------- incremental JSON ----------
+_WS = " \t\r\n"
+_NUMBER_TAIL = frozenset("0123456789.eE+-")
+
+class _Stream:
+    """Text buffer over byte chunks; consumed text is dropped so the buffer stays at
+    about one chunk plus the value being decoded."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.bytes = 0
+
+    def more(self) -> bool:
+        if self.eof:
+            return False
+        for chunk in self._chunks:
+            if not chunk:
+                continue
+            self.bytes += len(chunk)
+            self.buf = self.buf[self.pos:] + self._decoder.decode(chunk)
+            self.pos = 0
+            return True
+        self.buf = self.buf[self.pos:] + self._decoder.decode(b"", final=True)
+        self.pos = 0
+        self.eof = True
+        return False
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at the end of the body)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.more():
+                return ""
+
+    def expect(self, ch: str):
+        if self.peek() != ch:
+            raise ValueError(f"by_city: expected {ch!r} at byte ~{self.bytes}")
+        self.pos += 1
+
+    def value(self, decoder=json.JSONDecoder()) -> Any:
+        """Decode one JSON value, reading more chunks until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                end = None
+            # a number cut by the chunk boundary ("12", "12.", "1e") may continue in the
+            # next chunk: it is complete only when something else follows it
+            if end is not None and (self.eof or (end < len(self.buf) and not (
+                    isinstance(value, (int, float)) and self.buf[end] in _NUMBER_TAIL))):
+                self.pos = end
+                return value
+            if len(self.buf) - self.pos > HOTEL_LIST_MAX_ITEM:
+                raise ValueError(f"by_city: value larger than {HOTEL_LIST_MAX_ITEM} bytes")
+            if not self.more() and end is None:
+                raise ValueError("by_city: truncated response")
+
+def iter_array(chunks: Iterable[bytes], key: str = "data") -> Iterator[Any]:
+    """Yield the items of the top-level ``key`` array of a JSON object body as they
+    arrive. Other top-level members ("meta", "warnings") are decoded and dropped."""
+    s = _Stream(chunks)
+    s.expect("{")
+    if s.peek() == "}":
+        return
+    while True:
+        name = s.value()
+        s.expect(":")
+        if name == key and s.peek() == "[":
+            s.expect("[")
+            if s.peek() != "]":
+                while True:
+                    yield s.value()
+                    if s.peek() == ",":
+                        s.pos += 1
+                        continue
+                    break
+            s.expect("]")
+        else:
+            s.value()
+        if s.peek() == ",":
+            s.pos += 1
+            continue
+        s.expect("}")
+        return
+
+
+# ---------- fetch ----------
+def _raw_capable(client) -> bool:
+    # the amadeus SDK Client, not a simulator / fake with only the resource tree
+    return all(hasattr(client, a) for a in ("host", "ssl", "port", "http")) and callable(client.http)
+
+def _bearer(client) -> str:
+    token = getattr(client, "access_token", None)
+    if token is None:
+        from amadeus.client.access_token import AccessToken
+
+        token = client.access_token = AccessToken(client)   # the slot the SDK memoizes in
+    return token._bearer_token()
+
+def _open_raw(client, city_code: str):
+    scheme = "https" if client.ssl else "http"
+    port = "" if (client.ssl and client.port == 443) or (not client.ssl and client.port == 80) else f":{client.port}"
+    url = f"{scheme}://{client.host}{port}{BY_CITY_PATH}?{urlencode({'cityCode': city_code})}"
+    req = Request(url, headers={"Authorization": _bearer(client),
+                                "Accept": "application/vnd.amadeus+json, application/json"})
+    return client.http(req)   # deadline.urlopen: the request budget is the timeout
+
+def _chunks(resp) -> Iterator[bytes]:
+    while True:
+        try:
+            chunk = resp.read(HOTEL_LIST_CHUNK)
+        except OSError as e:   # read timeout: the budget ran out mid-body
+            deadline.raise_if_expired("upstream", e)
+            raise
+        if not chunk:
+            return
+        HOTEL_LIST_BYTES.inc(len(chunk))
+        yield chunk
+
+def collect(items: Iterable[Dict[str, Any]], city_code: str, limit: Optional[int] = None) -> HotelList:
+    out = HotelList(city_code)
+    if limit is not None and limit <= 0:
+        out.complete = False
+        return out
+    for hotel in items:
+        if isinstance(hotel, dict):
+            out.add(hotel)
+        if limit is not None and len(out) >= limit:
+            out.complete = False   # the rest of the body is never read
+            break
+    HOTEL_LIST_ITEMS.inc(len(out))
+    return out
+
+def fetch_by_city(city_code: str, limit: Optional[int] = None,
+                  client_factory: Callable[[], Any] = lambda: get_provider("amadeus")) -> HotelList:
+    """Hotels of a city, projected while the body streams in. Stops reading (and closes
+    the connection) after ``limit`` hotels. HTTP errors propagate (urllib HTTPError /
+    the SDK's ResponseError)."""
+    client = client_factory()
+    with upstream("amadeus", "hotels_by_city"):
+        if not _raw_capable(client):
+            response = client.reference_data.locations.hotels.by_city.get(cityCode=city_code)
+            return collect(response.data or [], city_code, limit)
+        resp = _open_raw(client, city_code)
+        try:
+            hotels = collect(iter_array(_chunks(resp)), city_code, limit)
+        finally:
+            resp.close()
+        return hotels
+
+def has_hotels(city_code: str, **kw) -> bool:
+    """True as soon as the first hotel of the city is decoded."""
+    return len(fetch_by_city(city_code, limit=1, **kw)) > 0
@@ -0,0 +1,293 @@
+# html_extract.py — fast rating / map-link extraction without a browser
+#
+# Booking renders the rating div and the map link server-side, so a plain HTTP GET is
+# enough for most hotels. Pages are fetched through a pooled requests.Session, streamed
+# into a small CSS-selector-aware HTMLParser and the download stops as soon as every
+# field is found. Only URLs whose required fields are still missing go to the browser
+# pool (scraper.ScraperPool).
+#
+#   results = extract_many(urls)            # [{"url", "rating", "map_link", "source", "error"}]
+#
+# Selectors are the same shape as scraper.DEFAULT_SELECTORS: field -> (css, attr|None).
+# Supported CSS: tag, .class, #id, [attr], [attr=value] compounds, joined by spaces
+# (descendant combinator), e.g. "div.review-score div.b5cd09854e".
+
+from __future__ import annotations
+
+import codecs
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from cache import MISSING, get_cache
+from scraper import DEFAULT_SELECTORS, Selectors
+from tracing import record_cache, upstream
+
+EXTRACT_TIMEOUT = float(os.getenv("EXTRACT_TIMEOUT", "10"))
+EXTRACT_MAX_BYTES = int(os.getenv("EXTRACT_MAX_BYTES", str(4 * 1024 * 1024)))
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "8"))
+EXTRACT_CACHE_TTL = int(os.getenv("EXTRACT_CACHE_TTL", str(24 * 3600)))
+# optional JSON override, e.g. {"rating": ["div.score", null], "map_link": ["a.map", "href"]}
+EXTRACT_SELECTORS = os.getenv("EXTRACT_SELECTORS")
+
+USER_AGENT = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/124.0 Safari/537.36")
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+             "meta", "param", "source", "track", "wbr"}
+
+
+# ---------- CSS selectors ----------
+_SIMPLE = re.compile(r"""
+    (?P<tag>^[a-zA-Z][a-zA-Z0-9-]*|^\*)
+    | \.(?P<cls>[-\w]+)
+    | \#(?P<id>[-\w]+)
+    | \[(?P<attr>[-\w]+)(?:=(?P<q>["']?)(?P<val>[^\]"']*)(?P=q))?\]
+""", re.X)
+
+class Compound:
+    __slots__ = ("tag", "classes", "id", "attrs")
+
+    def __init__(self, text: str):
+        self.tag: Optional[str] = None
+        self.classes: List[str] = []
+        self.id: Optional[str] = None
+        self.attrs: List[Tuple[str, Optional[str]]] = []
+        pos = 0
+        while pos < len(text):
+            m = _SIMPLE.match(text, pos)
+            if not m or m.end() == pos:
+                raise ValueError(f"unsupported selector: {text!r}")
+            if m.group("tag") and m.group("tag") != "*":
+                self.tag = m.group("tag").lower()
+            elif m.group("cls"):
+                self.classes.append(m.group("cls"))
+            elif m.group("id"):
+                self.id = m.group("id")
+            elif m.group("attr"):
+                self.attrs.append((m.group("attr").lower(), m.group("val")))
+            pos = m.end()
+
+    def matches(self, tag: str, attrs: Dict[str, Optional[str]]) -> bool:
+        if self.tag and self.tag != tag:
+            return False
+        if self.id and attrs.get("id") != self.id:
+            return False
+        if self.classes:
+            have = (attrs.get("class") or "").split()
+            if any(c not in have for c in self.classes):
+                return False
+        for name, val in self.attrs:
+            if name not in attrs or (val is not None and attrs[name] != val):
+                return False
+        return True
+
+def parse_selector(css: str) -> List[Compound]:
+    return [Compound(part) for part in css.split()]
+
+
+# ---------- streaming parser ----------
+class FieldParser(HTMLParser):
+    """Collects the first match of every selector; ``done`` once all are found."""
+
+    def __init__(self, selectors: Selectors):
+        super().__init__(convert_charrefs=True)
+        self.fields = {f: (parse_selector(css), attr) for f, (css, attr) in selectors.items()}
+        self.values: Dict[str, Optional[str]] = {f: None for f in selectors}
+        self._found = set()
+        # open elements: (tag, attrs)
+        self._stack: List[Tuple[str, Dict[str, Optional[str]]]] = []
+        # text fields being captured: field -> (stack depth, parts)
+        self._capturing: Dict[str, Tuple[int, List[str]]] = {}
+
+    @property
+    def done(self) -> bool:
+        return len(self._found) == len(self.fields) and not self._capturing
+
+    def _match(self, chain: Sequence[Compound]) -> bool:
+        tag, attrs = self._stack[-1]
+        if not chain[-1].matches(tag, attrs):
+            return False
+        i = len(chain) - 2
+        for anc_tag, anc_attrs in reversed(self._stack[:-1]):
+            if i < 0:
+                break
+            if chain[i].matches(anc_tag, anc_attrs):
+                i -= 1
+        return i < 0
+
+    def handle_starttag(self, tag, attrs_list):
+        attrs = {k.lower(): v for k, v in attrs_list}
+        self._stack.append((tag, attrs))
+        for field, (chain, attr) in self.fields.items():
+            if field in self._found or not self._match(chain):
+                continue
+            self._found.add(field)
+            if attr:
+                self.values[field] = attrs.get(attr.lower())
+            else:
+                self._capturing[field] = (len(self._stack), [])
+        if tag in VOID_TAGS:
+            self._close_to(len(self._stack) - 1)
+
+    def handle_startendtag(self, tag, attrs_list):
+        self.handle_starttag(tag, attrs_list)
+        if tag not in VOID_TAGS:
+            self._close_to(len(self._stack) - 1)
+
+    def handle_endtag(self, tag):
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                self._close_to(i)
+                return
+
+    def handle_data(self, data):
+        for _, parts in self._capturing.values():
+            parts.append(data)
+
+    def _close_to(self, depth: int):
+        del self._stack[depth:]
+        for field, (d, parts) in list(self._capturing.items()):
+            if d > depth:
+                self.values[field] = " ".join("".join(parts).split()) or None
+                del self._capturing[field]
+
+
+# ---------- extractor ----------
+def _load_selectors(selectors: Optional[Selectors]) -> Selectors:
+    if selectors:
+        return dict(selectors)
+    if EXTRACT_SELECTORS:
+        return {k: (v[0], v[1]) for k, v in json.loads(EXTRACT_SELECTORS).items()}
+    return dict(DEFAULT_SELECTORS)
+
+class Extractor:
+    """HTTP + streaming parser first; browser pool only for pages that need it."""
+
+    def __init__(self, selectors: Optional[Selectors] = None, required: Optional[Iterable[str]] = None,
+                 fallback: bool = True, browser_pool=None, timeout: float = EXTRACT_TIMEOUT,
+                 max_bytes: int = EXTRACT_MAX_BYTES, workers: int = EXTRACT_WORKERS,
+                 cache_ttl: int = EXTRACT_CACHE_TTL, session=None):
+        self.selectors = _load_selectors(selectors)
+        self.required = set(required) if required is not None else set(self.selectors)
+        self.fallback = fallback
+        self.timeout, self.max_bytes, self.workers = timeout, max_bytes, workers
+        self.cache_ttl = cache_ttl
+        self.cache = get_cache("extract_results")
+        self._browser_pool = browser_pool
+        self._session = session
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            s.headers.update({"User-Agent": USER_AGENT, "Accept-Language": "en-US,en;q=0.8"})
+            self._session = s
+        return self._session
+
+    def _cache_key(self, url: str) -> str:
+        return url + "|" + json.dumps(self.selectors, sort_keys=True)
+
+    def fetch_fields(self, url: str) -> Dict[str, Optional[str]]:
+        """Stream ``url`` through FieldParser; stops reading once every field is found."""
+        parser = FieldParser(self.selectors)
+        with upstream("http", "extract"):
+            resp = self.session.get(url, stream=True, timeout=self.timeout)
+            try:
+                resp.raise_for_status()
+                decoder = codecs.getincrementaldecoder(resp.encoding or "utf-8")(errors="replace")
+                read = 0
+                for chunk in resp.iter_content(chunk_size=16 * 1024):
+                    read += len(chunk)
+                    parser.feed(decoder.decode(chunk))
+                    if parser.done or read >= self.max_bytes:
+                        break
+                else:
+                    parser.feed(decoder.decode(b"", final=True))
+                    parser.close()
+            finally:
+                resp.close()
+        return parser.values
+
+    def _fast(self, url: str) -> Dict[str, Optional[str]]:
+        try:
+            return {"url": url, **self.fetch_fields(url), "source": "http", "error": None}
+        except Exception as e:
+            return {"url": url, **{k: None for k in self.selectors}, "source": "http", "error": str(e)}
+
+    def _needs_browser(self, result) -> bool:
+        return any(result.get(f) is None for f in self.required)
+
+    def extract(self, url: str) -> Dict[str, Optional[str]]:
+        return self.extract_many([url])[0]
+
+    def extract_many(self, urls: Iterable[str]) -> List[Dict[str, Optional[str]]]:
+        urls = list(urls)
+        results: List[Optional[dict]] = [None] * len(urls)
+        todo: Dict[str, List[int]] = {}
+        for i, url in enumerate(urls):
+            hit = self.cache.get(self._cache_key(url), MISSING)
+            record_cache(self.cache.namespace, hit is not MISSING)
+            if hit is not MISSING:
+                results[i] = hit
+            else:
+                todo.setdefault(url, []).append(i)
+
+        if todo:
+            self.session  # build the pooled session before worker threads share it
+            with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(todo)))) as ex:
+                fast = dict(zip(todo, ex.map(self._fast, todo)))
+
+            slow = [u for u, r in fast.items() if self._needs_browser(r)]
+            if slow and self.fallback:
+                for u, r in zip(slow, self._browser().scrape_many(slow)):
+                    # keep whatever the HTTP pass already found
+                    merged = {k: (r.get(k) if r.get(k) is not None else fast[u].get(k)) for k in self.selectors}
+                    fast[u] = {"url": u, **merged, "source": "browser", "error": r.get("error")}
+
+            for u, r in fast.items():
+                if r["error"] is None and self.cache_ttl > 0:
+                    self.cache.set(self._cache_key(u), r, ttl=self.cache_ttl)
+                for i in todo[u]:
+                    results[i] = r
+        return results  # type: ignore[return-value]
+
+    def _browser(self):
+        if self._browser_pool is None:
+            from scraper import ScraperPool
+            self._browser_pool = ScraperPool(selectors=self.selectors)
+        return self._browser_pool
+
+    def close(self):
+        if self._browser_pool is not None:
+            self._browser_pool.close()
+        if self._session is not None:
+            self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default: Optional[Extractor] = None
+
+def extract_many(urls: Iterable[str], **kwargs) -> List[Dict[str, Optional[str]]]:
+    """Batch API on a shared Extractor (pass kwargs to build a dedicated one)."""
+    global _default
+    if kwargs:
+        with Extractor(**kwargs) as ex:
+            return ex.extract_many(urls)
+    if _default is None:
+        _default = Extractor()
+    return _default.extract_many(urls)
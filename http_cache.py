@@ -0,0 +1,239 @@
+# http_cache.py — response compression + ETag / conditional GET for server.py
+#
+# CompressionETagMiddleware (pure ASGI, sits in front of the FastAPI app):
+#   - strong ETags (content hash) for static files, If-None-Match -> 304
+#   - gzip / brotli compression above a size threshold, Vary: Accept-Encoding
+#   - honours ETags already set by endpoints (weak ETags for per-user lists)
+#
+# Helpers for endpoints that can answer 304 *before* serializing anything:
+#   VersionCounter, weak_etag(), etag_matches()
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import brotli  # type: ignore
+except Exception:
+    brotli = None  # type: ignore
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+# suffix added inside a strong ETag when the representation is compressed
+_ENCODING_SUFFIX = {"gzip": "-gzip", "br": "-br"}
+
+
+# ---------- ETag helpers ----------
+def strong_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def weak_etag(*parts) -> str:
+    raw = "\x1f".join(str(p) for p in parts).encode("utf-8")
+    return 'W/"' + hashlib.sha1(raw).hexdigest()[:20] + '"'
+
+def _opaque(tag: str) -> str:
+    """Strip W/ prefix and our encoding suffix -> comparable opaque tag."""
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    tag = tag.strip('"')
+    for suffix in _ENCODING_SUFFIX.values():
+        if tag.endswith(suffix):
+            tag = tag[: -len(suffix)]
+            break
+    return tag
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """Weak comparison as required for If-None-Match (RFC 9110 §13.1.2)."""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = _opaque(etag)
+    return any(_opaque(t) == wanted for t in if_none_match.split(",") if t.strip())
+
+
+class VersionCounter:
+    """Per-key version numbers, bumped on every write; feeds weak ETags."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: Dict[Tuple, int] = {}
+
+    def get(self, *key) -> int:
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def bump(self, *key) -> int:
+        with self._lock:
+            v = self._versions.get(key, 0) + 1
+            self._versions[key] = v
+            return v
+
+
+# ---------- content negotiation ----------
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br (if the brotli module is installed) or gzip from Accept-Encoding."""
+    offered: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        parts = [p.strip() for p in item.split(";")]
+        if not parts[0]:
+            continue
+        q = 1.0
+        for p in parts[1:]:
+            if p.startswith("q="):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        offered[parts[0].lower()] = q
+    star = offered.get("*", 0.0)
+    if brotli is not None and offered.get("br", star) > 0:
+        return "br"
+    if offered.get("gzip", star) > 0:
+        return "gzip"
+    return None
+
+def compress(body: bytes, encoding: str, level: int = 6) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=min(11, level))  # type: ignore[union-attr]
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+# ---------- middleware ----------
+class CompressionETagMiddleware:
+    """Buffers each response, tags static files, answers 304s and compresses.
+
+    Bodies larger than ``max_buffer`` are streamed through untouched.
+    Compressed static bodies are memoized by (etag, encoding), so a hot
+    index.html is hashed once per request but compressed only once.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, compresslevel: int = 6,
+                 static_paths: Iterable[str] = ("/",),
+                 static_prefixes: Iterable[str] = ("/static/",),
+                 max_buffer: int = 8 * 1024 * 1024, memo_size: int = 64):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+        self.static_paths = tuple(static_paths)
+        self.static_prefixes = tuple(static_prefixes)
+        self.max_buffer = max_buffer
+        self.memo_size = memo_size
+        self._memo: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._memo_lock = threading.Lock()
+
+    def _is_static(self, path: str) -> bool:
+        return path in self.static_paths or path.startswith(self.static_prefixes)
+
+    def _compress_cached(self, etag: Optional[str], body: bytes, encoding: str) -> bytes:
+        if not etag:
+            return compress(body, encoding, self.compresslevel)
+        key = (etag, encoding)
+        with self._memo_lock:
+            hit = self._memo.get(key)
+            if hit is not None:
+                self._memo.move_to_end(key)
+                return hit
+        out = compress(body, encoding, self.compresslevel)
+        with self._memo_lock:
+            self._memo[key] = out
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return out
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        req_headers = {k.decode("latin-1").lower(): v.decode("latin-1")
+                       for k, v in scope.get("headers") or []}
+        method = scope.get("method", "GET")
+        is_static = method == "GET" and self._is_static(scope.get("path", ""))
+        if_none_match = req_headers.get("if-none-match")
+        encoding = choose_encoding(req_headers.get("accept-encoding", ""))
+
+        start: Optional[dict] = None
+        chunks: List[bytes] = []
+        size = 0
+        passthrough = False
+
+        async def wrapped_send(message):
+            nonlocal start, size, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            more = message.get("more_body", False)
+            if more and size > self.max_buffer:
+                passthrough = True
+                await send(start)
+                await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": True})
+                chunks.clear()
+                return
+            if not more:
+                await self._finish(send, start, b"".join(chunks), is_static, if_none_match, encoding, method)
+
+        await self.app(scope, receive, wrapped_send)
+
+    async def _finish(self, send, start, body, is_static, if_none_match, encoding, method):
+        status_code = start["status"]
+        headers = [(k.decode("latin-1").lower(), v.decode("latin-1")) for k, v in start.get("headers", [])]
+        hmap = dict(headers)
+
+        def put(name, value):
+            nonlocal headers
+            headers = [(k, v) for k, v in headers if k != name] + [(name, value)]
+
+        etag = hmap.get("etag")
+        if status_code == 200 and is_static and "content-encoding" not in hmap:
+            etag = strong_etag(body)
+            put("etag", etag)
+            if "cache-control" not in hmap:
+                put("cache-control", "no-cache")
+
+        ctype = hmap.get("content-type", "")
+        will_compress = (encoding is not None and status_code == 200 and method != "HEAD"
+                         and len(body) >= self.minimum_size
+                         and "content-encoding" not in hmap
+                         and ctype.startswith(COMPRESSIBLE_TYPES))
+        if will_compress:
+            vary = hmap.get("vary")
+            put("vary", f"{vary}, Accept-Encoding" if vary else "Accept-Encoding")
+            if etag and not etag.startswith("W/"):
+                put("etag", etag[:-1] + _ENCODING_SUFFIX[encoding] + '"')
+
+        if status_code == 200 and method in ("GET", "HEAD") and etag_matches(if_none_match, etag):
+            keep = ("etag", "cache-control", "vary", "expires", "content-location")
+            headers = [(k, v) for k, v in headers if k in keep]
+            await send({"type": "http.response.start", "status": 304,
+                        "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if will_compress:
+            body = self._compress_cached(etag if is_static else None, body, encoding)
+            put("content-encoding", encoding)
+
+        if method != "HEAD":
+            put("content-length", str(len(body)))
+        start = dict(start)
+        start["headers"] = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+        await send(start)
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,238 @@
+# jobs.py — in-process background jobs for slow, optional enrichments
+#
+# The search answers with prices right away and hands the slow extras (transit
+# lookups, scraping) to a job; the client polls GET /api/jobs/{id} for the result.
+#
+#   jobs = get_job_queue()
+#
+#   @jobs.handler("transit")
+#   def enrich(ctx, payload):
+#       for i, h in enumerate(payload["hotels"]):
+#           ...
+#           ctx.progress(i + 1, len(payload["hotels"]))
+#       return {...}
+#
+#   job = jobs.submit("transit", payload, key="transit:<hash>")   # same key -> same job
+#   jobs.wait(job["id"], timeout=5)                               # long-poll (thread)
+#   await jobs.wait_async(job["id"], timeout=5)                   # long-poll (async route)
+#
+# The worker that owns a job keeps its record in its own table, outside the LRU caches,
+# while it is queued or running and for JOBS_RESULT_TTL seconds after it finishes: a
+# burst of jobs or progress updates cannot evict a record a client is still polling.
+# With CACHE_BACKEND=sqlite/redis every update is also copied to get_cache("jobs"), so
+# any worker can answer the status request (a shared store may still evict under
+# memory pressure; size it for the job rate).
+#
+# Long-poll only waits in the worker that owns the job; any other worker returns the
+# current record at once and the client simply polls again. With several workers and
+# no sticky routing, expect ?wait= to degrade to plain polling. HTTP routes use
+# wait_async(), which checks the job every JOBS_POLL_INTERVAL seconds on the event
+# loop, so a waiting client holds no threadpool thread.
+#
+# progress(partial=...) stores a deep copy: the handler keeps filling its own dicts
+# while status requests serialize the record.
+#
+# Config (env): JOBS_WORKERS, JOBS_MAX_QUEUED, JOBS_RESULT_TTL, JOBS_POLL_INTERVAL
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from cache import get_cache
+from tracing import counter, histogram
+
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+JOBS_MAX_QUEUED = int(os.getenv("JOBS_MAX_QUEUED", "256"))
+JOBS_RESULT_TTL = int(os.getenv("JOBS_RESULT_TTL", "3600"))
+JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", "0.05"))
+
+JOBS_TOTAL = counter("jobs_total", "Background jobs by kind and final status")
+JOB_SECONDS = histogram("job_duration_seconds", "Background job run time")
+
+Handler = Callable[["JobContext", Any], Any]
+
+
+class QueueFull(Exception):
+    """Raised by submit() when JOBS_MAX_QUEUED jobs are already waiting."""
+
+
+class JobContext:
+    def __init__(self, jobs: "JobQueue", job: Dict[str, Any]):
+        self._jobs = jobs
+        self._job = job
+
+    @property
+    def id(self) -> str:
+        return self._job["id"]
+
+    def progress(self, done: int, total: int, partial: Any = None):
+        """Report progress; ``partial`` (optional) is exposed as the job result so far.
+        It is copied, so the handler may keep updating the objects it passed."""
+        self._job["progress"] = {"done": done, "total": total}
+        if partial is not None:
+            self._job["result"] = copy.deepcopy(partial)
+        self._jobs._save(self._job)
+
+
+class JobQueue:
+    """Bounded queue + worker threads + TTL'd job records with idempotency keys."""
+
+    def __init__(self, workers: int = JOBS_WORKERS, max_queued: int = JOBS_MAX_QUEUED,
+                 result_ttl: int = JOBS_RESULT_TTL):
+        self.workers = max(1, workers)
+        self.result_ttl = result_ttl
+        self.store = get_cache("jobs")
+        self.keys = get_cache("job_keys")
+        self._shared = self.store.name != "memory"   # other workers read it
+        # this worker's job records (never evicted) and the finished ones' expiry,
+        # oldest first: the TTL is fixed, so finishing order is expiry order
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._expiry: "OrderedDict[str, float]" = OrderedDict()
+        self._records_lock = threading.Lock()
+        self._handlers: Dict[str, Handler] = {}
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=max_queued)
+        self._pending: Dict[str, tuple] = {}
+        self._done: Dict[str, threading.Event] = {}
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def handler(self, kind: str):
+        def deco(fn: Handler) -> Handler:
+            self._handlers[kind] = fn
+            return fn
+        return deco
+
+    # ---------- client side ----------
+    def submit(self, kind: str, payload: Any, key: Optional[str] = None) -> Dict[str, Any]:
+        if kind not in self._handlers:
+            raise KeyError(f"no handler for job kind {kind!r}")
+        with self._lock:
+            if key:
+                existing = self.get(self.keys.get(key) or "")
+                if existing and existing["status"] != "failed":
+                    return existing
+            self._start()
+            now = time.time()
+            job = {"id": uuid.uuid4().hex, "kind": kind, "key": key, "status": "queued",
+                   "progress": None, "result": None, "error": None,
+                   "createdAt": now, "updatedAt": now}
+            try:
+                self._queue.put_nowait(job["id"])
+            except queue.Full:
+                JOBS_TOTAL.inc(kind=kind, status="rejected")
+                raise QueueFull(f"{self._queue.qsize()} jobs already queued")
+            self._pending[job["id"]] = (job, payload)
+            self._done[job["id"]] = threading.Event()
+            self._save(job)
+            if key:
+                self.keys.set(key, job["id"], ttl=self.result_ttl)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not job_id:
+            return None
+        with self._records_lock:
+            self._expire(time.time())
+            job = self._records.get(job_id)
+        if job is not None:
+            return dict(job)
+        return self.store.get(job_id) if self._shared else None
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Block up to ``timeout`` seconds for a job started in this process to finish;
+        for a job owned by another worker this returns the shared record right away."""
+        ev = self._done.get(job_id)
+        if ev is not None and timeout > 0:
+            ev.wait(timeout)
+        return self.get(job_id)
+
+    async def wait_async(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """wait() for async routes: polls the job on the event loop, holding no thread."""
+        ev = self._done.get(job_id)
+        if ev is not None and timeout > 0:
+            end = time.monotonic() + timeout
+            while not ev.is_set():
+                left = end - time.monotonic()
+                if left <= 0:
+                    break
+                await asyncio.sleep(min(JOBS_POLL_INTERVAL, left))
+        if self._shared:   # may be a sqlite / redis read
+            return await asyncio.get_running_loop().run_in_executor(None, self.get, job_id)
+        return self.get(job_id)
+
+    # ---------- worker side ----------
+    def _save(self, job: Dict[str, Any]):
+        now = job["updatedAt"] = time.time()
+        record = dict(job)
+        with self._records_lock:
+            self._records[job["id"]] = record
+            if job["status"] in ("done", "failed"):
+                self._expiry[job["id"]] = now + self.result_ttl
+            self._expire(now)
+        if self._shared:
+            self.store.set(job["id"], record, ttl=self.result_ttl)
+
+    def _expire(self, now: float):
+        while self._expiry:
+            job_id, expires = next(iter(self._expiry.items()))
+            if expires > now:
+                return
+            del self._expiry[job_id]
+            self._records.pop(job_id, None)
+
+    def _start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"jobs-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            with self._lock:
+                job, payload = self._pending.pop(job_id)
+            job["status"] = "running"
+            self._save(job)
+            t0 = time.perf_counter()
+            try:
+                job["result"] = self._handlers[job["kind"]](JobContext(self, job), payload)
+                job["status"] = "done"
+            except Exception as e:
+                job["status"], job["error"] = "failed", f"{type(e).__name__}: {e}"
+            JOB_SECONDS.observe(time.perf_counter() - t0, kind=job["kind"])
+            JOBS_TOTAL.inc(kind=job["kind"], status=job["status"])
+            self._save(job)
+            ev = self._done.pop(job_id, None)
+            if ev is not None:
+                ev.set()
+
+    def shutdown(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+        self._threads.clear()
+
+
+_jobs: Optional[JobQueue] = None
+_jobs_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    global _jobs
+    if _jobs is None:
+        with _jobs_lock:
+            if _jobs is None:
+                _jobs = JobQueue()
+    return _jobs
@@ -2,23 +2,54 @@
 # NEW TRANSPORT FINDER USING PLACES API (NEW)
 
 import requests
-import googlemaps
 import os
+import deadline
 from dotenv import load_dotenv
+from cache import MISSING, coord_key, get_cache
+from tracing import record_cache, upstream
+from providers import get_provider
+from hedging import Hedger
+from applog import HOT_SAMPLE, get_logger
+from transit_index import nearest_station
 
 load_dotenv()
+log = get_logger(__name__)
 
-# Still use googlemaps for distance matrix (it works)
-gmaps = googlemaps.Client(key=os.getenv("GOOGLE_MAPS_API_KEY"))
+TRANSIT_CACHE_TTL = int(os.getenv("TRANSIT_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Places (new) is the primary; if it is slower than its usual p90 the geocode
+# fallback starts in parallel and the first answer wins (hedging.py). A fast answer
+# stands, "no station nearby" and HTTP errors included, as before the hedge; only an
+# exception (timeout, connection error) goes on to the fallback, and never a 429
+TRANSIT_HEDGE = Hedger("transit_places_new")
+
+# Still use googlemaps for distance matrix (it works); the client is built on first
+# use (providers.py) so importing this module needs no key and no network
+def __getattr__(name):
+    if name == "gmaps":
+        return get_provider("gmaps")
+    raise AttributeError(f"module 'new_transport' has no attribute {name!r}")
 
 def cel_mai_apropiat_transport_new_api(lat, lon, radius=1000):
-    """Find nearest transport using the new Places API"""
-    api_key = os.getenv("GOOGLE_MAPS_API_KEY")
-    
-    if not api_key:
-        print("❌ Google Maps API key not found")
+    """Find nearest transport using the new Places API, hedged with the geocode fallback"""
+    if not os.getenv("GOOGLE_MAPS_API_KEY"):
+        log.warning("google_maps_key_missing")
         return None
-    
+    try:
+        return TRANSIT_HEDGE.run(lambda: _places_new_api(lat, lon, radius),
+                                 lambda: try_fallback_method(lat, lon),
+                                 is_good=_complete)
+    except Exception as e:
+        log.warning("transit_lookup_failed", extra={"lat": lat, "lon": lon, "error": str(e)})
+        return None
+
+def _complete(result):
+    # a station with a walking time; "Unknown" answers lose to the other attempt
+    return bool(result) and result.get("duration") != "Unknown"
+
+def _places_new_api(lat, lon, radius=1000):
+    api_key = os.getenv("GOOGLE_MAPS_API_KEY")
+
     # Use the NEW Places API endpoint
     url = "https://places.googleapis.com/v1/places:searchNearby"
     
@@ -43,71 +74,74 @@ def cel_mai_apropiat_transport_new_api(lat, lon, radius=1000):
         }
     }
     
-    try:
-        print(f"🔍 Searching for transport near {lat}, {lon}...")
-        response = requests.post(url, json=data, headers=headers)
+    log.debug("places_search", extra={"lat": lat, "lon": lon})
+    with upstream("google", "places_search_nearby"):
+        response = requests.post(url, json=data, headers=headers, timeout=deadline.timeout())
+    
+    if response.status_code == 200:
+        result = response.json()
+        places = result.get('places', [])
         
-        if response.status_code == 200:
-            result = response.json()
-            places = result.get('places', [])
+        if places:
+            # Get the nearest station
+            nearest_station = places[0]
+            station_name = nearest_station['displayName']['text']
+            station_location = nearest_station['location']
+            station_lat = station_location['latitude']
+            station_lng = station_location['longitude']
             
-            if places:
-                # Get the nearest station
-                nearest_station = places[0]
-                station_name = nearest_station['displayName']['text']
-                station_location = nearest_station['location']
-                station_lat = station_location['latitude']
-                station_lng = station_location['longitude']
-                
-                print(f"🚇 Found station: {station_name}")
-                
-                # Calculate distance using Distance Matrix API (this still works)
+            log.debug("places_station", extra={"station": station_name})
+            
+            # Calculate distance using Distance Matrix API (this still works)
+            gmaps = get_provider("gmaps")
+            with upstream("google", "distance_matrix"):
                 distance_result = gmaps.distance_matrix(
                     origins=[(lat, lon)],
                     destinations=[(station_lat, station_lng)],
                     mode="walking"
                 )
+            
+            if distance_result["rows"][0]["elements"][0]["status"] == "OK":
+                element = distance_result["rows"][0]["elements"][0]
+                distance = element["distance"]["text"]
+                duration = element["duration"]["text"]
                 
-                if distance_result["rows"][0]["elements"][0]["status"] == "OK":
-                    element = distance_result["rows"][0]["elements"][0]
-                    distance = element["distance"]["text"]
-                    duration = element["duration"]["text"]
-                    
-                    print(f"🚇 Cea mai apropiată stație: {station_name}")
-                    print(f"Distanța este {distance}. Timpul estimat este {duration}")
-                    
-                    return {
-                        "station_name": station_name,
-                        "distance": distance,
-                        "duration": duration,
-                        "latitude": station_lat,
-                        "longitude": station_lng
-                    }
-                else:
-                    print(f"⚠️  Found station but couldn't calculate distance")
-                    return {
-                        "station_name": station_name,
-                        "distance": "Unknown",
-                        "duration": "Unknown"
-                    }
+                log.info("transit_found", extra={"source": "places", "station": station_name,
+                                                 "distance": distance, "duration": duration,
+                                                 "sample": HOT_SAMPLE})
+                
+                return {
+                    "station_name": station_name,
+                    "distance": distance,
+                    "duration": duration,
+                    "latitude": station_lat,
+                    "longitude": station_lng
+                }
             else:
-                print("❌ No transit stations found nearby")
-                return None
+                log.warning("transit_distance_unavailable", extra={"station": station_name})
+                return {
+                    "station_name": station_name,
+                    "distance": "Unknown",
+                    "duration": "Unknown"
+                }
         else:
-            print(f"❌ API request failed: {response.status_code}")
-            print(f"Response: {response.text}")
+            log.info("transit_none_nearby", extra={"lat": lat, "lon": lon, "sample": HOT_SAMPLE})
             return None
-            
-    except Exception as e:
-        print(f"❌ Error in new Places API: {e}")
-        return try_fallback_method(lat, lon)
+    else:
+        log.warning("places_http_error", extra={"status": response.status_code,
+                                                "body": response.text[:300]})
+        if response.status_code == 429:
+            # quota: raise so the hedge knows not to spend more Google calls on it
+            response.raise_for_status()
+        return None
+        
 
 # alta metoda in caz ca nu merge apiul nou incearca cu geocoding
 
 def try_fallback_method(lat, lon):
     """Fallback to a simpler approach using Geocoding API"""
     try:
-        print("🔄 Trying fallback method...")
+        log.debug("geocode_fallback", extra={"lat": lat, "lon": lon})
         
         # Use reverse geocoding to get nearby places
         api_key = os.getenv("GOOGLE_MAPS_API_KEY")
@@ -122,7 +156,8 @@ def try_fallback_method(lat, lon):
             'result_type': 'transit_station|bus_station|subway_station'
         }
         
-        response = requests.get(url, params=params)
+        with upstream("google", "geocode"):
+            response = requests.get(url, params=params, timeout=deadline.timeout())
         
         if response.status_code == 200:
             data = response.json()
@@ -131,14 +166,16 @@ def try_fallback_method(lat, lon):
                 station_name = station['formatted_address']
                 station_location = station['geometry']['location']
                 
-                print(f"🚇 Fallback found: {station_name}")
+                log.debug("geocode_station", extra={"station": station_name})
                 
                 # Calculate distance
-                distance_result = gmaps.distance_matrix(
-                    origins=[(lat, lon)],
-                    destinations=[(station_location['lat'], station_location['lng'])],
-                    mode="walking"
-                )
+                gmaps = get_provider("gmaps")
+                with upstream("google", "distance_matrix"):
+                    distance_result = gmaps.distance_matrix(
+                        origins=[(lat, lon)],
+                        destinations=[(station_location['lat'], station_location['lng'])],
+                        mode="walking"
+                    )
                 
                 if distance_result["rows"][0]["elements"][0]["status"] == "OK":
                     element = distance_result["rows"][0]["elements"][0]
@@ -151,20 +188,31 @@ def try_fallback_method(lat, lon):
                         "duration": duration
                     }
         
-        print("❌ Fallback method also failed")
+        log.info("geocode_fallback_no_result", extra={"lat": lat, "lon": lon, "sample": HOT_SAMPLE})
         return None
         
     except Exception as e:
-        print(f"❌ Fallback method error: {e}")
+        log.warning("geocode_fallback_failed", extra={"error": str(e)})
         return None
 
 def cel_mai_apropiat_transport(lat, lon):
     """Main function - replaces your original function"""
-    result = cel_mai_apropiat_transport_new_api(lat, lon)
+    # cities with an imported GTFS feed are answered offline (transit_index.py)
+    result = nearest_station(lat, lon)
+    if result is MISSING:
+        cache = get_cache("transit_places_new")
+        key = coord_key(lat, lon)
+        result = cache.get(key, MISSING)
+        record_cache(cache.namespace, result is not MISSING)
+    if result is MISSING:
+        result = cel_mai_apropiat_transport_new_api(lat, lon)
+        # only complete answers are cached; failures are retried next time
+        if _complete(result):
+            cache.set(key, result, ttl=TRANSIT_CACHE_TTL)
     
     if not result:
         # If new API fails, return a default response
-        print("⚠️  Could not find transport info, using default response")
+        log.info("transit_unavailable", extra={"lat": lat, "lon": lon, "sample": HOT_SAMPLE})
         return {
             "station_name": "Transport information unavailable",
             "distance": "Unknown",
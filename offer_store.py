@@ -0,0 +1,191 @@
+# offer_store.py — per-night view of past hotel_offers_search responses
+#
+# Exact-key caching treats 12–15 Dec and 13–15 Dec as unrelated searches. Here every
+# priced offer is split into nights (hotel, night, adults) -> price per night in EUR,
+# using Amadeus' price.variations.changes when present, otherwise spread evenly.
+# An empty response only proves that *some* night of that range is unavailable, so it
+# is stored as a range: any later stay that contains the whole range is unavailable too.
+#
+#   store = get_offer_store()
+#   est = store.estimate(hid, "2025-12-13", "2025-12-15", adults=2, budget=300)
+#   est.status  -> "likely" | "unknown" | "over_budget" | "unavailable"
+#   ids = store.prioritise(hotel_ids, check_in, check_out, adults, budget)
+#
+# Lookups are counted in offer_store_lookups_total{result=full|partial|miss}, separately
+# from the exact-key cache_requests_total. prioritise() reads the whole candidate list
+# with two CacheBackend.get_many calls (MGET on Redis, one IN query on SQLite).
+
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from cache import MISSING, get_cache
+from tracing import counter
+
+OFFER_NIGHT_TTL = int(os.getenv("OFFER_NIGHT_TTL", str(6 * 3600)))
+OFFER_STORE_MAXSIZE = int(os.getenv("OFFER_STORE_MAXSIZE", "65536"))
+OFFER_BUDGET_SLACK = float(os.getenv("OFFER_BUDGET_SLACK", "1.2"))  # skip only if clearly over
+
+LOOKUPS = counter("offer_store_lookups_total", "Per-night offer store lookups by coverage")
+DECISIONS = counter("offer_store_decisions_total", "Hotels skipped or reordered from cached nights")
+
+Day = Union[date, str]
+
+def _day(d: Day) -> date:
+    return date.fromisoformat(d) if isinstance(d, str) else d
+
+def nights(check_in: Day, check_out: Day) -> List[date]:
+    start, end = _day(check_in), _day(check_out)
+    return [start + timedelta(days=i) for i in range((end - start).days)]
+
+
+@dataclass
+class Estimate:
+    status: str                        # likely | unknown | over_budget | unavailable
+    coverage: float                    # share of nights with a cached price
+    known_eur: float = 0.0             # sum over cached nights
+    estimated_eur: Optional[float] = None
+
+
+class OfferStore:
+    def __init__(self, ttl: int = OFFER_NIGHT_TTL, slack: float = OFFER_BUDGET_SLACK):
+        self.ttl = ttl
+        self.slack = slack
+        self.nights = get_cache("offer_nights", maxsize=OFFER_STORE_MAXSIZE)
+        self.gaps = get_cache("offer_gaps", maxsize=OFFER_STORE_MAXSIZE)
+
+    @staticmethod
+    def _night_key(hotel_id: str, night: date, adults: int) -> str:
+        return f"{hotel_id}|{night.isoformat()}|{adults}"
+
+    @staticmethod
+    def _gap_key(hotel_id: str, adults: int) -> str:
+        return f"{hotel_id}|{adults}"
+
+    # ---------- recording ----------
+    def record_offer(self, hotel_id: str, check_in: Day, check_out: Day, adults: int,
+                     total_eur: float, price: Optional[Dict[str, Any]] = None):
+        """Store the per-night split of one priced offer. ``price`` is the raw Amadeus
+        price object; its variations.changes give the real per-night amounts."""
+        stay = nights(check_in, check_out)
+        if not stay or not total_eur or total_eur <= 0:
+            return
+        per_night = {n: total_eur / len(stay) for n in stay}
+        changes = ((price or {}).get("variations") or {}).get("changes") or []
+        try:
+            total_native = float(price["total"]) if price else 0.0
+            if changes and total_native > 0:
+                ratio = total_eur / total_native  # same FX rate for every night
+                split: Dict[date, float] = {}
+                for ch in changes:
+                    span_nights = nights(ch["startDate"], ch["endDate"])
+                    amount = float(ch.get("total") or ch.get("base"))
+                    for n in span_nights:
+                        split[n] = amount / len(span_nights) * ratio
+                if set(split) == set(stay):
+                    per_night = split
+        except (KeyError, TypeError, ValueError):
+            pass
+        for n, eur in per_night.items():
+            self.nights.set(self._night_key(hotel_id, n, adults), round(eur, 2), ttl=self.ttl)
+
+    def record_unavailable(self, hotel_id: str, check_in: Day, check_out: Day, adults: int):
+        stay = nights(check_in, check_out)
+        if not stay:
+            return
+        if len(stay) == 1:
+            self.nights.set(self._night_key(hotel_id, stay[0], adults), False, ttl=self.ttl)
+            return
+        key = self._gap_key(hotel_id, adults)
+        now = time.time()
+        gaps = [g for g in self.gaps.get(key) or [] if g[2] > now]
+        gaps.append([stay[0].isoformat(), _day(check_out).isoformat(), now + self.ttl])
+        self.gaps.set(key, gaps[-32:], ttl=self.ttl)
+
+    # ---------- queries ----------
+    def estimate(self, hotel_id: str, check_in: Day, check_out: Day, adults: int,
+                 budget: Optional[float] = None) -> Estimate:
+        stay = nights(check_in, check_out)
+        if not stay:
+            return Estimate("unknown", 0.0)
+        gaps = self.gaps.get(self._gap_key(hotel_id, adults))
+        values = self.nights.get_many([self._night_key(hotel_id, n, adults) for n in stay], MISSING)
+        return self._judge(stay, _day(check_out), gaps, values, budget)
+
+    def _judge(self, stay: List[date], end: date, gaps: Optional[list], values: List[Any],
+               budget: Optional[float]) -> Estimate:
+        """Estimate for one hotel from its cached gap ranges and per-night values."""
+        start = stay[0]
+        now = time.time()
+        for g_in, g_out, expires in gaps or []:
+            if expires > now and start <= _day(g_in) and _day(g_out) <= end:
+                LOOKUPS.inc(result="full")
+                return Estimate("unavailable", 1.0)
+
+        known, total = 0, 0.0
+        for v in values:
+            if v is MISSING:
+                continue
+            if v is False:
+                LOOKUPS.inc(result="full")
+                return Estimate("unavailable", 1.0)
+            known += 1
+            total += float(v)
+
+        coverage = known / len(stay)
+        LOOKUPS.inc(result="full" if known == len(stay) else "partial" if known else "miss")
+        if not known:
+            return Estimate("unknown", 0.0)
+        est = Estimate("unknown", coverage, round(total, 2), round(total / known * len(stay), 2))
+        if budget is not None and total > budget * self.slack:
+            # cached nights alone already exceed the budget; the rest only add to it
+            est.status = "over_budget"
+        elif known == len(stay):
+            est.status = "likely"
+        return est
+
+    def prioritise(self, hotel_ids: Iterable[str], check_in: Day, check_out: Day, adults: int,
+                   budget: Optional[float] = None) -> List[str]:
+        """Hotels worth a live call, best first: fully cached and within budget (cheapest
+        first), then partially cached by estimate, then unknown; drops the rest.
+        Runs before the first live call, so the whole candidate list is read in two
+        batched lookups (gaps, then every hotel-night) instead of one per key."""
+        hotel_ids = list(hotel_ids)
+        stay = nights(check_in, check_out)
+        if not stay or not hotel_ids:
+            return hotel_ids
+        end = _day(check_out)
+        gaps = self.gaps.get_many([self._gap_key(str(h), adults) for h in hotel_ids])
+        values = self.nights.get_many(
+            [self._night_key(str(h), n, adults) for h in hotel_ids for n in stay], MISSING)
+
+        likely, partial, unknown = [], [], []
+        for i, hid in enumerate(hotel_ids):
+            est = self._judge(stay, end, gaps[i], values[i * len(stay):(i + 1) * len(stay)], budget)
+            if est.status in ("unavailable", "over_budget"):
+                DECISIONS.inc(decision=est.status)
+                continue
+            if est.status == "likely":
+                likely.append((est.estimated_eur, hid))
+            elif est.coverage > 0:
+                partial.append((est.estimated_eur, hid))
+            else:
+                unknown.append(hid)
+        if likely or partial:
+            DECISIONS.inc(len(likely) + len(partial), decision="reordered")
+        likely.sort(key=lambda t: t[0])
+        partial.sort(key=lambda t: t[0])
+        return [h for _, h in likely] + [h for _, h in partial] + unknown
+
+
+_store: Optional[OfferStore] = None
+
+def get_offer_store() -> OfferStore:
+    global _store
+    if _store is None:
+        _store = OfferStore()
+    return _store
@@ -0,0 +1,215 @@
+# price_stats.py — per-city / per-season price distributions learned from observed offers
+#
+# Every priced offer we see is folded into small log-bucket sketches (relative error ~2%):
+#   (city, season, adults)          -> price per night (EUR)     typical range for the city
+#   (city, season, adults, nights)  -> total stay price (EUR)    typical range for N nights
+#   (city, season, adults, hotel)   -> price per night (EUR)     cheapest seen for the hotel
+# Prices depend on occupancy, so a hotel only seen at 4-adult prices says nothing about
+# a 1-adult search: every key carries the number of adults.
+#
+# The search uses it to skip hotels whose cheapest price ever seen is far above the budget
+# (no offer call, no FX conversion) and to answer "typical price range" instantly.
+# Stored as JSON under APP_DATA_DIR (tmp-then-replace), one copy per worker.
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import random
+import threading
+from datetime import date
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+from tracing import counter
+
+PRICE_STATS_FILE = Path(os.getenv("APP_DATA_DIR", "./app_data")) / "price_stats.json"
+PRICE_SKIP_SLACK = float(os.getenv("PRICE_SKIP_SLACK", "1.5"))      # skip if min > budget * slack
+PRICE_SKIP_MIN_SAMPLES = int(os.getenv("PRICE_SKIP_MIN_SAMPLES", "2"))
+PRICE_SKIP_EXPLORE = float(os.getenv("PRICE_SKIP_EXPLORE", "0.05"))  # re-check skipped hotels now and then
+PRICE_STATS_FLUSH_EVERY = int(os.getenv("PRICE_STATS_FLUSH_EVERY", "50"))
+
+PREFILTER_SKIPPED = counter("price_prefilter_skipped_total",
+                            "Hotels skipped before the offer call (historical price far above budget)")
+
+SEASONS = {12: "winter", 1: "winter", 2: "winter", 3: "spring", 4: "spring", 5: "spring",
+           6: "summer", 7: "summer", 8: "summer", 9: "autumn", 10: "autumn", 11: "autumn"}
+
+def season_of(day: Union[date, str]) -> str:
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    return SEASONS[day.month]
+
+def nights_between(check_in: Union[date, str], check_out: Union[date, str]) -> int:
+    if isinstance(check_in, str):
+        check_in = date.fromisoformat(check_in)
+    if isinstance(check_out, str):
+        check_out = date.fromisoformat(check_out)
+    return max(1, (check_out - check_in).days)
+
+
+class Sketch:
+    """Mergeable log-bucket quantile sketch (DDSketch style) for positive values."""
+
+    __slots__ = ("gamma", "buckets", "count", "min", "max")
+
+    def __init__(self, rel_accuracy: float = 0.02):
+        self.gamma = (1 + rel_accuracy) / (1 - rel_accuracy)
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, x: float):
+        if x <= 0:
+            return
+        i = math.ceil(math.log(x, self.gamma))
+        self.buckets[i] = self.buckets.get(i, 0) + 1
+        self.count += 1
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if seen > rank:
+                # bucket midpoint (relative error bounded by rel_accuracy)
+                value = 2 * self.gamma ** i / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_json(self):
+        return {"b": {str(k): v for k, v in self.buckets.items()}, "n": self.count,
+                "min": self.min if self.count else None, "max": self.max}
+
+    @classmethod
+    def from_json(cls, d) -> "Sketch":
+        s = cls()
+        s.buckets = {int(k): v for k, v in d["b"].items()}
+        s.count = d["n"]
+        s.min = d["min"] if d.get("min") is not None else math.inf
+        s.max = d["max"]
+        return s
+
+
+Key = Tuple[str, ...]
+# key length per kind; files written before adults joined the keys are dropped on load
+_KEY_LEN = {"city": 4, "nights": 5, "hotel": 5}
+
+class PriceStats:
+    def __init__(self, path: Optional[Path] = PRICE_STATS_FILE):
+        self.path = path
+        self._sketches: Dict[Key, Sketch] = {}
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self.load()
+
+    def __len__(self):
+        return len(self._sketches)
+
+    # ---------- updates ----------
+    def observe(self, city_code: str, hotel_id: str, check_in: Union[date, str], nights: int,
+                total_eur: float, adults: int = 1):
+        if not total_eur or total_eur <= 0 or nights < 1:
+            return
+        season = season_of(check_in)
+        per_night = total_eur / nights
+        a = str(adults)
+        with self._lock:
+            for key, value in (
+                (("city", city_code, season, a), per_night),
+                (("nights", city_code, season, a, str(nights)), total_eur),
+                (("hotel", city_code, season, a, hotel_id), per_night),
+            ):
+                self._sketches.setdefault(key, Sketch()).add(value)
+            self._dirty += 1
+            flush = self.path is not None and self._dirty >= PRICE_STATS_FLUSH_EVERY
+        if flush:
+            self.save()
+
+    # ---------- queries ----------
+    def hotel_min_per_night(self, city_code: str, hotel_id: str, season: str, adults: int = 1,
+                            min_samples: int = PRICE_SKIP_MIN_SAMPLES) -> Optional[float]:
+        s = self._sketches.get(("hotel", city_code, season, str(adults), hotel_id))
+        if s is None or s.count < min_samples:
+            return None
+        return s.min
+
+    def should_skip(self, city_code: str, hotel_id: str, check_in: Union[date, str], nights: int,
+                    budget: Optional[float], adults: int = 1, slack: float = PRICE_SKIP_SLACK,
+                    explore: float = PRICE_SKIP_EXPLORE) -> bool:
+        """True when the cheapest stay ever seen for this hotel, for this many adults,
+        is far above ``budget``."""
+        if budget is None or nights < 1:
+            return False
+        lowest = self.hotel_min_per_night(city_code, hotel_id, season_of(check_in), adults)
+        if lowest is None or lowest * nights <= budget * slack:
+            return False
+        # occasionally let one through so a price drop is noticed
+        if random.random() < explore:
+            return False
+        PREFILTER_SKIPPED.inc(city=city_code)
+        return True
+
+    def typical_range(self, city_code: str, check_in: Union[date, str], nights: int,
+                      adults: int = 1) -> Optional[dict]:
+        """p25 / median / p75 of the total price for ``nights`` nights, in EUR."""
+        season = season_of(check_in)
+        a = str(adults)
+        s = self._sketches.get(("nights", city_code, season, a, str(nights)))
+        factor, basis = 1, "nights"
+        if s is None or s.count < 3:
+            # not enough stays of this length: scale the per-night distribution
+            s = self._sketches.get(("city", city_code, season, a))
+            factor, basis = nights, "per_night"
+        if s is None or not s.count:
+            return None
+        return {
+            "low": round(s.quantile(0.25) * factor, 2),
+            "median": round(s.quantile(0.5) * factor, 2),
+            "high": round(s.quantile(0.75) * factor, 2),
+            "samples": s.count,
+            "season": season,
+            "basis": basis,
+        }
+
+    # ---------- persistence ----------
+    def load(self):
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                raw = json.load(f)
+            keys = ((tuple(k.split("|")), v) for k, v in raw.items())
+            self._sketches = {k: Sketch.from_json(v) for k, v in keys if _KEY_LEN.get(k[0]) == len(k)}
+        except Exception:
+            self._sketches = {}
+
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            data = {"|".join(k): s.to_json() for k, s in self._sketches.items()}
+            self._dirty = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        tmp.replace(self.path)
+
+
+_stats: Optional[PriceStats] = None
+_stats_lock = threading.Lock()
+
+def get_price_stats() -> PriceStats:
+    global _stats
+    if _stats is None:
+        with _stats_lock:
+            if _stats is None:
+                _stats = PriceStats()
+    return _stats
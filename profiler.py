@@ -0,0 +1,220 @@
+# profiler.py — in-process sampling profiler (no external agent)
+#
+# A Sampler thread wakes every `interval` seconds, reads sys._current_frames() and
+# counts each thread's stack. It is wall-clock sampling: threads blocked in upstream
+# calls show up in socket reads, which is exactly what a slow search looks like.
+# Nothing runs unless a profile was asked for, so the cost when idle is zero.
+#
+#   prof = profile_threads(seconds=10)          # every thread, 10 s
+#   prof.collapsed()                            # "main;search;fetch 42\n..." (flamegraph.pl, speedscope)
+#   prof.speedscope("search")                   # speedscope.app JSON
+#
+# HTTP (server.py), both guarded by ADMIN_TOKEN (X-Admin-Token header), off when unset:
+#   GET /api/admin/profile?seconds=10&format=speedscope|collapsed
+#   <any request>?profile=1[&profile_format=collapsed]  -> the profile of that request
+#     instead of its response (the original status is in X-Profiled-Status). All threads
+#     are sampled while it runs, so concurrent requests appear in it too.
+#
+# Config (env): ADMIN_TOKEN, PROFILE_INTERVAL, PROFILE_MAX_SECONDS
+
+from __future__ import annotations
+
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+
+Frame = Tuple[str, str, int]   # (function, file, first line)
+
+
+class ProfilerBusy(Exception):
+    """Only one profile runs at a time."""
+
+_busy = threading.Lock()
+
+
+def admin_token_ok(token: Optional[str]) -> bool:
+    expected = os.getenv("ADMIN_TOKEN")
+    return bool(expected) and token is not None and hmac.compare_digest(token.encode(), expected.encode())
+
+
+# ---------- sampling ----------
+class Profile:
+    def __init__(self, stacks: Counter, interval: float, duration: float, samples: int):
+        self.stacks = stacks            # tuple(Frame, ...) root first -> count
+        self.interval = interval
+        self.duration = duration
+        self.samples = samples
+
+    @staticmethod
+    def _label(f: Frame) -> str:
+        return f"{f[0]} ({os.path.basename(f[1])}:{f[2]})" if f[1] else f[0]
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's folded format: one "frame;frame;frame count" line per stack."""
+        lines = [";".join(self._label(f) for f in stack) + f" {n}"
+                 for stack, n in self.stacks.most_common()]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def speedscope(self, name: str = "profile") -> Dict[str, Any]:
+        frames: List[Dict[str, Any]] = []
+        index: Dict[Frame, int] = {}
+        samples, weights = [], []
+        for stack, n in self.stacks.most_common():
+            ids = []
+            for f in stack:
+                if f not in index:
+                    index[f] = len(frames)
+                    frames.append({"name": f[0], "file": f[1], "line": f[2]})
+                ids.append(index[f])
+            samples.append(ids)
+            weights.append(round(n * self.interval, 6))
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "profiler.py",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [{"type": "sampled", "name": name, "unit": "seconds",
+                          "startValue": 0, "endValue": round(sum(weights), 6),
+                          "samples": samples, "weights": weights}],
+        }
+
+
+class Sampler:
+    def __init__(self, interval: float = PROFILE_INTERVAL, include_idle: bool = False):
+        self.interval = max(0.001, interval)
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._t0 = 0.0
+        self._t1 = 0.0
+
+    def start(self) -> "Sampler":
+        if not _busy.acquire(blocking=False):
+            raise ProfilerBusy("a profile is already running")
+        self._t0 = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            _busy.release()
+        self._t1 = time.perf_counter()
+        return Profile(self.stacks, self.interval, self._t1 - self._t0, self.samples)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = _stack(frame)
+                if _own(stack) or (not self.include_idle and _idle(stack)):
+                    continue
+                thread = names.get(ident, str(ident))
+                # group the pool workers: "AnyIO worker thread", "ThreadPoolExecutor-3_1" -> one root
+                root = ("thread:" + thread.rstrip("0123456789_-"), "", 0)
+                self.stacks[(root,) + stack] += 1
+            self.samples += 1
+
+
+def _stack(frame) -> Tuple[Frame, ...]:
+    out = []
+    while frame is not None:
+        code = frame.f_code
+        out.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    out.reverse()
+    return tuple(out)
+
+# parked pool workers / listeners: waiting for work, not for an upstream answer
+_IDLE_LEAVES = {"wait", "get", "_worker", "select", "poll", "accept"}
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def _idle(stack: Tuple[Frame, ...]) -> bool:
+    # a blocking leaf with none of our code on the stack
+    return not stack or (stack[-1][0] in _IDLE_LEAVES
+                         and not any(f[1].startswith(_ROOT) and "site-packages" not in f[1] for f in stack))
+
+def _own(stack: Tuple[Frame, ...]) -> bool:
+    # the thread sleeping in profile_threads() is the one asking for the profile
+    return any(f[0] == "profile_threads" and f[1] == __file__ for f in stack)
+
+def profile_threads(seconds: float, interval: float = PROFILE_INTERVAL,
+                    include_idle: bool = False) -> Profile:
+    seconds = min(max(0.1, seconds), PROFILE_MAX_SECONDS)
+    sampler = Sampler(interval, include_idle).start()
+    try:
+        time.sleep(seconds)
+    finally:
+        prof = sampler.stop()
+    return prof
+
+def render(prof: Profile, fmt: str, name: str) -> Tuple[bytes, str]:
+    """(body, content type) for ``fmt`` = speedscope | collapsed."""
+    if fmt == "collapsed":
+        return prof.collapsed().encode(), "text/plain; charset=utf-8"
+    return json.dumps(prof.speedscope(name)).encode(), "application/json"
+
+
+# ---------- ?profile=1 ----------
+class ProfileMiddleware:
+    """Profiles one request when it has ?profile=1 and a valid X-Admin-Token."""
+
+    def __init__(self, app, interval: float = PROFILE_INTERVAL):
+        self.app = app
+        self.interval = interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or b"profile=" not in scope.get("query_string", b""):
+            await self.app(scope, receive, send)
+            return
+        qs = parse_qs(scope["query_string"].decode("latin-1"))
+        token = next((v.decode("latin-1") for k, v in scope.get("headers") or [] if k == b"x-admin-token"), None)
+        if qs.get("profile", ["0"])[0] not in ("1", "true") or not admin_token_ok(token):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            sampler = Sampler(self.interval).start()
+        except ProfilerBusy:
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def swallow(message):
+            # the profile replaces the response; keep only the status
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+
+        try:
+            await self.app(scope, receive, swallow)
+        finally:
+            prof = sampler.stop()
+        body, ctype = render(prof, qs.get("profile_format", ["speedscope"])[0],
+                             f"{scope.get('method')} {scope.get('path')}")
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", ctype.encode()),
+            (b"content-length", str(len(body)).encode()),
+            (b"x-profiled-status", str(status["code"]).encode()),
+            (b"x-profile-samples", str(prof.samples).encode()),
+            (b"cache-control", b"no-store"),
+        ]})
+        await send({"type": "http.response.body", "body": body})
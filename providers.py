@@ -0,0 +1,98 @@
+# providers.py — lazily built API clients (Amadeus, Google Maps)
+#
+# Nothing here touches the network or reads keys at import time: a client is built
+# on first get() and then shared. Importing server.py / baza.py stays fast and works
+# without API keys; only the first search pays for client construction.
+#
+#   from providers import get_provider
+#   amadeus = get_provider("amadeus")
+#
+# Tests and the offline simulator swap clients with override("amadeus", fake) and
+# undo it with reset("amadeus").
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Callable, Dict
+
+
+class LazyProvider:
+    """Builds its value with ``factory()`` once, on first use (thread-safe)."""
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.name = name
+        self.factory = factory
+        self._value: Any = None
+        self._built = False
+        self._lock = threading.Lock()
+
+    @property
+    def built(self) -> bool:
+        return self._built
+
+    def get(self) -> Any:
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self._value = self.factory()
+                    self._built = True
+        return self._value
+
+    def override(self, value: Any):
+        with self._lock:
+            self._value, self._built = value, True
+
+    def reset(self):
+        with self._lock:
+            self._value, self._built = None, False
+
+
+_providers: Dict[str, LazyProvider] = {}
+
+def register(name: str, factory: Callable[[], Any]) -> LazyProvider:
+    _providers[name] = LazyProvider(name, factory)
+    return _providers[name]
+
+def get_provider(name: str) -> Any:
+    return _providers[name].get()
+
+def override(name: str, value: Any):
+    _providers[name].override(value)
+
+def reset(name: str):
+    _providers[name].reset()
+
+def status() -> Dict[str, bool]:
+    """name -> already built?"""
+    return {name: p.built for name, p in _providers.items()}
+
+
+# ---------- clients ----------
+# every call gets its timeout from the request deadline (deadline.py); the Google
+# client also stops retrying once UPSTREAM_TIMEOUT is spent (its default is 60 s)
+def _amadeus_client():
+    from amadeus import Client
+
+    import deadline
+
+    return Client(
+        client_id=os.getenv("AMADEUS_CLIENT_ID"),
+        client_secret=os.getenv("AMADEUS_CLIENT_SECRET"),
+        http=deadline.urlopen,
+    )
+
+def _gmaps_client():
+    import googlemaps
+
+    import deadline
+
+    return googlemaps.Client(
+        key=os.getenv("GOOGLE_MAPS_API_KEY"),
+        timeout=deadline.UPSTREAM_TIMEOUT,
+        retry_timeout=deadline.UPSTREAM_TIMEOUT,
+        requests_session=deadline.requests_session(),
+    )
+
+register("amadeus", _amadeus_client)
+register("gmaps", _gmaps_client)
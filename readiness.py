@@ -0,0 +1,193 @@
+# readiness.py — warm-up on startup + /ready for the load balancer
+#
+# On startup every registered check runs once, in parallel, on a background thread:
+# Amadeus OAuth token, Google Maps / FX DNS+TLS and rate tables, DB pool fill, caches
+# loaded from disk. /ready answers 503 until all of them have finished and every
+# *required* check passed, so new workers only get traffic once they are warm.
+# Optional checks (upstream APIs) never keep a worker out of rotation: an outage there
+# is reported, not fatal.
+#
+#   readiness = Readiness()
+#   readiness.register("amadeus_token", prime_amadeus, required=False)
+#   readiness.register("db_pool", lambda: prime_db_pool(engine), required=True)
+#
+#   @app.on_event("startup")
+#   def _warm(): readiness.start()
+#
+#   @app.get("/ready")
+#   def ready(): return readiness.response()
+#
+# A check returns an optional detail (dict/str) or raises SkipCheck("why") when it does
+# not apply (no API key configured, ...).
+# Config (env): READY_PRIME (1/0), READY_CHECK_TIMEOUT, FX_WARM_CURRENCIES, DB_POOL_PREFILL
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Optional
+
+from tracing import histogram
+
+READY_PRIME = os.getenv("READY_PRIME", "1").lower() not in ("0", "false", "no")
+READY_CHECK_TIMEOUT = float(os.getenv("READY_CHECK_TIMEOUT", "15"))
+FX_WARM_CURRENCIES = [c.strip().upper() for c in
+                      os.getenv("FX_WARM_CURRENCIES", "USD,GBP,RON,HUF,DKK,CZK,PLN").split(",") if c.strip()]
+DB_POOL_PREFILL = int(os.getenv("DB_POOL_PREFILL", "5"))
+
+READY_SECONDS = histogram("readiness_check_seconds", "Startup warm-up check duration")
+
+
+class SkipCheck(Exception):
+    """Raised by a check that does not apply in this environment."""
+
+
+class Readiness:
+    def __init__(self, timeout: float = READY_CHECK_TIMEOUT, prime: bool = READY_PRIME):
+        self.timeout = timeout
+        self.prime = prime
+        self._checks: Dict[str, tuple] = {}
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def register(self, name: str, fn: Callable[[], Any], required: bool = True):
+        self._checks[name] = (fn, required)
+        self._state[name] = {"status": "pending", "required": required, "seconds": None,
+                             "detail": None, "error": None}
+
+    def check(self, name: str, required: bool = True):
+        """Decorator form of register()."""
+        def deco(fn):
+            self.register(name, fn, required)
+            return fn
+        return deco
+
+    # ---------- running ----------
+    def start(self, background: bool = True):
+        """Run every check once, in parallel. Idempotent."""
+        with self._lock:
+            if self._thread is not None or self.finished_at is not None:
+                return
+            self.started_at = time.time()
+            if not self.prime:
+                for st in self._state.values():
+                    st["status"] = "skipped"
+                    st["detail"] = "READY_PRIME=0"
+                self.finished_at = time.time()
+                return
+            self._thread = threading.Thread(target=self._run_all, name="readiness", daemon=True)
+            self._thread.start()
+        if not background:
+            self._thread.join()
+
+    def _run_one(self, name: str):
+        fn, _ = self._checks[name]
+        st = self._state[name]
+        st["status"] = "running"
+        t0 = time.perf_counter()
+        try:
+            st["detail"] = fn()
+            st["status"] = "ok"
+        except SkipCheck as e:
+            st["status"], st["detail"] = "skipped", str(e)
+        except Exception as e:
+            st["status"], st["error"] = "failed", f"{type(e).__name__}: {e}"
+        st["seconds"] = round(time.perf_counter() - t0, 4)
+        READY_SECONDS.observe(st["seconds"], check=name, status=st["status"])
+
+    def _run_all(self):
+        pool = ThreadPoolExecutor(max_workers=max(1, len(self._checks)), thread_name_prefix="ready")
+        futures = {name: pool.submit(self._run_one, name) for name in self._checks}
+        deadline = time.monotonic() + self.timeout
+        for name, fut in futures.items():
+            try:
+                fut.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                st = self._state[name]
+                st["status"], st["error"] = "failed", f"timed out after {self.timeout}s"
+        pool.shutdown(wait=False)
+        self.finished_at = time.time()
+
+    # ---------- reporting ----------
+    @property
+    def ready(self) -> bool:
+        if self.finished_at is None:
+            return False
+        return all(st["status"] in ("ok", "skipped") for st in self._state.values() if st["required"])
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+            "checks": {name: dict(st) for name, st in self._state.items()},
+        }
+
+    def response(self):
+        from fastapi.responses import JSONResponse
+
+        return JSONResponse(self.report(), status_code=200 if self.ready else 503,
+                            headers={"Cache-Control": "no-store"})
+
+
+# ---------- standard checks ----------
+def prime_amadeus():
+    """Build the Amadeus client and fetch its OAuth token."""
+    if not (os.getenv("AMADEUS_CLIENT_ID") and os.getenv("AMADEUS_CLIENT_SECRET")):
+        raise SkipCheck("AMADEUS_CLIENT_ID / AMADEUS_CLIENT_SECRET not set")
+    from providers import get_provider
+
+    client = get_provider("amadeus")
+    token = getattr(client, "access_token", None)
+    if token is not None and hasattr(token, "_bearer_token"):
+        token._bearer_token()  # SDK caches it until expiry; later calls reuse it
+        return "token cached"
+    return "client built"
+
+def prime_gmaps():
+    """Build the Google Maps client and open its pooled TLS connection."""
+    if not os.getenv("GOOGLE_MAPS_API_KEY"):
+        raise SkipCheck("GOOGLE_MAPS_API_KEY not set")
+    from providers import get_provider
+
+    client = get_provider("gmaps")
+    session = getattr(client, "session", None)
+    if session is not None:
+        session.head("https://maps.googleapis.com/", timeout=5)
+        return "connection pooled"
+    return "client built"
+
+def prime_fx(currencies=None):
+    """Fill the FX cache for the currencies Amadeus usually quotes in."""
+    from schimb_euro import _rata_eur
+
+    rates = {}
+    for cur in currencies or FX_WARM_CURRENCIES:
+        if cur != "EUR":
+            rates[cur] = _rata_eur(cur)
+    return {"rates": len(rates)}
+
+def prime_db_pool(engine, size: int = DB_POOL_PREFILL):
+    """Open ``size`` pooled connections at once so the first requests do not connect."""
+    from sqlalchemy import text
+
+    conns = []
+    try:
+        for _ in range(max(1, size)):
+            c = engine.connect()
+            c.execute(text("SELECT 1"))
+            conns.append(c)
+    finally:
+        for c in conns:
+            c.close()  # back into the pool, still open
+    return {"connections": len(conns)}
+
+def prime_price_stats():
+    from price_stats import get_price_stats
+
+    return {"sketches": len(get_price_stats())}
@@ -1,14 +1,31 @@
+import os
 import requests
+import deadline
+from cache import get_cache
+from tracing import upstream
 
-def convert_to_euro(amount, currency):
-    url = f"https://open.er-api.com/v6/latest/{currency}"
-    response = requests.get(url)
-    data = response.json()
+FX_CACHE_TTL = int(os.getenv("FX_CACHE_TTL", str(6 * 3600)))
+
+def _rata_eur(currency):
+    """Cursul currency -> EUR; cache-uit (vezi cache.py) ca sa nu cerem API-ul la fiecare pret."""
+    def fetch():
+        url = f"https://open.er-api.com/v6/latest/{currency}"
+        with upstream("open_er_api", "latest"):
+            response = requests.get(url, timeout=deadline.timeout())
+            data = response.json()
+
+        if data["result"] != "success":
+            raise ValueError(f"Eroare API: {data}")
 
-    if data["result"] != "success":
-        raise ValueError(f"Eroare API: {data}")
+        return data["rates"]["EUR"]
 
-    rate = data["rates"]["EUR"]
+    return get_cache("fx").get_or_set(currency.upper(), fetch, ttl=FX_CACHE_TTL)
+
+def convert_to_euro(amount, currency):
+    if currency == "EUR":
+        return amount
+    rate = _rata_eur(currency)
     return amount * rate
 
-print(convert_to_euro(150, 'RON'))
+if __name__ == "__main__":
+    print(convert_to_euro(150, 'RON'))
@@ -0,0 +1,200 @@
+# scraper.py — pool of long-lived headless Chrome workers for rating / map-link enrichment
+#
+# Each worker process starts one headless Chrome on boot and reuses it for every job,
+# so N hotels cost N page loads instead of N browser cold starts. Pages are read as
+# soon as the wanted elements exist (explicit DOM readiness, no fixed sleeps).
+#
+#   with ScraperPool(workers=4) as pool:
+#       results = pool.scrape_many(urls)        # [{"url", "rating", "map_link", "error"}, ...]
+#
+# Config (env): SCRAPER_WORKERS, SCRAPER_MAX_PENDING, SCRAPER_TIMEOUT, SCRAPER_CACHE_TTL,
+#               SCRAPER_HEADLESS (1/0)
+
+from __future__ import annotations
+
+import atexit
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cache import MISSING, get_cache
+from tracing import record_cache, upstream
+
+# field -> (css selector, attribute or None for the element text)
+Selectors = Dict[str, Tuple[str, Optional[str]]]
+
+DEFAULT_SELECTORS: Selectors = {
+    "rating": ("div.b5cd09854e.d10a6220b4", None),
+    "map_link": ("a.bui-link", "href"),
+}
+
+SCRAPER_WORKERS = int(os.getenv("SCRAPER_WORKERS", str(max(1, min(4, os.cpu_count() or 1)))))
+SCRAPER_MAX_PENDING = int(os.getenv("SCRAPER_MAX_PENDING", "64"))
+SCRAPER_TIMEOUT = float(os.getenv("SCRAPER_TIMEOUT", "15"))
+SCRAPER_CACHE_TTL = int(os.getenv("SCRAPER_CACHE_TTL", str(24 * 3600)))
+SCRAPER_HEADLESS = os.getenv("SCRAPER_HEADLESS", "1") != "0"
+# after document.readyState == "complete", how long to keep polling for late (JS) elements
+SCRAPER_SETTLE = float(os.getenv("SCRAPER_SETTLE", "1.5"))
+
+
+# ---------- worker process side ----------
+_driver = None
+_headless = True
+
+def _new_driver(headless: bool):
+    from selenium import webdriver
+
+    opts = webdriver.ChromeOptions()
+    if headless:
+        opts.add_argument("--headless=new")
+    opts.add_argument("--disable-gpu")
+    opts.add_argument("--no-sandbox")
+    opts.add_argument("--disable-dev-shm-usage")
+    opts.add_argument("--blink-settings=imagesEnabled=false")
+    opts.page_load_strategy = "eager"  # return at DOMContentLoaded, we wait for elements ourselves
+    return webdriver.Chrome(options=opts)
+
+def _init_worker(headless: bool):
+    global _driver, _headless
+    _headless = headless
+    _driver = _new_driver(headless)
+    atexit.register(_quit_driver)
+
+def _quit_driver():
+    global _driver
+    if _driver is not None:
+        try:
+            _driver.quit()
+        except Exception:
+            pass
+        _driver = None
+
+def _read_fields(driver, selectors: Selectors) -> Dict[str, Optional[str]]:
+    from selenium.webdriver.common.by import By
+
+    out: Dict[str, Optional[str]] = {}
+    for field, (css, attr) in selectors.items():
+        found = driver.find_elements(By.CSS_SELECTOR, css)
+        if not found:
+            out[field] = None
+            continue
+        out[field] = found[0].get_attribute(attr) if attr else found[0].text
+    return out
+
+def _scrape_in_worker(url: str, selectors: Selectors, timeout: float,
+                      settle: float = SCRAPER_SETTLE) -> Dict[str, Optional[str]]:
+    """Load ``url`` and poll until every selector matches, or the document has been
+    complete for ``settle`` seconds (the element is genuinely missing), or ``timeout``."""
+    global _driver
+    from selenium.common.exceptions import TimeoutException, WebDriverException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    complete_since: List[float] = []
+
+    def ready(d):
+        if all(d.find_elements(By.CSS_SELECTOR, css) for css, _ in selectors.values()):
+            return True
+        if not complete_since:
+            if d.execute_script("return document.readyState") == "complete":
+                complete_since.append(time.monotonic())
+            return False
+        return time.monotonic() - complete_since[0] >= settle
+
+    for attempt in (1, 2):
+        try:
+            if _driver is None:
+                _driver = _new_driver(_headless)
+            _driver.set_page_load_timeout(timeout)
+            complete_since.clear()
+            _driver.get(url)
+            try:
+                WebDriverWait(_driver, timeout, poll_frequency=0.1).until(ready)
+            except TimeoutException:
+                pass  # read whatever made it into the DOM
+            return _read_fields(_driver, selectors)
+        except WebDriverException:
+            # crashed / hung browser: replace it once, then give up on this URL
+            _quit_driver()
+            if attempt == 2:
+                raise
+    return {}
+
+
+# ---------- parent process side ----------
+class ScraperPool:
+    """Process pool + bounded job queue + per-URL result cache with TTL."""
+
+    def __init__(self, workers: int = SCRAPER_WORKERS, max_pending: int = SCRAPER_MAX_PENDING,
+                 timeout: float = SCRAPER_TIMEOUT, cache_ttl: int = SCRAPER_CACHE_TTL,
+                 headless: bool = SCRAPER_HEADLESS, selectors: Optional[Selectors] = None):
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.selectors = dict(selectors or DEFAULT_SELECTORS)
+        self.cache = get_cache("scrape_results")
+        self._executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                             initargs=(headless,))
+        # at most max_pending jobs queued or running; submit() blocks beyond that
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _cache_key(self, url: str) -> str:
+        return url + "|" + ",".join(sorted(self.selectors))
+
+    def submit(self, url: str) -> Future:
+        key = self._cache_key(url)
+        hit = self.cache.get(key, MISSING)
+        record_cache(self.cache.namespace, hit is not MISSING)
+        if hit is not MISSING:
+            f: Future = Future()
+            f.set_result(hit)
+            return f
+
+        outer: Future = Future()
+        with self._lock:
+            running = self._inflight.get(key)
+            if running is not None:
+                return running  # same URL already queued -> share the job
+            self._inflight[key] = outer
+
+        self._slots.acquire()
+        try:
+            inner = self._executor.submit(_scrape_in_worker, url, self.selectors, self.timeout)
+        except Exception:
+            self._slots.release()
+            with self._lock:
+                self._inflight.pop(key, None)
+            raise
+
+        def done(fut: Future):
+            self._slots.release()
+            with self._lock:
+                self._inflight.pop(key, None)
+            try:
+                fields = fut.result()
+                result = {"url": url, **fields, "error": None}
+                if self.cache_ttl > 0:
+                    self.cache.set(key, result, ttl=self.cache_ttl)
+            except Exception as e:
+                result = {"url": url, **{k: None for k in self.selectors}, "error": str(e)}
+            outer.set_result(result)
+
+        inner.add_done_callback(done)
+        return outer
+
+    def scrape_many(self, urls: Iterable[str]) -> List[Dict[str, Optional[str]]]:
+        with upstream("browser", "scrape_many"):
+            futures = [self.submit(u) for u in urls]
+            return [f.result() for f in futures]
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
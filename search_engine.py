@@ -0,0 +1,568 @@
+# search_engine.py — the hotel search pipeline shared by server.py, app/main.py and baza.py
+#
+#   candidates -> offers -> price normalization -> filters -> enrichment
+#
+#   engine = SearchEngine()                                   # default stages
+#   res = engine.run(SearchQuery("Paris", "2025-12-12", "2025-12-15", adults=2, budget=400))
+#   for offer in res.offers: offer.name, offer.price_eur, offer.transit_minutes
+#
+# Every stage is a plain callable and can be swapped in the constructor:
+#   candidates(q)                    -> (city_code, [hotel_id, ...])
+#   fetch(q, hotel_id)               -> raw hotel_offers_search data (list of dicts)
+#   normalize(q, hotel_id, raw)      -> Offer (price converted to EUR)
+#   filters: [f(q, offer) -> bool]   keep the offer?
+#   enrichers: [e(q, offer)]         fill optional fields (transit) on the final results
+# Hooks (SearchHook) see every candidate list and every offer: MarketHook feeds
+# price_stats / offer_store and uses them to skip and reorder candidates.
+# Offer calls for SEARCH_CONCURRENCY hotels run at once; identical calls in flight
+# (same hotel, dates, adults) share one Amadeus request.
+#
+# Ranking: with q.sort set ("price", "rating", "transit" or "score") the engine does not
+# stop at the first `limit` matches. It streams offers from every candidate into a
+# bounded heap (TopK) until the candidates run out or the call / time budget
+# (q.max_calls, q.time_budget) is spent, and returns the best `limit` found so far.
+# "transit" and "score" need transit minutes, so every offer that passes the filters is
+# enriched (in parallel, per window) before it enters the heap: the top `limit` is
+# taken over every offer seen, not re-ranked from the cheapest few. Stations come from
+# the offline GTFS index (transit_index.py) where a city has one, else from the cache.
+#
+# Request deadline (deadline.py): no new offer window starts and enrichment is skipped
+# once the budget is spent; the request is then marked partial.
+#
+# Config (env): SEARCH_CONCURRENCY, SEARCH_MAX_CALLS, SEARCH_TIME_BUDGET,
+#               RANK_WEIGHTS ("price=0.5,rating=0.3,transit=0.2"), RANK_PRICE_REF
+
+from __future__ import annotations
+
+import contextvars
+import heapq
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import deadline
+from cache import SingleFlight
+from hedging import Hedger
+from tracing import span, upstream
+
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "4"))
+SEARCH_MAX_CALLS = int(os.getenv("SEARCH_MAX_CALLS", "60"))          # offer calls per ranked search
+SEARCH_TIME_BUDGET = float(os.getenv("SEARCH_TIME_BUDGET", "8"))     # seconds per ranked search
+RANK_PRICE_REF = float(os.getenv("RANK_PRICE_REF", "300"))           # EUR, when the query has no budget
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    out = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            out[name.strip()] = float(value)
+    return out
+
+RANK_WEIGHTS = _parse_weights(os.getenv("RANK_WEIGHTS", "price=0.5,rating=0.3,transit=0.2"))
+
+
+class SearchError(Exception):
+    """Base class; entry points turn these into HTTP errors or CLI messages."""
+
+class CityNotFound(SearchError):
+    pass
+
+class NoHotels(SearchError):
+    pass
+
+class ProviderUnavailable(SearchError):
+    pass
+
+
+@dataclass
+class SearchQuery:
+    city: str
+    check_in: str                       # YYYY-MM-DD
+    check_out: str
+    adults: int = 1
+    budget: Optional[float] = None      # EUR, whole stay
+    min_rating: Optional[float] = None
+    limit: int = 10
+    require_price: bool = False         # drop hotels whose offer has no usable price
+    enrich: bool = True
+    city_code: Optional[str] = None     # already resolved (batch searches)
+    hotel_ids: Optional[List[str]] = None
+    sort: Optional[str] = None          # price | rating | transit | score (None = candidate order)
+    max_calls: Optional[int] = None     # ranked searches: offer-call budget (SEARCH_MAX_CALLS)
+    time_budget: Optional[float] = None # ranked searches: seconds (SEARCH_TIME_BUDGET)
+
+    def __post_init__(self):
+        if isinstance(self.check_in, date):
+            self.check_in = self.check_in.isoformat()
+        if isinstance(self.check_out, date):
+            self.check_out = self.check_out.isoformat()
+        self.adults = max(1, int(self.adults))
+        if self.sort is not None and self.sort not in SORT_KEYS:
+            raise ValueError(f"unknown sort {self.sort!r} (one of {', '.join(SORT_KEYS)})")
+
+    @property
+    def nights(self) -> int:
+        return max(1, (date.fromisoformat(self.check_out) - date.fromisoformat(self.check_in)).days)
+
+
+@dataclass
+class Offer:
+    hotel_id: str
+    name: str
+    raw: Dict[str, Any]
+    rating: Optional[float] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    address: Optional[str] = None
+    website: Optional[str] = None
+    currency: Optional[str] = None
+    price_total: Optional[float] = None     # in ``currency``
+    price_eur: Optional[float] = None
+    price: Optional[Dict[str, Any]] = None  # raw Amadeus price object
+    transit: Optional[Dict[str, Any]] = None
+    extras: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def hotel(self) -> Dict[str, Any]:
+        return self.raw.get("hotel") or {}
+
+    @property
+    def transit_minutes(self) -> Optional[int]:
+        return transit_minutes(self.transit)
+
+
+@dataclass
+class SearchResult:
+    query: SearchQuery
+    city_code: str
+    offers: List[Offer]
+    candidates: int = 0
+    calls: int = 0
+    complete: bool = True   # False when a ranked search ran out of call / time budget
+
+
+_DURATION_UNITS = {"min": 1, "mins": 1, "minute": 1, "minutes": 1,
+                   "hour": 60, "hours": 60, "h": 60, "day": 1440, "days": 1440}
+
+def transit_minutes(info: Optional[Dict[str, Any]]) -> Optional[int]:
+    """Google duration text -> minutes: '7 mins' -> 7, '1 hour 5 mins' -> 65."""
+    if not isinstance(info, dict):
+        return None
+    tokens = str(info.get("duration") or "").split()
+    total, found = 0, False
+    for i, token in enumerate(tokens):
+        if token.isdigit():
+            unit = tokens[i + 1].lower().rstrip(".,") if i + 1 < len(tokens) else "mins"
+            total += int(token) * _DURATION_UNITS.get(unit, 1)
+            found = True
+    return total if found else None
+
+
+# ---------- ranking ----------
+SORT_KEYS = ("price", "rating", "transit", "score")
+
+def score(o: Offer, budget: Optional[float] = None, weights: Optional[Dict[str, float]] = None,
+          with_transit: bool = True) -> float:
+    """Weighted score in [0, 1], higher is better. Each part is scaled to [0, 1]:
+    price ref/(ref+price), rating/5, transit 10/(10+minutes); unknown parts count 0."""
+    w = weights or RANK_WEIGHTS
+    ref = budget or RANK_PRICE_REF
+    total = 0.0
+    if o.price_eur is not None:
+        total += w.get("price", 0) * ref / (ref + max(o.price_eur, 0.0))
+    if o.rating is not None:
+        total += w.get("rating", 0) * min(o.rating, 5.0) / 5.0
+    mins = o.transit_minutes if with_transit else None
+    if mins is not None:
+        total += w.get("transit", 0) * 10.0 / (10.0 + mins)
+    return total
+
+def sort_key(sort: str, budget: Optional[float] = None,
+             with_transit: bool = True) -> Callable[[Offer], Tuple[float, ...]]:
+    """Numeric key, lower is better; offers missing the field go last.
+    ``with_transit=False`` gives the pre-enrichment key for "transit" / "score"."""
+    if sort == "price":
+        return lambda o: (o.price_eur is None, o.price_eur or 0.0)
+    if sort == "rating":
+        return lambda o: (o.rating is None, -(o.rating or 0.0), o.price_eur or 0.0)
+    if sort == "transit":
+        if not with_transit:
+            return sort_key("price")
+        return lambda o: (o.transit_minutes is None, o.transit_minutes or 0, o.price_eur or 0.0)
+    if sort == "score":
+        return lambda o: (-score(o, budget, with_transit=with_transit),)
+    raise ValueError(f"unknown sort {sort!r}")
+
+class TopK:
+    """The k smallest items by ``key`` from a stream, in O(n log k) and O(k) memory.
+    The heap root is the worst item kept; ties keep the earlier item."""
+
+    def __init__(self, k: int, key: Callable[[Any], Tuple[float, ...]]):
+        self.k = max(0, k)
+        self.key = key
+        self._heap: List[Tuple[Tuple[float, ...], int, Any]] = []
+        self._seq = 0
+
+    def push(self, item) -> bool:
+        if self.k == 0:
+            return False
+        # negate the key so heapq's min-heap keeps the worst item at the root
+        entry = (tuple(-x for x in self.key(item)), -self._seq, item)
+        self._seq += 1
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+            return True
+        if entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+            return True
+        return False
+
+    def __len__(self):
+        return len(self._heap)
+
+    def items(self) -> List[Any]:
+        """Best first."""
+        return [e[2] for e in sorted(self._heap, key=lambda e: e[:2], reverse=True)]
+
+
+# ---------- hooks ----------
+class SearchHook:
+    def order(self, q: SearchQuery, city_code: str, hotel_ids: List[str]) -> List[str]:
+        return hotel_ids
+
+    def skip(self, q: SearchQuery, city_code: str, hotel_id: str) -> bool:
+        return False
+
+    def on_offer(self, q: SearchQuery, city_code: str, offer: Offer):
+        pass
+
+    def on_unavailable(self, q: SearchQuery, city_code: str, hotel_id: str):
+        pass
+
+class MarketHook(SearchHook):
+    """price_stats + offer_store: learn from every offer, skip hopeless hotels."""
+
+    def __init__(self):
+        from offer_store import get_offer_store
+        from price_stats import get_price_stats
+
+        self.stats = get_price_stats()
+        self.store = get_offer_store()
+
+    def order(self, q, city_code, hotel_ids):
+        # cached nights from overlapping stays: drop known-unavailable / over-budget
+        # hotels, try the likely ones first
+        with span("offer_store"):
+            return self.store.prioritise(hotel_ids, q.check_in, q.check_out, q.adults, q.budget)
+
+    def skip(self, q, city_code, hotel_id):
+        # never seen anywhere near the budget -> skip the offer call
+        return bool(city_code) and self.stats.should_skip(city_code, hotel_id, q.check_in, q.nights, q.budget,
+                                                                adults=q.adults)
+
+    def on_offer(self, q, city_code, offer):
+        if offer.price_eur is not None:
+            if city_code:  # price sketches are per city
+                self.stats.observe(city_code, offer.hotel_id, q.check_in, q.nights, offer.price_eur,
+                                   adults=q.adults)
+            self.store.record_offer(offer.hotel_id, q.check_in, q.check_out, q.adults,
+                                    offer.price_eur, offer.price)
+
+    def on_unavailable(self, q, city_code, hotel_id):
+        self.store.record_unavailable(hotel_id, q.check_in, q.check_out, q.adults)
+
+
+# ---------- default stages ----------
+def resolve_city(city: str) -> Tuple[str, List[str]]:
+    """City name -> (IATA city code, hotel ids); both cached in baza.
+
+    Raises DeadlineExceeded when the request budget runs out on the way: baza only
+    catches upstream errors, so a spent budget is not mistaken for an unknown city
+    (and not cached as one). Callers answer 504 with the request marked partial."""
+    import baza  # baza imports this module for its CLI
+
+    try:
+        with span("city_code"):
+            city_code = baza.obtine_city_code_hotel(city)
+        if not city_code:
+            raise CityNotFound(city)
+        with span("hotel_ids"):
+            hotel_ids = baza.obtine_hoteluri_oras(city_code)
+    except deadline.DeadlineExceeded:
+        deadline.mark_partial("city")
+        raise
+    if not hotel_ids:
+        raise NoHotels(city_code)
+    return city_code, [str(h) for h in hotel_ids]
+
+def resolve_candidates(q: SearchQuery) -> Tuple[str, List[str]]:
+    return resolve_city(q.city)
+
+OFFER_CALLS = SingleFlight()
+# SEARCH_HEDGE_OFFERS=1: a slow offer call (> its p90) gets a duplicate request and the
+# first answer wins; capped at HEDGE_MAX_RATE extra calls (hedging.py)
+SEARCH_HEDGE_OFFERS = os.getenv("SEARCH_HEDGE_OFFERS", "0").lower() in ("1", "true", "yes")
+OFFER_HEDGE = Hedger("amadeus_offers")
+
+def fetch_offers(q: SearchQuery, hotel_id: str) -> List[Dict[str, Any]]:
+    from providers import get_provider
+
+    try:
+        amadeus = get_provider("amadeus")
+    except Exception as e:
+        raise ProviderUnavailable(f"Amadeus client: {e}") from e
+
+    def call():
+        with upstream("amadeus", "hotel_offers_search"):
+            return amadeus.shopping.hotel_offers_search.get(
+                hotelIds=hotel_id,
+                checkInDate=q.check_in,
+                checkOutDate=q.check_out,
+                adults=q.adults,
+            )
+    if SEARCH_HEDGE_OFFERS:
+        plain = call
+        call = lambda: OFFER_HEDGE.run(plain, is_good=lambda resp: resp is not None)
+    with span("offers"):
+        resp = OFFER_CALLS.do((hotel_id, q.check_in, q.check_out, q.adults), call)
+    return getattr(resp, "data", None) or []
+
+def to_euro(amount: float, currency: Optional[str]) -> Optional[float]:
+    if currency == "EUR":
+        return amount
+    try:
+        from schimb_euro import convert_to_euro
+    except Exception:
+        return None
+    with span("fx"):
+        return float(convert_to_euro(amount, currency))
+
+def normalize_offer(q: SearchQuery, hotel_id: str, oferta: Dict[str, Any]) -> Offer:
+    hotel = oferta.get("hotel") or {}
+
+    # normalize rating -> one decimal
+    try:
+        rating = round(float(hotel["rating"]), 1) if hotel.get("rating") is not None else None
+    except (TypeError, ValueError):
+        rating = None
+    geo = hotel.get("geoCode") or {}
+    address = hotel.get("address")
+    offer = Offer(
+        hotel_id=str(hotel_id),
+        name=str(hotel.get("name", f"Hotel {hotel_id}")),
+        raw=oferta,
+        rating=rating,
+        latitude=geo.get("latitude"),
+        longitude=geo.get("longitude"),
+        address=(address.get("lines") or [None])[0] if isinstance(address, dict) else None,
+        website=hotel.get("website"),
+    )
+    try:
+        if oferta.get("offers"):
+            offer.price = oferta["offers"][0]["price"]
+            offer.currency = offer.price.get("currency")
+            offer.price_total = float(offer.price.get("total"))
+            if offer.currency:
+                eur = to_euro(offer.price_total, offer.currency)
+                offer.price_eur = round(eur, 2) if eur is not None else None
+    except Exception:
+        pass
+    return offer
+
+# filters
+def budget_filter(q: SearchQuery, o: Offer) -> bool:
+    return q.budget is None or o.price_eur is None or o.price_eur <= q.budget
+
+def rating_filter(q: SearchQuery, o: Offer) -> bool:
+    return q.min_rating is None or (o.rating is not None and o.rating >= float(q.min_rating))
+
+def price_required_filter(q: SearchQuery, o: Offer) -> bool:
+    return not q.require_price or o.price_eur is not None
+
+DEFAULT_FILTERS = (price_required_filter, budget_filter, rating_filter)
+
+# enrichment
+def default_transit_fn():
+    # prefer transport.py, fallback to new_transport.py (same order as server.py)
+    try:
+        from transport import cel_mai_apropiat_transport
+    except Exception:
+        try:
+            from new_transport import cel_mai_apropiat_transport
+        except Exception:
+            return None
+    return cel_mai_apropiat_transport
+
+def transit_enricher(transit_fn: Optional[Callable] = None):
+    def enrich(q: SearchQuery, o: Offer):
+        fn = transit_fn or default_transit_fn()
+        if fn is None or o.latitude is None or o.longitude is None:
+            return
+        if deadline.expired():
+            deadline.mark_partial("transit")
+            return
+        try:
+            with span("transit"):
+                o.transit = fn(o.latitude, o.longitude)
+        except Exception:
+            o.transit = None
+            if deadline.expired():
+                deadline.mark_partial("transit")
+    return enrich
+
+
+# ---------- engine ----------
+def _submit(pool: ThreadPoolExecutor, fn, *args):
+    # run in a copy of the caller's context so spans land in the request trace
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+class SearchEngine:
+    def __init__(self,
+                 candidates: Callable[[SearchQuery], Tuple[str, List[str]]] = resolve_candidates,
+                 fetch: Callable[[SearchQuery, str], List[Dict[str, Any]]] = fetch_offers,
+                 normalize: Callable[[SearchQuery, str, Dict[str, Any]], Offer] = normalize_offer,
+                 filters: Sequence[Callable[[SearchQuery, Offer], bool]] = DEFAULT_FILTERS,
+                 enrichers: Optional[Sequence[Callable[[SearchQuery, Offer], None]]] = None,
+                 hooks: Optional[Sequence[SearchHook]] = None,
+                 concurrency: int = SEARCH_CONCURRENCY):
+        self.candidates = candidates
+        self.fetch = fetch
+        self.normalize = normalize
+        self.filters = list(filters)
+        self.enrichers = list(enrichers) if enrichers is not None else [transit_enricher()]
+        self.hooks = list(hooks) if hooks is not None else [MarketHook()]
+        self.concurrency = max(1, concurrency)
+
+    def _offers_for(self, q: SearchQuery, city_code: str, hotel_id: str) -> List[Offer]:
+        try:
+            data = self.fetch(q, hotel_id)
+        except ProviderUnavailable:
+            raise
+        except Exception:
+            # counted in upstream_errors_total / stage_errors_total
+            if deadline.expired():
+                deadline.mark_partial("offers")
+            return []
+        if not data:
+            for h in self.hooks:
+                h.on_unavailable(q, city_code, hotel_id)
+            return []
+        offers = []
+        for oferta in data:
+            offer = self.normalize(q, hotel_id, oferta)
+            for h in self.hooks:
+                h.on_offer(q, city_code, offer)
+            offers.append(offer)
+        return offers
+
+    def run(self, q: SearchQuery) -> SearchResult:
+        if q.hotel_ids is not None:
+            city_code, hotel_ids = q.city_code or "", list(q.hotel_ids)
+        else:
+            city_code, hotel_ids = self.candidates(q)
+        for h in self.hooks:
+            hotel_ids = h.order(q, city_code, hotel_ids)
+
+        if q.sort:
+            return self._run_ranked(q, city_code, hotel_ids)
+
+        results: List[Offer] = []
+        calls = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            pending = self._unskipped(q, city_code, hotel_ids)
+            # fetch `concurrency` hotels at a time, in candidate order, until `limit` pass
+            while len(results) < q.limit:
+                window = list(islice(pending, self.concurrency))
+                if not window:
+                    break
+                if deadline.expired():
+                    deadline.mark_partial("offers")
+                    break
+                calls += len(window)
+                futures = [_submit(pool, self._offers_for, q, city_code, hid) for hid in window]
+                for fut in futures:
+                    for offer in fut.result():
+                        if len(results) < q.limit and all(f(q, offer) for f in self.filters):
+                            results.append(offer)
+
+            if q.enrich and self.enrichers and results:
+                for fut in [_submit(pool, self._enrich, q, o) for o in results]:
+                    fut.result()
+
+        return SearchResult(q, city_code, results, candidates=len(hotel_ids), calls=calls)
+
+    def _run_ranked(self, q: SearchQuery, city_code: str, hotel_ids: List[str]) -> SearchResult:
+        needs_transit = q.sort in ("transit", "score") and bool(self.enrichers)
+        top = TopK(q.limit, sort_key(q.sort, q.budget))
+        max_calls = q.max_calls if q.max_calls is not None else SEARCH_MAX_CALLS
+        budget_s = q.time_budget if q.time_budget is not None else SEARCH_TIME_BUDGET
+        left = deadline.remaining()
+        by_deadline = False
+        if left is not None:
+            # leave room for enrichment (of the last window, or of the results)
+            share = left * (0.5 if needs_transit or q.enrich else 1.0)
+            by_deadline = share < budget_s
+            budget_s = min(budget_s, share)
+        stop_at = time.monotonic() + budget_s
+
+        calls = 0
+        exhausted = False
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            remaining = iter(hotel_ids)
+            pending = self._unskipped(q, city_code, remaining)
+            with span("rank"):
+                while calls < max_calls and time.monotonic() < stop_at:
+                    want = min(self.concurrency, max_calls - calls)
+                    window = list(islice(pending, want))
+                    exhausted = len(window) < want
+                    if not window:
+                        break
+                    calls += len(window)
+                    futures = [_submit(pool, self._offers_for, q, city_code, hid) for hid in window]
+                    offers = [o for fut in futures for o in fut.result()
+                              if all(f(q, o) for f in self.filters)]
+                    if needs_transit:
+                        # the key needs transit minutes: enrich before ranking
+                        for fut in [_submit(pool, self._enrich, q, o) for o in offers]:
+                            fut.result()
+                    for offer in offers:
+                        top.push(offer)
+            results = top.items()
+            # every candidate fetched or skipped? (peeking at the raw list asks no hook)
+            exhausted = exhausted or next(remaining, None) is None
+            if by_deadline and not exhausted and calls < max_calls:
+                deadline.mark_partial("offers")
+
+            if q.enrich and not needs_transit and self.enrichers and results:
+                for fut in [_submit(pool, self._enrich, q, o) for o in results]:
+                    fut.result()
+
+        return SearchResult(q, city_code, results, candidates=len(hotel_ids), calls=calls,
+                            complete=exhausted)
+
+    def _unskipped(self, q: SearchQuery, city_code: str, hotel_ids: Iterable[str]) -> Iterator[str]:
+        """Candidates in order; the hooks' skip() (prefilter counters, exploration draws)
+        is only asked for a hotel when the search is about to fetch it."""
+        for hid in hotel_ids:
+            if not any(h.skip(q, city_code, hid) for h in self.hooks):
+                yield hid
+
+    def _enrich(self, q: SearchQuery, offer: Offer):
+        for e in self.enrichers:
+            e(q, offer)
+
+
+_default: Optional[SearchEngine] = None
+
+def get_engine() -> SearchEngine:
+    global _default
+    if _default is None:
+        _default = SearchEngine()
+    return _default
+
+def search(q: SearchQuery) -> SearchResult:
+    return get_engine().run(q)
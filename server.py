@@ -4,11 +4,17 @@
 #   POST   /api/auth/login           {email, password} -> {token}
 #   GET    /api/account              (Bearer token)
 #   POST   /api/hotels/search        {city, checkIn(date), checkOut(date), budget?, adults, minRating?}
+#                                     ?defer=1 -> prices now, transit via enrichmentJob
+#   POST   /api/hotels/search/batch  {cities[], dateFrom, dateTo, nights, weekdays?, budget?, adults, minRating?}
 #   GET    /api/favorites            (Bearer)
 #   POST   /api/favorites            (Bearer) body: {hotelId, payload}
 #   DELETE /api/favorites/{id}       (Bearer)
 #   GET    /api/history              (Bearer)
 #   POST   /api/history              (Bearer) body: {city, checkIn, checkOut, budget?, adults, minRating?}
+#   GET    /api/hotels/price-range   ?city&checkIn&checkOut -> typical EUR range from past offers
+#   GET    /api/jobs/{id}            ?wait=seconds -> {status, progress, result, error}
+#   GET    /ready                    200 once startup warm-up finished, else 503 (per-check status)
+#   GET    /metrics                  Prometheus text format (stage/upstream latency, cache hits)
 
 from __future__ import annotations
 
@@ -16,16 +22,20 @@ import os
 import sys
 import json
 import uuid
-from datetime import datetime, date
+import hashlib
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from fastapi.encoders import jsonable_encoder
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, Header, HTTPException, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse, FileResponse
+from fastapi.responses import RedirectResponse, FileResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel, EmailStr, Field
 try:
     # pydantic v2
@@ -64,11 +74,22 @@ except Exception:
     except Exception:
         cel_mai_apropiat_transport = None  # type: ignore
 
-# currency conversion
-try:
-    from schimb_euro import convert_to_euro
-except Exception:
-    convert_to_euro = None  # type: ignore
+from jobs import QueueFull, get_job_queue
+from readiness import Readiness, prime_amadeus, prime_fx, prime_gmaps, prime_price_stats
+from snapshot import get_snapshotter, restore_and_schedule
+from http_cache import CompressionETagMiddleware, VersionCounter, etag_matches, weak_etag
+from price_stats import get_price_stats, nights_between
+import city_index
+from history_store import HistoryStore, RetentionWorker
+import deadline
+from applog import RequestIdMiddleware, setup_logging
+from profiler import (PROFILE_INTERVAL, ProfileMiddleware, ProfilerBusy, admin_token_ok,
+                      profile_threads, render)
+from admission import AdmissionMiddleware, default_rules
+from deadline import DeadlineMiddleware
+from search_engine import (CityNotFound, NoHotels, Offer, ProviderUnavailable, SearchEngine,
+                           SearchQuery, SearchResult, resolve_city, transit_enricher)
+from tracing import TracingMiddleware, render_prometheus
 
 # ---------- config ----------
 APP_NAME = "Proiect_echipa5 API"
@@ -77,7 +98,9 @@ DATA_DIR.mkdir(exist_ok=True)
 USERS_FILE = DATA_DIR / "users.json"
 SESSIONS_FILE = DATA_DIR / "sessions.json"
 FAVORITES_FILE = DATA_DIR / "favorites.json"
-HISTORY_FILE = DATA_DIR / "history.json"
+HISTORY_FILE = DATA_DIR / "history.json"   # legacy single file, migrated into history/
+HISTORY_DIR = DATA_DIR / "history"
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
 
 # ---------- tiny JSON storage ----------
 def _read_json(path: Path, default):
@@ -115,6 +138,8 @@ class SearchIn(BaseModel):
     budget: Optional[float] = None
     adults: int = 1
     minRating: Optional[float] = None
+    sort: Optional[str] = None      # price | rating | transit | score; None = Amadeus order
+    limit: int = 10
 
     # parse strings -> date (pydantic v2 style; works with v1 via alias above)
     if P2:
@@ -181,6 +206,22 @@ class Hotel(BaseModel):
     imageUrl: Optional[str] = None
     raw: Optional[Dict[str, Any]] = None
 
+class SearchOut(BaseModel):
+    results: List[Hotel]
+    enrichmentJob: Optional[str] = None     # set when transit fields are computed in the background
+    ranking: Optional[Dict[str, Any]] = None  # sorted searches: sort, candidates, calls, complete
+    partial: bool = False                   # request deadline hit: some hotels / transit skipped
+
+class BatchSearchIn(BaseModel):
+    cities: List[str]
+    dateFrom: date                          # first possible check-in
+    dateTo: date                            # last possible check-in
+    nights: int = 1
+    weekdays: Optional[List[int]] = None    # check-in weekdays, 0=Mon .. 6=Sun (e.g. [4] = Fridays)
+    budget: Optional[float] = None
+    adults: int = 1
+    minRating: Optional[float] = None
+
 class FavoriteIn(BaseModel):
     hotelId: str
     payload: Dict[str, Any]
@@ -218,135 +259,145 @@ def _require_user(creds: HTTPAuthorizationCredentials = Depends(security)) -> st
     return email
 
 # ---------- backend integration ----------
-def _fetch_hotels_from_backend(city: str, check_in: str, check_out: str,
-                               budget: Optional[float], adults: int,
-                               min_rating: Optional[float]) -> List[Hotel]:
-    """Call existing backend functions (baza.py) + normalize result; no backend edits."""
+# one pipeline for server.py, app/main.py and the baza.py CLI (search_engine.py)
+engine = SearchEngine(enrichers=[transit_enricher(cel_mai_apropiat_transport)])
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "50"))
+
+def _resolve_city(city: str) -> Tuple[str, List[str]]:
+    """City name -> (IATA city code, hotel ids); both cached in baza."""
     if baza is None:
         raise HTTPException(status_code=500, detail="Nu pot importa baza.py din backend.")
-
-    # 1) city code
-    city_code = baza.obtine_city_code_hotel(city)  # type: ignore[attr-defined]
-    if not city_code:
-        raise HTTPException(status_code=404, detail="Orașul nu a fost găsit sau nu are hoteluri.")
-
-    # 2) hotel ids for city
-    hotel_ids = baza.obtine_hoteluri_oras(city_code)  # type: ignore[attr-defined]
-    if not hotel_ids:
+    try:
+        return resolve_city(city)
+    except CityNotFound:
+        hints = ", ".join(c.name for c in city_index.suggest(city))
+        raise HTTPException(status_code=404, detail="Orașul nu a fost găsit sau nu are hoteluri."
+                            + (f" Ai vrut: {hints}?" if hints else ""))
+    except NoHotels:
         raise HTTPException(status_code=404, detail="Nu am găsit hoteluri pentru orașul dat.")
+    except deadline.DeadlineExceeded:
+        # budget spent before we knew the city (X-Partial: 1 comes from DeadlineMiddleware)
+        raise HTTPException(status_code=504, detail="Timpul cererii a expirat înainte de căutarea orașului.")
+
+def _transit_fields(lat, lon) -> Dict[str, Any]:
+    """Nearest transit stop -> the Hotel transit fields (None when unknown)."""
+    offer = Offer(hotel_id="", name="", raw={}, latitude=lat, longitude=lon)
+    transit_enricher(cel_mai_apropiat_transport)(None, offer)  # type: ignore[arg-type]
+    return _transit_out(offer)
+
+def _transit_out(o: Offer) -> Dict[str, Any]:
+    mins = o.transit_minutes
+    return {"distanceToTransitMin": mins,
+            "transitName": o.transit.get("station_name") if isinstance(o.transit, dict) else None,
+            "transportAvailable": (mins is not None)}
+
+def _to_hotel(o: Offer, enriched: bool) -> Hotel:
+    if enriched:
+        transit = _transit_out(o)
+    else:
+        transit = {"distanceToTransitMin": None, "transitName": None, "transportAvailable": None}
+    return Hotel(
+        id=o.hotel_id,
+        name=o.name,
+        address=o.address,
+        priceEUR=o.price_eur,
+        currency=o.currency,
+        rating=o.rating,
+        **transit,  # distanceToTransitMin, transitName, transportAvailable <- ADĂUGAT
+        imageUrl=None,
+        raw=o.raw,
+    )
 
-    amadeus = getattr(baza, "amadeus", None)
-    if amadeus is None:
+def _run_search(city: str, check_in: str, check_out: str,
+                budget: Optional[float], adults: int,
+                min_rating: Optional[float],
+                resolved: Optional[Tuple[str, List[str]]] = None,
+                enrich: bool = True, sort: Optional[str] = None,
+                limit: int = 10) -> Tuple[List[Hotel], SearchResult]:
+    """Run the shared search pipeline and map its offers to Hotel.
+    ``resolved`` lets batch searches pass a city code / hotel list looked up once;
+    ``enrich=False`` leaves the transit fields as None (see _submit_enrichment)."""
+    city_code, hotel_ids = resolved or _resolve_city(city)
+    try:
+        q = SearchQuery(city, check_in, check_out, adults=adults, budget=budget,
+                        min_rating=min_rating, limit=limit, enrich=enrich,
+                        city_code=city_code, hotel_ids=hotel_ids, sort=sort)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    try:
+        res = engine.run(q)
+    except ProviderUnavailable:
         raise HTTPException(status_code=500, detail="Clientul Amadeus nu e inițializat în baza.py")
+    # transit / score rankings enrich their results even when the caller deferred it
+    enriched = enrich or sort in ("transit", "score")
+    return [_to_hotel(o, enriched) for o in res.offers], res
 
-    results: List[Hotel] = []
-    limit = 10
+def _fetch_hotels_from_backend(city: str, check_in: str, check_out: str,
+                               budget: Optional[float], adults: int,
+                               min_rating: Optional[float],
+                               resolved: Optional[Tuple[str, List[str]]] = None,
+                               enrich: bool = True) -> List[Hotel]:
+    return _run_search(city, check_in, check_out, budget, adults, min_rating,
+                       resolved, enrich)[0]
+
+# ---------- background enrichment ----------
+jobs = get_job_queue()
+
+@jobs.handler("transit")
+def _transit_job(ctx, payload):
+    out: Dict[str, Dict[str, Any]] = {}
+    hotels = payload["hotels"]
+    for i, h in enumerate(hotels):
+        out[h["id"]] = _transit_fields(h["lat"], h["lon"])
+        ctx.progress(i + 1, len(hotels), partial={"hotels": out})
+    return {"hotels": out}
+
+def _hotel_coords(h: Hotel):
+    geo = ((h.raw or {}).get("hotel") or {}).get("geoCode") or {}
+    return geo.get("latitude"), geo.get("longitude")
+
+def _submit_enrichment(hotels: List[Hotel]) -> Optional[str]:
+    """Queue transit lookups for ``hotels``; same hotel set -> same job id."""
+    items = [dict(zip(("id", "lat", "lon"), (h.id, *_hotel_coords(h)))) for h in hotels]
+    if not items:
+        return None
+    key = "transit:" + hashlib.sha1(json.dumps(items, sort_keys=True).encode()).hexdigest()
+    return jobs.submit("transit", {"hotels": items}, key=key)["id"]
 
-    for hid in hotel_ids:
-        if len(results) >= limit:
-            break
-        try:
-            resp = amadeus.shopping.hotel_offers_search.get(
-                hotelIds=hid,
-                checkInDate=check_in,
-                checkOutDate=check_out,
-                adults=max(1, int(adults)),
-            )
-        except Exception:
-            continue
+# ---------- FastAPI app ----------
+setup_logging()  # JSON lines on stderr from a background thread (LOG_LEVEL, LOG_FORMAT)
+app = FastAPI(title=APP_NAME)
 
-        data = getattr(resp, "data", None)
-        if not data:
-            continue
+# gzip/br above COMPRESS_MIN_SIZE, strong ETags for static files, 304s
+app.add_middleware(CompressionETagMiddleware, minimum_size=COMPRESS_MIN_SIZE)
 
-        for oferta in data:
-            hotel = oferta.get("hotel", {})
-            name = hotel.get("name", f"Hotel {hid}")
+# request latency histogram + Server-Timing header (SERVER_TIMING=1)
+app.add_middleware(TracingMiddleware)
 
-            # normalize rating -> one decimal
-            raw_rating = hotel.get("rating")
-            try:
-                rating = round(float(raw_rating), 1) if raw_rating is not None else None
-            except Exception:
-                rating = None
+# bulkheads + token buckets for the search routes, so a search flood cannot take the
+# threadpool from /api/health, /api/favorites, ... (503/429 + Retry-After)
+ADMISSION_RULES = default_rules()
+app.add_middleware(AdmissionMiddleware, rules=ADMISSION_RULES)
 
-            geo = hotel.get("geoCode") or {}
-            lat, lon = geo.get("latitude"), geo.get("longitude")
+# per-request time budget for every upstream call (X-Request-Deadline-Ms / SEARCH_DEADLINE_MS)
+app.add_middleware(DeadlineMiddleware)
 
-            price_eur: Optional[float] = None
-            currency = None
-            try:
-                if oferta.get("offers"):
-                    price_obj = oferta["offers"][0]["price"]
-                    currency = price_obj.get("currency")
-                    total = float(price_obj.get("total"))
-                    if convert_to_euro and currency:
-                        price_eur = round(float(convert_to_euro(total, currency)), 2)
-                    else:
-                        price_eur = total if currency == "EUR" else None
-            except Exception:
-                pass
-
-            # budget filter
-            if budget is not None and price_eur is not None and price_eur > budget:
-                continue
+# ?profile=1 + X-Admin-Token -> sampling profile of that request (profiler.py)
+app.add_middleware(ProfileMiddleware)
 
-            # min rating filter
-            if min_rating is not None:
-                if rating is None:
-                    continue
-                try:
-                    if float(rating) < float(min_rating):
-                        continue
-                except Exception:
-                    continue
-
-            # nearest transit (optional)
-            dist_minutes = None
-            transit_name = None
-            if cel_mai_apropiat_transport and (lat is not None and lon is not None):
-                try:
-                    info = cel_mai_apropiat_transport(lat, lon)
-                    if isinstance(info, dict):
-                        transit_name = info.get("station_name")
-                        dur = str(info.get("duration") or "")
-                        for token in dur.split():
-                            if token.isdigit():
-                                dist_minutes = int(token)
-                                break
-                except Exception:
-                    pass
-
-            results.append(Hotel(
-                id=str(hid),
-                name=str(name),
-                address=(hotel.get("address", {}).get("lines", [None])[0]
-                         if isinstance(hotel.get("address"), dict) else None),
-                priceEUR=price_eur,
-                currency=currency,
-                rating=rating,
-                distanceToTransitMin=dist_minutes,
-                transitName=transit_name,
-                transportAvailable=(dist_minutes is not None),  # <- ADĂUGAT
-                imageUrl=None,
-                raw=oferta,
-            ))
-
-            if len(results) >= limit:
-                break
-
-    return results
-
-# ---------- FastAPI app ----------
-app = FastAPI(title=APP_NAME)
+# X-Request-ID in/out; every log line of the request carries it
+app.add_middleware(RequestIdMiddleware)
 
-# CORS (dev-friendly)
+# CORS (dev-friendly), outermost: responses made by the middlewares above (admission's
+# 429 / 503) carry the CORS headers too, so the browser sees a retryable rejection
+# and can read its Retry-After instead of an opaque network error
 app.add_middleware(
     CORSMiddleware,
     allow_origin_regex=".*",
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After", "X-Request-ID"],
 )
 
 # ---------- API routes ----------
@@ -377,17 +428,138 @@ def account(email: str = Depends(_require_user)):
     u = users.get(email, {})
     return AccountOut(email=email, createdAt=u.get("createdAt"))
 
-@app.post("/api/hotels/search", response_model=Dict[str, List[Hotel]])
-def hotels_search(q: SearchIn):
-    hotels = _fetch_hotels_from_backend(
+@app.post("/api/hotels/search", response_model=SearchOut)
+def hotels_search(q: SearchIn, defer: bool = False):
+    if not 1 <= q.limit <= SEARCH_MAX_LIMIT:
+        raise HTTPException(status_code=422, detail=f"limit must be between 1 and {SEARCH_MAX_LIMIT}")
+    hotels, res = _run_search(
         q.city,
         q.checkIn.isoformat(),   # send strings to Amadeus
         q.checkOut.isoformat(),
         q.budget,
         q.adults,
-        q.minRating
+        q.minRating,
+        enrich=not defer,
+        sort=q.sort,
+        limit=q.limit,
     )
-    return {"results": hotels}
+    ranking = None
+    if q.sort:
+        ranking = {"sort": q.sort, "candidates": res.candidates, "calls": res.calls,
+                   "complete": res.complete}
+    job_id = None
+    if defer and q.sort not in ("transit", "score"):
+        try:
+            job_id = _submit_enrichment(hotels)
+        except QueueFull:
+            # queue saturated: enrich inline instead of returning nothing
+            for h in hotels:
+                for field, value in _transit_fields(*_hotel_coords(h)).items():
+                    setattr(h, field, value)
+    return {"results": hotels, "enrichmentJob": job_id, "ranking": ranking,
+            "partial": deadline.is_partial()}
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(job_id: str, wait: float = 0):
+    # poll, or long-poll with ?wait=seconds (max 30) until the job finishes; async, so a
+    # waiting client holds no threadpool thread. Only the worker that owns the job waits,
+    # elsewhere it answers at once (see jobs.py)
+    job = await jobs.wait_async(job_id, min(max(wait, 0.0), 30.0))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return {k: job[k] for k in ("id", "kind", "status", "progress", "result", "error",
+                                "createdAt", "updatedAt")}
+
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "24"))   # cities x stays
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))    # sub-queries running at once
+
+def _submit(pool: ThreadPoolExecutor, fn, *args):
+    # each task runs in a copy of the request context so its spans land in this trace
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+def _try_resolve(city: str):
+    try:
+        return _resolve_city(city)
+    except HTTPException as e:
+        return e
+
+@app.post("/api/hotels/search/batch")
+def hotels_search_batch(q: BatchSearchIn):
+    # Several cities x flexible dates in one request. City codes and hotel lists are
+    # resolved once per city; FX rates, transit lookups and identical offer calls are
+    # shared through the caches / single-flight; everything runs on one pool.
+    cities = list(dict.fromkeys(c.strip() for c in q.cities if c.strip()))
+    if not cities:
+        raise HTTPException(status_code=422, detail="cities must not be empty")
+    if q.nights < 1:
+        raise HTTPException(status_code=422, detail="nights must be at least 1")
+    if q.dateFrom < date.today() or q.dateTo < q.dateFrom:
+        raise HTTPException(status_code=422, detail="Invalid date window")
+    stays = []
+    day = q.dateFrom
+    while day <= q.dateTo:
+        if not q.weekdays or day.weekday() in q.weekdays:
+            stays.append((day, day + timedelta(days=q.nights)))
+        day += timedelta(days=1)
+    if not stays:
+        raise HTTPException(status_code=422, detail="No check-in date matches the window")
+    if len(cities) * len(stays) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=422,
+                            detail=f"Too many searches ({len(cities) * len(stays)} > {BATCH_MAX_QUERIES})")
+
+    with ThreadPoolExecutor(max_workers=max(1, BATCH_CONCURRENCY)) as pool:
+        resolved = {c: f.result() for c, f in [(c, _submit(pool, _try_resolve, c)) for c in cities]}
+        tasks = {
+            (city, ci): _submit(pool, _fetch_hotels_from_backend, city, ci.isoformat(), co.isoformat(),
+                                q.budget, q.adults, q.minRating, resolved[city])
+            for city in cities if not isinstance(resolved[city], HTTPException)
+            for ci, co in stays
+        }
+
+        groups, cheapest = [], None
+        for city in cities:
+            r = resolved[city]
+            if isinstance(r, HTTPException):
+                groups.append({"city": city, "cityCode": None, "error": r.detail, "stays": []})
+                continue
+            out = []
+            for ci, co in stays:
+                try:
+                    hotels, error = tasks[(city, ci)].result(), None
+                except HTTPException as e:
+                    hotels, error = [], e.detail
+                prices = [h.priceEUR for h in hotels if h.priceEUR is not None]
+                out.append({"checkIn": ci, "checkOut": co, "results": hotels,
+                            "minPriceEUR": min(prices) if prices else None, "error": error})
+                for h in hotels:
+                    if h.priceEUR is not None and (cheapest is None or h.priceEUR < cheapest["hotel"].priceEUR):
+                        cheapest = {"city": city, "checkIn": ci, "checkOut": co, "hotel": h}
+            groups.append({"city": city, "cityCode": r[0], "error": None, "stays": out})
+
+    return {"queries": len(tasks), "cities": groups, "cheapest": cheapest,
+            "partial": deadline.is_partial()}
+
+@app.get("/api/hotels/price-range")
+def hotels_price_range(city: str, checkIn: date, checkOut: date, adults: int = 1):
+    # instant estimate from offers seen so far; the live search can run meanwhile
+    if baza is None:
+        raise HTTPException(status_code=500, detail="Nu pot importa baza.py din backend.")
+    if checkOut <= checkIn:
+        raise HTTPException(status_code=422, detail="checkOut must be after checkIn")
+    city_code = baza.obtine_city_code_hotel(city)  # type: ignore[attr-defined]
+    if not city_code:
+        raise HTTPException(status_code=404, detail="Orașul nu a fost găsit sau nu are hoteluri.")
+    nights = nights_between(checkIn, checkOut)
+    return {"city": city, "cityCode": city_code, "nights": nights, "adults": adults,
+            "range": get_price_stats().typical_range(city_code, checkIn, nights, adults)}
+
+@app.get("/api/cities")
+def cities_typeahead(prefix: str = "", limit: int = 10):
+    # local gazetteer (city_index.py), no upstream call; the answer only changes on deploy
+    limit = max(1, min(limit, 50))
+    out = [{"name": c.name, "cityCode": c.code, "country": c.country}
+           for c in city_index.complete(prefix, limit)]
+    return JSONResponse(out, headers={"Cache-Control": "public, max-age=3600"})
 
 def _load_map_file(path: Path) -> Dict[str, Dict[str, Any]]:
     return _read_json(path, {})
@@ -395,8 +567,28 @@ def _load_map_file(path: Path) -> Dict[str, Dict[str, Any]]:
 def _save_map_file(path: Path, data: Dict[str, Dict[str, Any]]):
     _write_json(path, data)
 
+# per-user list versions -> weak ETags. The file generation (mtime/size) is part
+# of the tag so writes made by another worker also invalidate it.
+LIST_VERSIONS = VersionCounter()
+
+def _list_etag(path: Path, email: str, generation: Optional[str] = None) -> str:
+    if generation is None:
+        try:
+            st = path.stat()
+            generation = f"{st.st_mtime_ns}-{st.st_size}"
+        except OSError:
+            generation = "0"
+    return weak_etag(path.name, email, generation, LIST_VERSIONS.get(path.name, email))
+
+def _list_response(items: Any, etag: str) -> JSONResponse:
+    return JSONResponse(jsonable_encoder(items),
+                        headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
 @app.get("/api/favorites")
-def get_favorites(email: str = Depends(_require_user)):
+def get_favorites(request: Request, email: str = Depends(_require_user)):
+    etag = _list_etag(FAVORITES_FILE, email)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
     data = _load_map_file(FAVORITES_FILE)
     favs = data.get(email, {})
     out = []
@@ -407,7 +599,7 @@ def get_favorites(email: str = Depends(_require_user)):
             payload = {"id": hid, **(payload if isinstance(payload, dict) else {})}
             h = Hotel(**payload)  # type: ignore
         out.append(h)
-    return out
+    return _list_response(out, etag)
 
 @app.post("/api/favorites")
 def add_favorite(body: FavoriteIn, email: str = Depends(_require_user)):
@@ -416,6 +608,7 @@ def add_favorite(body: FavoriteIn, email: str = Depends(_require_user)):
     user_map[body.hotelId] = body.payload
     data[email] = user_map
     _save_map_file(FAVORITES_FILE, data)
+    LIST_VERSIONS.bump(FAVORITES_FILE.name, email)
     return {"ok": True}
 
 @app.delete("/api/favorites/{hotel_id}")
@@ -426,27 +619,89 @@ def delete_favorite(hotel_id: str, email: str = Depends(_require_user)):
         del user_map[hotel_id]
         data[email] = user_map
         _save_map_file(FAVORITES_FILE, data)
+        LIST_VERSIONS.bump(FAVORITES_FILE.name, email)
     return {"ok": True}
 
+# ---------- history: raw window + daily rollups (history_store.py) ----------
+history_store = HistoryStore(HISTORY_DIR, legacy=HISTORY_FILE)
+history_retention = RetentionWorker(history_store.rollup)
+
 @app.get("/api/history")
-def get_history(email: str = Depends(_require_user)):
-    data = _load_map_file(HISTORY_FILE)
-    return list(data.get(email, {}).values())
+def get_history(request: Request, email: str = Depends(_require_user)):
+    # only the last HISTORY_RAW_DAYS days; older searches live on in /api/history/summary
+    etag = _list_etag(HISTORY_FILE, email, history_store.generation())
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return _list_response(history_store.list(email), etag)
 
 @app.post("/api/history")
 def add_history(entry: SearchIn, email: str = Depends(_require_user)):
-    data = _load_map_file(HISTORY_FILE)
-    user_map = data.get(email, {})
-    key = uuid.uuid4().hex
-    user_map[key] = jsonable_encoder(entry)  # evită eroarea cu date
-    data[email] = user_map
-    _save_map_file(HISTORY_FILE, data)
+    history_store.add(email, jsonable_encoder(entry))  # evită eroarea cu date
+    LIST_VERSIONS.bump(HISTORY_FILE.name, email)
     return {"ok": True}
 
+@app.get("/api/history/summary")
+def history_summary(days: int = 30, email: str = Depends(_require_user)):
+    days = max(1, min(days, history_store.rollup_days))
+    return JSONResponse({"user": history_store.summary(email, days),
+                         "cities": history_store.city_summary(days)[:20]},
+                        headers={"Cache-Control": "private, no-cache"})
+
 @app.get("/api/health")
 def health():
     return {"ok": True, "name": APP_NAME, "time": datetime.utcnow().isoformat() + "Z"}
 
+# ---------- readiness ----------
+# upstream priming is best effort (required=False): an API outage must not take
+# every worker out of the load balancer
+readiness = Readiness()
+readiness.register("amadeus_token", prime_amadeus, required=False)
+readiness.register("gmaps_connection", prime_gmaps, required=False)
+readiness.register("fx_rates", prime_fx, required=False)
+readiness.register("price_stats", prime_price_stats)
+readiness.register("city_index", lambda: {"cities": len(city_index.get_index())})
+readiness.register("history_retention", history_retention.run_and_schedule, required=False)
+readiness.register("cache_snapshot", restore_and_schedule, required=False)
+
+@app.on_event("startup")
+def _startup_warmup():
+    readiness.start()  # background thread, startup is not delayed
+
+@app.on_event("shutdown")
+def _shutdown_snapshot():
+    get_snapshotter().stop()  # last snapshot so the next worker starts warm
+    history_retention.stop()
+
+@app.get("/ready")
+def ready():
+    return readiness.response()
+
+# ---------- admin: sampling profiler ----------
+@app.get("/api/admin/profile")
+def admin_profile(seconds: float = 10, interval: float = PROFILE_INTERVAL,
+                  format: str = "speedscope", idle: bool = False,
+                  x_admin_token: Optional[str] = Header(None)):
+    # samples every thread for `seconds`; open the file in speedscope.app or flamegraph.pl
+    if not admin_token_ok(x_admin_token):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    if format not in ("speedscope", "collapsed"):
+        raise HTTPException(status_code=422, detail="format must be speedscope or collapsed")
+    try:
+        prof = profile_threads(seconds, interval, include_idle=idle)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    body, ctype = render(prof, format, f"{APP_NAME} {seconds:g}s")
+    ext = "speedscope.json" if format == "speedscope" else "folded.txt"
+    return Response(body, media_type=ctype, headers={
+        "Cache-Control": "no-store",
+        "Content-Disposition": f'attachment; filename="profile-{int(time.time())}.{ext}"',
+    })
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # ---------- STATIC (Variant A) ----------
 static_dir = ROOT / "static"
 
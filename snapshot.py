@@ -0,0 +1,187 @@
+# snapshot.py — periodic on-disk snapshots of the in-memory caches
+#
+# City codes, hotel lists, stations and FX rates live in MemoryCache (CACHE_BACKEND=memory)
+# and would be lost on every restart. The Snapshotter writes them to
+# APP_DATA_DIR/cache_snapshot.bin every SNAPSHOT_INTERVAL seconds and on shutdown
+# (tmp file + replace, like server._write_json), and restore_snapshot() loads them on
+# boot. Expiry times are absolute, so the time spent down is taken off every TTL and
+# entries that expired meanwhile are dropped.
+#
+# File layout: b"PE5S" | version (1 byte) | codec (1 byte) | payload
+#   codec 1 = msgpack (when installed), 2 = zlib-compressed JSON
+#   payload = {"written_at": <unix time>, "caches": {namespace: [[key, expires, value], ...]}}
+# Files above SNAPSHOT_MMAP_MIN bytes are decoded straight from a memory map.
+#
+# Config (env): SNAPSHOT_INTERVAL (0 = off), SNAPSHOT_NAMESPACES, SNAPSHOT_MMAP_MIN
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from applog import get_logger
+from cache import MemoryCache, get_cache
+
+try:
+    import msgpack  # type: ignore
+except Exception:
+    msgpack = None  # type: ignore
+
+SNAPSHOT_FILE = Path(os.getenv("APP_DATA_DIR", "./app_data")) / "cache_snapshot.bin"
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "300"))
+SNAPSHOT_NAMESPACES = [n.strip() for n in os.getenv(
+    "SNAPSHOT_NAMESPACES", "city_codes,hotel_lists,transit_places,transit_places_new,fx,offer_nights,offer_gaps"
+).split(",") if n.strip()]
+SNAPSHOT_MMAP_MIN = int(os.getenv("SNAPSHOT_MMAP_MIN", str(1024 * 1024)))
+
+log = get_logger(__name__)
+
+MAGIC = b"PE5S"
+VERSION = 1
+CODEC_MSGPACK, CODEC_ZJSON = 1, 2
+HEADER = len(MAGIC) + 2
+
+
+# ---------- encoding ----------
+def _encode(doc: Dict[str, Any]) -> bytes:
+    if msgpack is not None:
+        return bytes([VERSION, CODEC_MSGPACK]) + msgpack.packb(doc, use_bin_type=True)
+    raw = json.dumps(doc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return bytes([VERSION, CODEC_ZJSON]) + zlib.compress(raw, 6)
+
+def _decode(buf) -> Dict[str, Any]:
+    """``buf`` is bytes or a memoryview over the mmap (no copy of the payload)."""
+    if bytes(buf[:len(MAGIC)]) != MAGIC:
+        raise ValueError("not a cache snapshot")
+    version, codec = buf[len(MAGIC)], buf[len(MAGIC) + 1]
+    if version != VERSION:
+        raise ValueError(f"unsupported snapshot version {version}")
+    payload = buf[HEADER:]
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise ValueError("snapshot written with msgpack, which is not installed")
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    if codec == CODEC_ZJSON:
+        return json.loads(zlib.decompressobj().decompress(payload))
+    raise ValueError(f"unknown snapshot codec {codec}")
+
+
+# ---------- save / restore ----------
+def _memory_caches(namespaces: Iterable[str]) -> Dict[str, MemoryCache]:
+    # sqlite / redis backends persist on their own
+    out = {}
+    for ns in namespaces:
+        c = get_cache(ns)
+        if isinstance(c, MemoryCache):
+            out[ns] = c
+    return out
+
+def save_snapshot(path: Path = SNAPSHOT_FILE, namespaces: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    caches: Dict[str, list] = {}
+    skipped = []
+    for ns, c in _memory_caches(namespaces or SNAPSHOT_NAMESPACES).items():
+        entries = [[k, exp, v] for k, exp, v in c.items()]
+        try:
+            json.dumps(entries)  # only JSON-shaped values round-trip through both codecs
+        except (TypeError, ValueError):
+            skipped.append(ns)
+            continue
+        caches[ns] = entries
+
+    data = MAGIC + _encode({"written_at": time.time(), "caches": caches})
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with tmp.open("wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    tmp.replace(path)
+    return {"bytes": len(data), "entries": sum(len(v) for v in caches.values()),
+            "namespaces": len(caches), "skipped": skipped}
+
+def restore_snapshot(path: Path = SNAPSHOT_FILE, mmap_min: int = SNAPSHOT_MMAP_MIN) -> Dict[str, Any]:
+    """Load ``path`` into the memory caches; returns counts (missing file -> nothing to do)."""
+    if not path.exists():
+        return {"restored": 0, "file": None}
+    t0 = time.perf_counter()
+    size = path.stat().st_size
+    with path.open("rb") as f:
+        if size >= mmap_min and size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    doc = _decode(view)
+                finally:
+                    view.release()
+        else:
+            doc = _decode(f.read())
+
+    caches = _memory_caches(doc["caches"])
+    restored = sum(c.restore(tuple(e) for e in doc["caches"][ns]) for ns, c in caches.items())
+    return {"restored": restored, "bytes": size, "mmap": size >= mmap_min and size > 0,
+            "age_s": round(time.time() - doc["written_at"], 1),
+            "seconds": round(time.perf_counter() - t0, 4)}
+
+
+# ---------- periodic writer ----------
+class Snapshotter:
+    def __init__(self, path: Path = SNAPSHOT_FILE, interval: float = SNAPSHOT_INTERVAL,
+                 namespaces: Optional[Iterable[str]] = None):
+        self.path = path
+        self.interval = interval
+        self.namespaces = list(namespaces or SNAPSHOT_NAMESPACES)
+        self.last: Optional[Dict[str, Any]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def save(self) -> Dict[str, Any]:
+        self.last = save_snapshot(self.path, self.namespaces)
+        return self.last
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="cache-snapshot", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.save()
+            except Exception as e:
+                log.warning("cache_snapshot_failed", extra={"error": str(e)})
+
+    def stop(self, final: bool = True):
+        """Stop the timer and (by default) write one last snapshot. Nothing is written
+        if start() never ran, so a worker that skipped the restore cannot overwrite a
+        good snapshot with empty caches."""
+        self._stop.set()
+        if self._thread is None:
+            return
+        self._thread.join(timeout=5)
+        self._thread = None
+        if final:
+            self.save()
+
+
+_snapshotter: Optional[Snapshotter] = None
+
+def get_snapshotter() -> Snapshotter:
+    global _snapshotter
+    if _snapshotter is None:
+        _snapshotter = Snapshotter()
+    return _snapshotter
+
+def restore_and_schedule() -> Dict[str, Any]:
+    """Readiness check: restore the last snapshot, then start periodic snapshots."""
+    try:
+        stats = restore_snapshot(get_snapshotter().path)
+    finally:
+        get_snapshotter().start()
+    return stats
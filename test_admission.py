@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test admission control (admission.py): bulkhead, rate limits, trusted proxies, and a
+short load test showing cheap endpoints stay flat while searches flood the server
+No FastAPI needed: the app below is plain ASGI and runs its handlers on a fixed
+40-thread pool, the way FastAPI runs sync endpoints. bench_admission.py is the full
+version against server.py + upstream_sim.
+"""
+
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from admission import AdmissionMiddleware, Bulkhead, Rule, TrustedProxies, _client_keys
+from bench_search import asgi_request, percentile
+
+SEARCH_SECONDS = 0.2
+
+
+def _threadpool_app(pool: ThreadPoolExecutor, search_seconds: float = SEARCH_SECONDS):
+    """POST /api/hotels/search blocks a thread for ``search_seconds`` (upstream calls);
+    GET /api/health and /api/favorites need a thread for a moment."""
+    async def app(scope, receive, send):
+        work = search_seconds if scope["path"] == "/api/hotels/search" else 0.001
+        await asyncio.get_running_loop().run_in_executor(pool, time.sleep, work)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+    return app
+
+
+def _search_rule(**kw):
+    return Rule("search", "POST", "/api/hotels/search", concurrency=8, queue=16,
+                queue_timeout=0.5, **kw)
+
+
+async def _probe_under_flood(app, flood: int, seconds: float):
+    stop = time.perf_counter() + seconds
+    lat = {"/api/health": [], "/api/favorites": []}
+    searches = {}
+
+    async def prober(path):
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            await asgi_request(app, "GET", path)
+            lat[path].append(time.perf_counter() - t0)
+            await asyncio.sleep(0.01)
+
+    async def flooder(i):
+        while time.perf_counter() < stop:
+            status, _, _ = await asgi_request(app, "POST", "/api/hotels/search", {},
+                                              client=(f"10.0.0.{i + 1}", 40000 + i))
+            searches[status] = searches.get(status, 0) + 1
+            if status == 503:
+                await asyncio.sleep(0.05)
+
+    await asyncio.gather(*(prober(p) for p in lat), *(flooder(i) for i in range(flood)))
+    return {p: percentile(sorted(v), 95) for p, v in lat.items()}, searches
+
+
+def test_cheap_endpoints_stay_flat_under_search_flood():
+    results = {}
+    for mode in ("off", "on"):
+        with ThreadPoolExecutor(max_workers=40) as pool:
+            app = AdmissionMiddleware(_threadpool_app(pool), rules=[_search_rule()] if mode == "on" else [])
+            idle, _ = asyncio.run(_probe_under_flood(app, 0, 0.3))
+            flood, searches = asyncio.run(_probe_under_flood(app, 120, 1.5))
+        results[mode] = (idle, flood, searches)
+        print(f"admission {mode}: idle p95 {({p: round(v * 1000, 1) for p, v in idle.items()})} ms, "
+              f"flood p95 {({p: round(v * 1000, 1) for p, v in flood.items()})} ms, searches {searches}")
+
+    _, flood_off, _ = results["off"]
+    idle_on, flood_on, searches_on = results["on"]
+    for path in flood_on:
+        # without admission the probes wait for a thread behind the searches
+        assert flood_off[path] >= SEARCH_SECONDS / 2
+        # with it they keep close to idle: 8 search threads, 32 left for the rest
+        assert flood_on[path] < max(0.05, idle_on[path] * 5)
+    assert searches_on.get(503, 0) > 0 and searches_on.get(200, 0) > 0
+
+
+def test_bulkhead_queue_and_shed():
+    async def run():
+        b = Bulkhead(limit=1, queue=1)
+        assert await b.acquire(1.0) == "admitted"
+        waiter = asyncio.ensure_future(b.acquire(1.0))
+        await asyncio.sleep(0)
+        assert b.waiting == 1
+        assert await b.acquire(1.0) == "shed"             # queue full
+        b.release(0.1)                                     # slot goes to the waiter
+        assert await waiter == "queued" and b.active == 1
+        assert await b.acquire(0.01) == "timeout"
+        b.release(0.1)
+        assert b.active == 0
+    asyncio.run(run())
+
+
+def test_ip_limit_cannot_be_bypassed_with_forwarded_for():
+    rule = Rule("search", "POST", "/api/hotels/search", concurrency=100, queue=0,
+                ip_rate=0.01, ip_burst=3)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        app = AdmissionMiddleware(_threadpool_app(pool, 0.0), rules=[rule], trusted_proxies=TrustedProxies(""))
+
+        async def run():
+            out = []
+            for i in range(6):
+                status, _, _ = await asgi_request(app, "POST", "/api/hotels/search", {},
+                                                  {"x-forwarded-for": f"198.51.100.{i}"},
+                                                  client=("203.0.113.7", 50000 + i))
+                out.append(status)
+            return out
+        statuses = asyncio.run(run())
+    assert statuses == [200, 200, 200, 429, 429, 429]
+
+
+@pytest.mark.parametrize("peer, xff, expected", [
+    ("203.0.113.7", "1.2.3.4", "203.0.113.7"),               # untrusted peer: header ignored
+    ("10.0.0.2", "1.2.3.4", "1.2.3.4"),                       # our proxy
+    ("10.0.0.2", "6.6.6.6, 1.2.3.4", "1.2.3.4"),              # spoofed left part ignored
+    ("10.0.0.2", "1.2.3.4, 10.0.0.9", "1.2.3.4"),             # two proxy hops
+    ("10.0.0.2", None, "10.0.0.2"),
+])
+def test_trusted_proxies(peer, xff, expected):
+    headers = [(b"x-forwarded-for", xff.encode())] if xff else []
+    scope = {"headers": headers, "client": (peer, 1234)}
+    assert _client_keys(scope, TrustedProxies("10.0.0.0/8"))[1] == expected
+
+
+def test_server_cors_wraps_admission_rejections():
+    pytest.importorskip("fastapi")
+    pytest.importorskip("requests")
+    import server
+    from fastapi.middleware.cors import CORSMiddleware
+
+    # user_middleware lists the outermost first: CORS must see admission's 429 / 503
+    order = [m.cls for m in server.app.user_middleware]
+    assert order[0] is CORSMiddleware and AdmissionMiddleware in order
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q", "-s"]))
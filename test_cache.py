@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Test the cache backends (cache.py): LRU / TTL, single flight, and a Redis outage
+No Redis needed: the outage is a RespClient pointed at a closed local port.
+"""
+
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+import cache
+from cache import MISSING, MemoryCache, RedisCache, RespClient, SingleFlight, SQLiteCache
+
+
+def _closed_port() -> int:
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class _CountingClient:
+    """redis-py shaped client that fails every call and counts the attempts."""
+
+    def __init__(self, exc):
+        self.exc = exc
+        self.calls = 0
+
+    def get(self, name):
+        self.calls += 1
+        raise self.exc
+
+    set = delete = mget = get
+
+
+class _DictClient:
+    """redis-py shaped client over a dict; counts round trips."""
+
+    def __init__(self):
+        self.data, self.calls = {}, 0
+
+    def get(self, name):
+        self.calls += 1
+        return self.data.get(name)
+
+    def mget(self, names):
+        self.calls += 1
+        return [self.data.get(n) for n in names]
+
+    def set(self, name, value, px=None):
+        self.data[name] = value.encode()
+
+
+def test_memory_cache_lru_and_ttl():
+    c = MemoryCache("t", maxsize=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")            # a is now the most recent
+    c.set("c", 3)         # evicts b
+    assert c.get("b", MISSING) is MISSING and c.get("a") == 1 and c.get("c") == 3
+    c.set("short", "x", ttl=0.01)
+    time.sleep(0.02)
+    assert c.get("short", MISSING) is MISSING
+
+
+@pytest.mark.parametrize("make", [
+    lambda tmp: MemoryCache("t_many"),
+    lambda tmp: SQLiteCache("t_many", path=str(tmp / "c.sqlite3")),
+    lambda tmp: RedisCache("t_many", client=_DictClient()),
+])
+def test_get_many_matches_get(tmp_path, make):
+    c = make(tmp_path)
+    c.set("a", 1)
+    c.set("b", False)
+    if not isinstance(c, RedisCache):      # the dict client keeps no TTLs
+        c.set("gone", "x", ttl=0.01)
+        time.sleep(0.02)
+    keys = ["a", "missing", "b", "gone", "a"]
+    assert c.get_many(keys, MISSING) == [c.get(k, MISSING) for k in keys] == [1, MISSING, False, MISSING, 1]
+    assert c.get_many([]) == []
+
+
+def test_sqlite_get_many_batches_past_the_variable_limit(tmp_path):
+    c = SQLiteCache("t_big", path=str(tmp_path / "c.sqlite3"))
+    for i in range(0, 1200, 3):
+        c.set(str(i), i)
+    assert c.get_many([str(i) for i in range(1200)]) == [i if i % 3 == 0 else None for i in range(1200)]
+
+
+def test_redis_get_many_is_one_round_trip():
+    client = _DictClient()
+    c = RedisCache("t_mget", client=client)
+    c.set("a", 1)
+    assert c.get_many(["a", "b", "c"]) == [1, None, None] and client.calls == 1
+
+
+def test_single_flight_runs_the_factory_once():
+    flight, calls, gate = SingleFlight(), [], threading.Event()
+
+    def slow():
+        calls.append(1)
+        gate.wait(1)
+        return "v"
+
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(flight.do("k", slow))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert out == ["v"] * 5 and len(calls) == 1
+
+
+def test_redis_down_is_a_miss_not_an_error():
+    c = RedisCache("t_down", client=RespClient("127.0.0.1", _closed_port(), timeout=0.5))
+    before = cache.CACHE_BACKEND_ERRORS.value(backend="redis", op="get")
+    assert c.get("k", "dflt") == "dflt"
+    c.set("k", 1, ttl=10)
+    c.delete("k")
+    assert c.get_or_set("k", lambda: 42, ttl=10) == 42
+    assert c.get_many(["k", "j"], "dflt") == ["dflt", "dflt"]
+    assert cache.CACHE_BACKEND_ERRORS.value(backend="redis", op="get") == before + 1
+
+
+def test_redis_backs_off_then_retries(monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_RETRY_SECONDS", 0.05)
+    client = _CountingClient(ConnectionRefusedError())
+    c = RedisCache("t_backoff", client=client)
+    for _ in range(10):
+        assert c.get("k") is None
+        c.set("k", 1)
+    assert client.calls == 1          # one failed attempt, then served locally
+    time.sleep(0.06)
+    c.get("k")
+    assert client.calls == 2
+
+
+def test_corrupt_sqlite_file_is_a_miss_not_an_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_RETRY_SECONDS", 0.05)
+    path = tmp_path / "cache.sqlite3"
+    path.write_bytes(b"not a database" * 512)
+    before = cache.CACHE_BACKEND_ERRORS.value(backend="sqlite", op="init")
+    c = SQLiteCache("t_corrupt", path=str(path))
+    assert cache.CACHE_BACKEND_ERRORS.value(backend="sqlite", op="init") == before + 1
+    time.sleep(0.06)
+    assert c.get("k", "dflt") == "dflt"
+    c.set("k", 1, ttl=10)
+    c.delete("k")
+    c.clear()
+    assert c.get_many(["k", "j"], "dflt") == ["dflt", "dflt"]
+    assert c.get_or_set("k", lambda: 42, ttl=10) == 42
+    assert cache.CACHE_BACKEND_ERRORS.value(backend="sqlite", op="get") >= 1
+
+
+def test_redis_other_errors_still_raise():
+    c = RedisCache("t_bug", client=_CountingClient(TypeError("bug")))
+    with pytest.raises(TypeError):
+        c.get("k")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Test the request deadline (deadline.py) and what a spent budget does to city resolution
+No network: the upstream clients are local fakes or a local HTTP server that stalls,
+the budget is a few hundred milliseconds.
+"""
+
+import sys
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import deadline
+import hotel_lists
+from cache import MISSING, SingleFlight, cached, get_cache
+from search_engine import CityNotFound, resolve_city
+
+
+class _RawClient:
+    """Looks like the amadeus SDK Client to hotel_lists (host / ssl / port / http)."""
+    host, ssl, port = "test.api.amadeus.com", True, 443
+    access_token = types.SimpleNamespace(_bearer_token=lambda: "Bearer x")
+    opened = 0
+
+    def http(self, request):
+        self.opened += 1
+        return deadline.urlopen(request)   # what providers.py wires in
+
+
+class _StallingHandler(BaseHTTPRequestHandler):
+    """/headers stalls before answering, /body after the first bytes of the body."""
+
+    def do_GET(self):
+        if self.path.startswith("/headers"):
+            time.sleep(1.0)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "1000")
+        self.end_headers()
+        self.wfile.write(b'{"data": [{"hotelId": "H1"},')
+        self.wfile.flush()
+        time.sleep(1.0)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def slow_upstream():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _StallingHandler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+
+
+def _local_client(port, prefix):
+    client = _RawClient()
+    client.host, client.ssl, client.port = "127.0.0.1", False, port
+    client.http = lambda request: deadline.urlopen(
+        type(request)(request.full_url.replace(hotel_lists.BY_CITY_PATH, prefix), headers=request.headers))
+    return client
+
+
+def _spent(ms=20):
+    time.sleep(ms / 1000 + deadline.MIN_CALL_TIMEOUT)
+
+
+def test_timeout_outside_request_is_the_cap():
+    assert deadline.remaining() is None
+    assert deadline.timeout(3.0) == 3.0
+
+
+def test_timeout_raises_and_marks_partial():
+    with deadline.budget(500):
+        assert 0 < deadline.timeout(5.0) <= 0.5
+        time.sleep(0.5 - deadline.MIN_CALL_TIMEOUT + 0.05)
+        with pytest.raises(deadline.DeadlineExceeded):
+            deadline.timeout()
+        assert deadline.is_partial() and deadline.skipped() == ["upstream"]
+    assert not deadline.is_partial()
+
+
+def test_spent_budget_is_not_an_upstream_error():
+    # baza catches (ResponseError, OSError, ValueError) around fetch_by_city: the deadline
+    # must not look like one of them, or it turns into "no hotels" / "city not found"
+    client = _RawClient()
+    with deadline.budget(20):
+        _spent()
+        with pytest.raises(deadline.DeadlineExceeded) as e:
+            hotel_lists.fetch_by_city("PAR", client_factory=lambda: client)
+    assert not isinstance(e.value, (OSError, ValueError))
+    assert client.opened == 1
+
+
+@pytest.mark.parametrize("prefix", ["/headers", "/body"])
+def test_budget_running_out_mid_call_is_a_deadline(slow_upstream, prefix):
+    # the socket timeout is an OSError; baza would turn it into "no hotels" and cache it
+    client = _local_client(slow_upstream, prefix)
+
+    @cached("t_deadline_lists")
+    def hotel_ids(city_code):
+        try:
+            return hotel_lists.fetch_by_city(city_code, client_factory=lambda: client).ids
+        except OSError as error:           # what baza._hoteluri_oras does
+            deadline.raise_if_expired("hotels", error)
+            return None
+
+    t0 = time.perf_counter()
+    with deadline.budget(400):
+        with pytest.raises(deadline.DeadlineExceeded) as e:
+            hotel_ids(prefix)
+        assert deadline.is_partial()
+    assert time.perf_counter() - t0 < 0.7
+    assert isinstance(e.value.__cause__, OSError)
+    assert get_cache("t_deadline_lists").get(repr(((prefix,), [])), MISSING) is MISSING
+
+
+def test_upstream_timeout_with_budget_left_stays_an_error(slow_upstream, monkeypatch):
+    monkeypatch.setattr(deadline, "timeout", lambda cap=None: 0.2)   # a 200 ms call cap
+    client = _local_client(slow_upstream, "/headers")
+    with deadline.budget(5000):
+        with pytest.raises(OSError):
+            hotel_lists.fetch_by_city("PAR", client_factory=lambda: client)
+        assert not deadline.is_partial()
+
+
+def _in_budget(ms, fn, out, name):
+    def run():
+        with deadline.budget(ms):
+            try:
+                out[name] = fn()
+            except Exception as e:
+                out[name] = e
+            out[name + "_partial"] = deadline.is_partial()
+    t = threading.Thread(target=run)
+    t.start()
+    return t
+
+
+def test_single_flight_waiter_keeps_its_own_budget():
+    flight, out = SingleFlight(), {}
+    slow = _in_budget(2000, lambda: flight.do("k", lambda: time.sleep(0.6) or "v"), out, "slow")
+    time.sleep(0.05)
+    t0 = time.perf_counter()
+    fast = _in_budget(250, lambda: flight.do("k", lambda: "never"), out, "fast")
+    fast.join()
+    assert isinstance(out["fast"], deadline.DeadlineExceeded) and out["fast_partial"]
+    assert time.perf_counter() - t0 < 0.45
+    slow.join()
+    assert out["slow"] == "v" and not out["slow_partial"]
+
+
+def test_single_flight_waiter_retries_after_the_leaders_deadline():
+    flight, out, calls = SingleFlight(), {}, []
+
+    def call():
+        calls.append(1)
+        time.sleep(0.3)
+        deadline.timeout()          # spent for the 300 ms caller, not for the other one
+        return "v"
+
+    short = _in_budget(300, lambda: flight.do("k", call), out, "short")
+    time.sleep(0.05)
+    long = _in_budget(3000, lambda: flight.do("k", call), out, "long")
+    short.join()
+    long.join()
+    assert isinstance(out["short"], deadline.DeadlineExceeded) and out["short_partial"]
+    assert out["long"] == "v" and not out["long_partial"] and len(calls) == 2
+
+
+def test_resolve_city_reraises_deadline(monkeypatch):
+    fake = types.ModuleType("baza")
+    fake.obtine_city_code_hotel = lambda city: deadline.timeout() and "PAR"
+    fake.obtine_hoteluri_oras = lambda code: ["H1"]
+    monkeypatch.setitem(sys.modules, "baza", fake)
+
+    with deadline.budget(10000):
+        assert resolve_city("Paris") == ("PAR", ["H1"])
+
+    with deadline.budget(20):
+        _spent()
+        with pytest.raises(deadline.DeadlineExceeded):
+            resolve_city("Paris")
+        assert deadline.is_partial() and "city" in deadline.skipped()
+
+    fake.obtine_city_code_hotel = lambda city: None
+    with deadline.budget(10000), pytest.raises(CityNotFound):
+        resolve_city("Nowhere")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
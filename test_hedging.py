@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test hedged requests (hedging.py): when the backup runs, and when it must not
+No network: primary / backup are local functions that sleep, return or raise.
+"""
+
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+import deadline
+from hedging import Hedger, is_quota_error
+
+
+class _Calls:
+    def __init__(self, fn):
+        self.fn = fn
+        self.n = 0
+
+    def __call__(self):
+        self.n += 1
+        return self.fn()
+
+
+def _raise(exc):
+    def fn():
+        raise exc
+    return fn
+
+
+def _http_error(status):
+    e = IOError(f"HTTP {status}")
+    e.response = types.SimpleNamespace(status_code=status)
+    return e
+
+
+def test_fast_answer_stands_even_when_not_good():
+    h = Hedger("t_none", default_delay=0.5)
+    backup = _Calls(lambda: {"station_name": "B"})
+    assert h.run(lambda: None, backup) is None                          # "no station nearby"
+    assert h.run(lambda: {"duration": "Unknown"}, backup, is_good=lambda r: r["duration"] != "Unknown") \
+        == {"duration": "Unknown"}
+    assert backup.n == 0
+
+
+def test_primary_exception_falls_back():
+    h = Hedger("t_fail", default_delay=0.5)
+    backup = _Calls(lambda: "backup")
+    assert h.run(_raise(ConnectionError("reset")), backup) == "backup"
+    assert backup.n == 1
+
+
+@pytest.mark.parametrize("exc", [
+    _http_error(429),
+    type("_OverQueryLimit", (Exception,), {})(),
+    deadline.DeadlineExceeded("spent"),
+])
+def test_quota_and_deadline_errors_do_not_fall_back(exc):
+    h = Hedger("t_quota", default_delay=0.5)
+    backup = _Calls(lambda: "backup")
+    with pytest.raises(type(exc)):
+        h.run(_raise(exc), backup)
+    assert backup.n == 0
+
+
+def test_is_quota_error():
+    assert is_quota_error(_http_error(429)) and not is_quota_error(_http_error(500))
+    assert is_quota_error(types.SimpleNamespace(status="OVER_QUERY_LIMIT"))
+
+
+def test_slow_primary_is_hedged_within_budget():
+    h = Hedger("t_slow", default_delay=0.02, burst=1, max_rate=0.0)
+    backup = _Calls(lambda: "backup")
+    slow = lambda: time.sleep(0.3) or "primary"
+    t0 = time.perf_counter()
+    assert h.run(slow, backup) == "backup"
+    assert time.perf_counter() - t0 < 0.2
+    # budget spent: the next slow call just waits for its primary
+    assert h.run(slow, backup) == "primary" and backup.n == 1
+
+
+def test_pool_queueing_is_not_counted_as_latency():
+    # one worker: the second call waits ~0.1 s for the thread, then runs ~0.1 s
+    h = Hedger("t_queue", default_delay=5.0, workers=1)
+    calls = [threading.Thread(target=h.run, args=(lambda: time.sleep(0.1) or 1,)) for _ in range(2)]
+    for t in calls:
+        t.start()
+    for t in calls:
+        t.join()
+    assert len(h._latencies) == 2 and max(h._latencies) < 0.17
+
+
+def test_each_hedger_has_its_own_pool():
+    a, b = Hedger("t_pool_a", workers=1), Hedger("t_pool_b", workers=1)
+    assert a._executor() is not b._executor()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test the search history store (history_store.py): rollups, windows, partitions, migration
+No server: a HistoryStore on a temporary directory with a fixed clock.
+"""
+
+import json
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+from history_store import HistoryStore
+
+NOW = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+
+
+def _at(day: str) -> datetime:
+    return datetime.fromisoformat(day + "T09:00:00+00:00")
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = HistoryStore(tmp_path / "history", raw_days=40, rollup_days=365)
+    for email, day, city in [("a@x", "2026-08-20", "Paris"), ("a@x", "2026-09-20", "Paris"),
+                             ("b@x", "2026-09-20", "Paris"), ("a@x", "2026-10-18", "Rome"),
+                             ("a@x", "2026-10-19", "Rome")]:
+        s.add(email, {"city": city}, now=_at(day))
+    return s
+
+
+def test_rollup_keeps_summaries_and_drops_old_partitions(store):
+    before = store.summary("a@x", days=60, now=NOW)
+    stats = store.rollup(now=NOW)
+    assert stats["through"] == "2026-10-18" and stats["dropped_partitions"] == ["2026-08"]
+    assert store.partitions() == ["2026-09", "2026-10"]
+    assert store.summary("a@x", days=60, now=NOW) == before
+    assert before["total"] == 3 and before["topCities"][0] == {"city": "Rome", "searches": 2}
+    # today is still open: a second pass rolls nothing and keeps the entry raw
+    assert store.rollup(now=NOW)["rolled"] == 0
+    assert [e["city"] for e in store.list("a@x", now=NOW)] == ["Paris", "Rome", "Rome"]
+
+
+def test_city_summary_uses_the_summary_window(store):
+    store.rollup(now=NOW)
+    # 29 days back from 2026-10-19, today included, start on 2026-09-21
+    days = [d["date"] for d in store.summary("a@x", days=29, now=NOW)["days"]]
+    assert days == ["2026-10-19", "2026-10-18"]
+    assert store.city_summary(days=29, now=NOW) == [{"city": "Rome", "searches": 1, "userDays": 1}]
+    assert store.city_summary(days=30, now=NOW) == [{"city": "Paris", "searches": 2, "userDays": 2},
+                                                    {"city": "Rome", "searches": 1, "userDays": 1}]
+
+
+def test_legacy_file_is_migrated_once(tmp_path):
+    legacy = tmp_path / "history.json"
+    legacy.write_text(json.dumps({"a@x": {"k1": {"city": "Paris"}}}), encoding="utf-8")
+    s = HistoryStore(tmp_path / "history", legacy=legacy)
+    assert [e["city"] for e in s.list("a@x")] == ["Paris"]
+    assert not legacy.exists() and legacy.with_suffix(".json.migrated").exists()
+    s.add("a@x", {"city": "Rome"})
+    assert len(s.list("a@x")) == 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test the streaming by_city parser (hotel_lists.py): any chunking, early stop, bad bodies
+No network: bodies are byte strings cut into chunks of every size.
+"""
+
+import json
+import sys
+
+import pytest
+
+import hotel_lists
+from hotel_lists import collect, iter_array
+
+HOTELS = [{"hotelId": f"H{i}", "name": f"Hôtel №{i}", "geoCode": {"latitude": 48.85 + i / 1000,
+                                                                "longitude": 2.35}}
+          for i in range(20)] + [{"hotelId": "NOGEO", "name": "Ø"}, 12.5e3, None]
+BODY = json.dumps({"meta": {"count": 23, "links": {"self": "x"}}, "data": HOTELS,
+                   "warnings": [{"code": 1}]}, ensure_ascii=False).encode("utf-8")
+
+
+def _chunks(body: bytes, size: int):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(BODY)])
+def test_any_chunking_yields_the_same_items(size):
+    assert list(iter_array(_chunks(BODY, size))) == HOTELS
+
+
+@pytest.mark.parametrize("body, items", [
+    (b'{}', []),
+    (b'{"data": []}', []),
+    (b' {\n "data" : [ 1 , 2 ] , "meta" : {} }\n', [1, 2]),
+    (b'{"meta": {"data": [9]}, "data": [3]}', [3]),         # nested "data" is not the array
+    (b'{"data": {"not": "an array"}}', []),
+])
+def test_shapes(body, items):
+    assert list(iter_array(_chunks(body, 3))) == items
+
+
+@pytest.mark.parametrize("body", [b'{"data": [{"hotelId": "H1"}, {"hotel', b'{"data": [1, 2', b'["data"]'])
+def test_bad_bodies_raise(body):
+    with pytest.raises(ValueError):
+        list(iter_array(_chunks(body, 4)))
+
+
+def test_oversized_item_raises(monkeypatch):
+    monkeypatch.setattr(hotel_lists, "HOTEL_LIST_MAX_ITEM", 100)
+    body = json.dumps({"data": [{"name": "x" * 500}]}).encode()
+    with pytest.raises(ValueError):
+        list(iter_array(_chunks(body, 16)))
+
+
+def test_collect_stops_reading_at_the_limit():
+    read = []
+
+    def chunks():
+        for c in _chunks(BODY, 32):
+            read.append(len(c))
+            yield c
+
+    hl = collect(iter_array(chunks()), "PAR", limit=3)
+    assert hl.ids == ["H0", "H1", "H2"] and not hl.complete
+    assert sum(read) < len(BODY) / 3
+
+
+def test_collect_projects_columns():
+    hl = collect(iter_array(_chunks(BODY, 50)), "PAR")
+    assert len(hl) == 21 and hl.complete and hl.names[1] == "Hôtel №1"
+    assert hl.coordinates(0) == (48.85, 2.35) and hl.coordinates(20) is None
+    assert collect(iter(HOTELS), "PAR", limit=0).ids == []
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
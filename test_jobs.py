@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test the background job queue (jobs.py): records, idempotency keys, long-poll, expiry
+No server: handlers are local functions; the shared cache is a tiny LRU.
+"""
+
+import asyncio
+import json
+import sys
+import threading
+import time
+
+import pytest
+
+from cache import MemoryCache
+from jobs import JobQueue, QueueFull
+
+
+@pytest.fixture
+def jobs():
+    q = JobQueue(workers=2, max_queued=8, result_ttl=60)
+    q.store, q.keys = MemoryCache("t_jobs", maxsize=2), MemoryCache("t_job_keys", maxsize=64)
+    gate = threading.Event()
+
+    @q.handler("echo")
+    def echo(ctx, payload):
+        ctx.progress(0, 1)
+        if payload == "block":
+            gate.wait(2)
+        if payload == "boom":
+            raise RuntimeError("boom")
+        ctx.progress(1, 1)
+        return payload
+
+    q.gate = gate
+    yield q
+    gate.set()
+    q.shutdown()
+
+
+def test_records_survive_lru_eviction(jobs):
+    ids = [jobs.submit("echo", i)["id"] for i in range(8)]
+    for i, job_id in enumerate(ids):
+        job = jobs.wait(job_id, 2)
+        assert job["status"] == "done" and job["result"] == i and job["progress"] == {"done": 1, "total": 1}
+    assert all(jobs.get(job_id) for job_id in ids)
+
+
+def test_running_job_and_long_poll(jobs):
+    job = jobs.submit("echo", "block")
+    time.sleep(0.05)
+    assert jobs.get(job["id"])["status"] == "running"
+    t0 = time.perf_counter()
+    assert jobs.wait(job["id"], 0.1)["status"] == "running"
+    assert time.perf_counter() - t0 >= 0.1
+    jobs.gate.set()
+    assert jobs.wait(job["id"], 2)["status"] == "done"
+
+
+def test_polling_while_the_handler_grows_its_partial_result(jobs):
+    live, paused, resume = {}, threading.Event(), threading.Event()
+
+    @jobs.handler("grow")
+    def grow(ctx, n):
+        for i in range(n):
+            live[f"h{i}"] = {"station": i}
+            ctx.progress(i + 1, n, partial={"hotels": live})
+            if i == 10:
+                paused.set()
+                resume.wait(2)
+        return {"hotels": live}
+
+    job_id = jobs.submit("grow", 400)["id"]
+    paused.wait(2)
+    seen = jobs.get(job_id)
+    assert seen["result"]["hotels"] is not live and len(seen["result"]["hotels"]) == 11
+    resume.set()
+    polls = 0
+    while jobs.get(job_id)["status"] == "running":
+        json.dumps(jobs.get(job_id))          # what /api/jobs/{id} serializes
+        polls += 1
+    assert polls and len(seen["result"]["hotels"]) == 11
+    assert len(jobs.get(job_id)["result"]["hotels"]) == 400
+
+
+def test_wait_async_needs_no_thread_per_waiter(jobs):
+    job_id = jobs.submit("echo", "block")["id"]
+
+    async def run():
+        t0 = time.perf_counter()
+        waiting = await asyncio.gather(*(jobs.wait_async(job_id, 0.2) for _ in range(50)))
+        assert all(j["status"] == "running" for j in waiting)
+        assert time.perf_counter() - t0 < 0.5          # concurrent, on the loop's one thread
+        threading.Timer(0.05, jobs.gate.set).start()
+        t0 = time.perf_counter()
+        done = await jobs.wait_async(job_id, 5)
+        assert done["status"] == "done" and time.perf_counter() - t0 < 1
+        assert (await jobs.wait_async("nope", 1)) is None
+    asyncio.run(run())
+
+
+def test_idempotency_key_and_failure(jobs):
+    a = jobs.submit("echo", "block", key="k")
+    assert jobs.submit("echo", "block", key="k")["id"] == a["id"]
+    jobs.gate.set()
+    failed = jobs.submit("echo", "boom", key="f")
+    assert jobs.wait(failed["id"], 2)["error"] == "RuntimeError: boom"
+    assert jobs.submit("echo", 1, key="f")["id"] != failed["id"]     # failed jobs are retried
+
+
+def test_finished_records_expire_after_the_ttl(jobs):
+    jobs.result_ttl = 0.05
+    job_id = jobs.submit("echo", 1)["id"]
+    assert jobs.wait(job_id, 2)["status"] == "done"
+    time.sleep(0.06)
+    assert jobs.get(job_id) is None and not jobs._expiry
+
+
+def test_queue_full_and_unknown_kind():
+    q = JobQueue(workers=1, max_queued=1)
+    gate = threading.Event()
+    q.handler("slow")(lambda ctx, p: gate.wait(2))
+    try:
+        q.submit("slow", None)
+        time.sleep(0.05)           # the worker took the first one
+        q.submit("slow", None)
+        with pytest.raises(QueueFull):
+            q.submit("slow", None)
+        with pytest.raises(KeyError):
+            q.submit("nope", None)
+    finally:
+        gate.set()
+        q.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
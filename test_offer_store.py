@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test the per-night offer store (offer_store.py): estimates and candidate ordering
+No network: offers are recorded by hand into in-memory caches.
+"""
+
+import sys
+
+import pytest
+
+from cache import MemoryCache
+from offer_store import OfferStore
+
+CHECK_IN, CHECK_OUT = "2026-12-12", "2026-12-15"
+
+
+class _CountingCache(MemoryCache):
+    def __init__(self, namespace):
+        super().__init__(namespace)
+        self.reads = 0
+
+    def get(self, key, default=None):
+        self.reads += 1
+        return super().get(key, default)
+
+    def get_many(self, keys, default=None):
+        self.reads += 1
+        return super().get_many(keys, default)
+
+
+@pytest.fixture
+def store():
+    s = OfferStore(ttl=600, slack=1.0)
+    s.nights, s.gaps = _CountingCache("t_nights"), _CountingCache("t_gaps")
+    s.record_offer("cheap", "2026-12-12", "2026-12-15", 2, 240.0)        # 80 / night
+    s.record_offer("dear", "2026-12-12", "2026-12-15", 2, 450.0)         # 150 / night
+    s.record_offer("half", "2026-12-13", "2026-12-15", 2, 200.0)         # 2 of 3 nights
+    s.record_offer("over", "2026-12-12", "2026-12-14", 2, 700.0)         # 2 nights > budget
+    s.record_unavailable("full", "2026-12-13", "2026-12-14", 2)          # one night gone
+    s.record_unavailable("range", "2026-12-12", "2026-12-14", 2)         # some night of 12-14
+    return s
+
+
+def test_estimate(store):
+    assert store.estimate("cheap", CHECK_IN, CHECK_OUT, 2).status == "likely"
+    assert store.estimate("cheap", CHECK_IN, CHECK_OUT, 1).status == "unknown"
+    half = store.estimate("half", CHECK_IN, CHECK_OUT, 2)
+    assert half.status == "unknown" and half.estimated_eur == 300.0
+    assert store.estimate("over", CHECK_IN, CHECK_OUT, 2, budget=500).status == "over_budget"
+    assert store.estimate("full", CHECK_IN, CHECK_OUT, 2).status == "unavailable"
+    assert store.estimate("range", CHECK_IN, CHECK_OUT, 2).status == "unavailable"
+    assert store.estimate("range", "2026-12-13", CHECK_OUT, 2).status == "unknown"
+
+
+def test_prioritise_orders_and_drops(store):
+    ids = ["new1", "full", "dear", "half", "over", "range", "cheap", "new2"]
+    assert store.prioritise(ids, CHECK_IN, CHECK_OUT, 2, budget=500) == ["cheap", "dear", "half", "new1", "new2"]
+    assert store.prioritise(ids, CHECK_IN, CHECK_IN, 2) == ids
+
+
+def test_prioritise_reads_the_candidate_list_in_two_lookups(store):
+    ids = [f"h{i}" for i in range(300)] + ["cheap"]
+    store.nights.reads = store.gaps.reads = 0
+    assert store.prioritise(ids, CHECK_IN, CHECK_OUT, 2)[0] == "cheap"
+    assert store.nights.reads == 1 and store.gaps.reads == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
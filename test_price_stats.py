@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test the price sketches behind the search prefilter (price_stats.py)
+No network, no files: PriceStats(path=None) keeps everything in memory.
+"""
+
+import json
+import sys
+
+import pytest
+
+from price_stats import PriceStats, Sketch
+
+
+def test_sketch_quantiles_within_relative_error():
+    s = Sketch(0.02)
+    for x in range(1, 1001):
+        s.add(float(x))
+    assert s.count == 1000 and s.min == 1.0 and s.max == 1000.0
+    assert s.quantile(0.5) == pytest.approx(500, rel=0.03)
+    assert Sketch.from_json(json.loads(json.dumps(s.to_json()))).quantile(0.9) == s.quantile(0.9)
+
+
+def test_skip_only_for_the_same_number_of_adults():
+    stats = PriceStats(path=None)
+    for _ in range(3):
+        stats.observe("PAR", "H1", "2026-07-01", 2, 800.0, adults=4)   # 400 / night for 4
+
+    # a 4-adult search with a 300 EUR budget: never seen anywhere near it
+    assert stats.should_skip("PAR", "H1", "2026-07-10", 2, 300.0, adults=4, explore=0)
+    # a 1-adult search is not judged by 4-adult prices
+    assert not stats.should_skip("PAR", "H1", "2026-07-10", 2, 300.0, adults=1, explore=0)
+    # other season: no data, no skip
+    assert not stats.should_skip("PAR", "H1", "2026-12-10", 2, 300.0, adults=4, explore=0)
+
+
+def test_typical_range_per_adults():
+    stats = PriceStats(path=None)
+    for price in (100.0, 120.0, 140.0):
+        stats.observe("ROM", "H%d" % price, "2026-05-01", 1, price, adults=2)
+    r = stats.typical_range("ROM", "2026-05-03", 1, adults=2)
+    assert r["basis"] == "nights" and r["samples"] == 3 and 100 <= r["median"] <= 140
+    assert stats.typical_range("ROM", "2026-05-03", 1, adults=1) is None
+
+
+def test_old_files_without_adults_are_dropped(tmp_path):
+    path = tmp_path / "price_stats.json"
+    old = Sketch()
+    old.add(500.0)
+    path.write_text(json.dumps({"hotel|PAR|summer|H1": old.to_json(),
+                                "city|PAR|summer|2": old.to_json()}))
+    stats = PriceStats(path)
+    assert len(stats) == 1
+    assert stats.typical_range("PAR", "2026-07-01", 1, adults=2)["samples"] == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test search_history retention (app/services/retention.py) on a SQLite file
+Rollups, purges and /history counts with a fixed "today"; skipped without SQLAlchemy
+or the app's own imports (FastAPI, python-dotenv).
+"""
+
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("fastapi")
+pytest.importorskip("dotenv")
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+# models.py builds its engine at import; point it at a throwaway file (as bench_search does)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='test_retention_')}/app.db")
+from app.models.models import Base, SearchDailyCity, SearchDailyUser, SearchHistory
+from app.services import retention
+
+TODAY = date(2026, 10, 19)
+
+# (user, days before TODAY, city, searches)
+SEARCHES = [(1, 8, "Paris", 2), (1, 5, "Rome", 1), (2, 5, "Rome", 3), (1, 3, "Paris", 1),
+            (1, 2, "Rome", 2), (2, 1, "Paris", 1), (1, 0, "Paris", 1)]
+
+
+@pytest.fixture
+def Session(tmp_path, monkeypatch):
+    monkeypatch.setattr(retention, "HISTORY_RAW_DAYS", 3)
+    monkeypatch.setattr(retention, "HISTORY_PURGE_BATCH", 2)     # several delete batches
+    engine = create_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        for user_id, ago, city, n in SEARCHES:
+            for i in range(n):
+                db.add(SearchHistory(user_id=user_id, city=city, budget=300.0, check_in_date="2026-11-01",
+                                     check_out_date="2026-11-03",
+                                     created_at=datetime.combine(TODAY - timedelta(days=ago), datetime.min.time(),
+                                                                 tzinfo=timezone.utc) + timedelta(hours=10 + i)))
+        db.commit()
+    yield factory
+    engine.dispose()
+
+
+def _counts(db):
+    return (db.scalar(select(func.count()).select_from(SearchHistory)),
+            db.scalar(select(func.count()).select_from(SearchDailyUser)),
+            db.scalar(select(func.count()).select_from(SearchDailyCity)))
+
+
+def _daily(db, user_id):
+    return retention.user_history(db, user_id, days=30, today=TODAY)["daily"]
+
+
+def test_rollup_is_idempotent(Session):
+    with Session() as db:
+        stats = retention.rollup(db, today=TODAY)
+        assert stats == {"days": 8, "through": (TODAY - timedelta(days=1)).isoformat()}
+        once = _counts(db)
+        assert retention.rollup(db, today=TODAY) == {"days": 0, "through": stats["through"]}
+        assert _counts(db) == once
+        rome = db.get(SearchDailyCity, (TODAY - timedelta(days=5), "Rome"))
+        assert (rome.searches, rome.users) == (4, 2)
+        # today is still open; the next day's pass adds it and nothing else
+        assert retention.rollup(db, today=TODAY + timedelta(days=1))["days"] == 1
+        assert _counts(db)[2] == once[2] + 1
+
+
+def test_purge_deletes_only_rolled_up_rows_past_the_window(Session):
+    with Session() as db:
+        assert retention.purge(db, today=TODAY)["raw_deleted"] == 0     # nothing rolled up yet
+        retention.rollup(db, today=TODAY - timedelta(days=7))            # through: TODAY - 8
+        # TODAY - 5 is past the raw window (TODAY - 3) but not rolled up: it stays
+        assert retention.purge(db, today=TODAY)["raw_deleted"] == 2
+        retention.rollup(db, today=TODAY)
+        assert retention.purge(db, today=TODAY)["raw_deleted"] == 1 + 3
+        assert retention.purge(db, today=TODAY)["raw_deleted"] == 0
+        kept = db.scalars(select(SearchHistory.created_at)).all()
+        assert len(kept) == 1 + 2 + 1 + 1
+        assert min(kept).date() == TODAY - timedelta(days=3)
+
+
+def test_run_and_user_history_agree_before_and_after_retention(Session):
+    with Session() as db:
+        before = {u: _daily(db, u) for u in (1, 2)}
+    assert before[1][0] == {"day": (TODAY - timedelta(days=8)).isoformat(), "searches": 2, "cities": {"Paris": 2}}
+    assert sum(d["searches"] for d in before[1]) == 2 + 1 + 1 + 2 + 1
+
+    stats = retention.run(Session)          # rollup through yesterday, purge past the raw window
+    assert stats["raw_deleted"] > 0
+    with Session() as db:
+        # rolled-up days from the rollup table, today from raw rows: no day counted twice
+        assert {u: _daily(db, u) for u in (1, 2)} == before
+        recent = retention.user_history(db, 1, today=TODAY)["recent"]
+        assert [r["city"] for r in recent] == ["Paris", "Rome", "Rome", "Paris"]
+
+    # the worker missed a few days: raw rows after the watermark still count once
+    with Session() as db:
+        for model in (SearchDailyUser, SearchDailyCity):
+            db.query(model).filter(model.day >= TODAY - timedelta(days=2)).delete()
+        db.commit()
+        assert {u: _daily(db, u) for u in (1, 2)} == before
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
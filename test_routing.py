@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test primary / replica routing (app/models/routing.py) with two SQLite files
+The files hold different rows, so every read shows which engine answered.
+Failover: the replica's directory is moved away (connect fails), then put back.
+"""
+
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+from sqlalchemy import Column, Integer, String, select, text
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from app.models import routing
+from app.models.routing import DatabaseRouter, RoutingSession, bind_actor
+
+Base = declarative_base()
+
+
+class Note(Base):
+    __tablename__ = "notes"
+    id = Column(Integer, primary_key=True)
+    origin = Column(String, nullable=False)
+
+
+@pytest.fixture
+def dbs(tmp_path, monkeypatch):
+    monkeypatch.setattr(routing, "DB_READ_YOUR_WRITES_SECONDS", 0.2)
+    monkeypatch.setattr(routing, "DB_REPLICA_RETRY_SECONDS", 0.1)
+    (tmp_path / "replica").mkdir()
+    router = DatabaseRouter(f"sqlite:///{tmp_path / 'primary.db'}",
+                            [f"sqlite:///{tmp_path / 'replica' / 'replica.db'}"])
+    router._sticky.clear()
+    for name, engine in router.engines().items():
+        Base.metadata.create_all(engine)
+        with engine.begin() as c:
+            c.execute(Note.__table__.insert().values(origin=name))
+    yield router, sessionmaker(class_=RoutingSession, router=router), tmp_path
+    for engine in router.engines().values():
+        engine.dispose()
+
+
+def _origins(db):
+    return db.scalars(select(Note.origin).order_by(Note.id)).all()
+
+
+def test_reads_go_to_the_replica_writes_to_the_primary(dbs):
+    router, Session, _ = dbs
+    with Session(read_replica=True) as db:
+        assert _origins(db) == ["replica0"]
+        db.add(Note(origin="new"))
+        db.flush()
+        assert _origins(db) == ["primary", "new"]        # wrote: the rest of the session too
+        db.commit()
+    with Session() as db:                                  # a primary session (POST, PUT, ...)
+        assert _origins(db) == ["primary", "new"]
+
+
+def test_pinned_reads(dbs):
+    _, Session, _ = dbs
+    with Session(read_replica=True) as db:
+        with db.primary():
+            assert _origins(db) == ["primary"]
+        assert _origins(db) == ["replica0"]
+
+
+def test_read_your_writes_is_sticky_per_actor_for_a_while(dbs):
+    _, Session, _ = dbs
+    with Session() as db:
+        bind_actor(db, "Alice", "alice@x")
+        db.add(Note(origin="alice"))
+        db.commit()
+
+    def reads(actor):
+        with Session(read_replica=True) as db:
+            bind_actor(db, actor)
+            return _origins(db)
+
+    assert reads("alice@X") == ["primary", "alice"]       # same actor, case-insensitive
+    assert reads("bob") == ["replica0"]
+    time.sleep(0.25)
+    assert reads("alice") == ["replica0"]
+
+
+def test_failover_and_recovery(dbs):
+    router, Session, tmp_path = dbs
+    replica = router.replicas[0]
+    (tmp_path / "replica").rename(tmp_path / "gone")
+    replica.engine.dispose()
+    with Session(read_replica=True) as db:
+        with pytest.raises(Exception):
+            _origins(db)
+    assert not replica.healthy
+    with Session(read_replica=True) as db:                # meanwhile reads use the primary
+        assert _origins(db) == ["primary"]
+
+    (tmp_path / "gone").rename(tmp_path / "replica")
+    time.sleep(0.15)
+    with Session(read_replica=True) as db:                # probed with SELECT 1, back in rotation
+        assert _origins(db) == ["replica0"]
+    assert replica.healthy and router.status()["replica0"]["healthy"]
+
+
+def test_without_replicas_everything_uses_the_primary(tmp_path):
+    router = DatabaseRouter(f"sqlite:///{tmp_path / 'only.db'}")
+    with sessionmaker(class_=RoutingSession, router=router)(read_replica=True) as db:
+        assert not db.read_replica and db.get_bind() is router.primary
+        assert db.execute(text("SELECT 1")).scalar() == 1
+    router.primary.dispose()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test the search pipeline (search_engine.py) with local stages: ranking, TopK, hooks
+No network: fetch returns canned offers, the transit enricher reads a dict.
+"""
+
+import random
+import sys
+
+import pytest
+
+from search_engine import SearchEngine, SearchHook, SearchQuery, TopK, sort_key, transit_minutes
+
+# hotel id -> (price EUR, rating, walking minutes to the nearest stop)
+HOTELS = {f"H{i:02d}": (100.0 + 10 * i, 3.0 + (i % 3), 30 - i) for i in range(30)}
+
+
+def _fetch(q, hotel_id):
+    price, rating, _ = HOTELS[hotel_id]
+    return [{"hotel": {"name": hotel_id, "rating": rating, "latitude": 1.0, "longitude": 2.0,
+                       "geoCode": {"latitude": 1.0, "longitude": 2.0}},
+             "offers": [{"price": {"total": str(price), "currency": "EUR"}}]}]
+
+
+def _enricher(q, o):
+    o.transit = {"station_name": "S", "duration": f"{HOTELS[o.hotel_id][2]} mins"}
+
+
+def _engine(**kw):
+    return SearchEngine(fetch=_fetch, enrichers=[_enricher], hooks=[], concurrency=4, **kw)
+
+
+def _query(**kw):
+    return SearchQuery("X", "2026-11-01", "2026-11-03", hotel_ids=list(HOTELS), city_code="XXX", **kw)
+
+
+@pytest.mark.parametrize("text, minutes", [
+    ("7 mins", 7), ("1 min", 1), ("1 hour 5 mins", 65), ("2 hours", 120),
+    ("1 day 2 hours", 1560), ("Unknown", None), ("", None),
+])
+def test_transit_minutes(text, minutes):
+    assert transit_minutes({"duration": text}) == minutes
+
+
+def test_topk_matches_full_sort():
+    rng = random.Random(7)
+    items = [rng.randint(0, 50) for _ in range(500)]
+    top = TopK(10, key=lambda x: (x,))
+    for x in items:
+        top.push(x)
+    assert top.items() == sorted(items)[:10]
+
+
+def test_transit_sort_ranks_every_candidate():
+    # the closest hotels are the most expensive ones: they must still win
+    res = _engine().run(_query(sort="transit", limit=3, max_calls=100))
+    assert [o.hotel_id for o in res.offers] == ["H29", "H28", "H27"]
+    assert res.complete and res.calls == len(HOTELS)
+
+
+def test_score_sort_uses_transit_of_every_offer():
+    res = _engine().run(_query(sort="score", limit=5, max_calls=100))
+    key = sort_key("score")
+    everything = _engine().run(_query(limit=100, enrich=True)).offers
+    assert [o.hotel_id for o in res.offers] == [o.hotel_id for o in sorted(everything, key=key)[:5]]
+
+
+def test_price_sort_and_budget():
+    res = _engine().run(_query(sort="price", limit=3, budget=150.0, max_calls=100))
+    assert [o.price_eur for o in res.offers] == [100.0, 110.0, 120.0]
+
+
+class _CountingSkip(SearchHook):
+    def __init__(self, skipped=("H01",)):
+        self.skipped = set(skipped)
+        self.asked = []
+
+    def skip(self, q, city_code, hotel_id):
+        self.asked.append(hotel_id)
+        return hotel_id in self.skipped
+
+
+def test_skip_is_asked_only_for_hotels_the_search_reaches():
+    hook = _CountingSkip()
+    res = SearchEngine(fetch=_fetch, enrichers=[], hooks=[hook], concurrency=4).run(_query(limit=3))
+    assert [o.hotel_id for o in res.offers] == ["H00", "H02", "H03"]
+    # one window of 4 fetched hotels (H01 skipped on the way), not all 30 candidates
+    assert hook.asked == ["H00", "H01", "H02", "H03", "H04"] and res.calls == 4
+
+
+def test_ranked_search_stops_asking_skip_at_the_call_budget():
+    hook = _CountingSkip()
+    engine = SearchEngine(fetch=_fetch, enrichers=[], hooks=[hook], concurrency=4)
+    res = engine.run(_query(sort="price", limit=3, max_calls=8))
+    assert res.calls == 8 and not res.complete
+    assert hook.asked == [f"H{i:02d}" for i in range(9)]
+    res = engine.run(_query(sort="price", limit=3, max_calls=100))
+    assert res.complete and res.calls == len(HOTELS) - 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
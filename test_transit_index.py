@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test the offline transit index (transit_index.py): KD-tree answers against brute force
+No GTFS feed needed: random stops around Bucharest, built and saved in a temp dir.
+"""
+
+import math
+import random
+import sys
+
+import pytest
+
+from transit_index import TransitIndex, walk_minutes
+
+EARTH_R = 6371008.8
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    h = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_R * math.asin(math.sqrt(h))
+
+
+def _stops(n, seed=3):
+    rng = random.Random(seed)
+    return [(f"S{i}", f"Stop {i}", 44.40 + rng.uniform(-0.08, 0.08), 26.10 + rng.uniform(-0.12, 0.12))
+            for i in range(n)]
+
+
+def _brute(stops, lat, lon, k, max_m):
+    d = sorted((_haversine(lat, lon, s[2], s[3]), s[0]) for s in stops)
+    return [(sid, m) for m, sid in d if m <= max_m][:k]
+
+
+@pytest.fixture(scope="module")
+def stops():
+    return _stops(2000)
+
+
+@pytest.fixture(scope="module")
+def index(stops):
+    return TransitIndex.build("bucharest", stops)
+
+
+@pytest.mark.parametrize("k, max_m", [(1, 5000.0), (3, 800.0), (10, 400.0), (5, 1.0)])
+def test_nearest_matches_brute_force(stops, index, k, max_m):
+    rng = random.Random(k)
+    for _ in range(100):
+        lat, lon = 44.40 + rng.uniform(-0.09, 0.09), 26.10 + rng.uniform(-0.13, 0.13)
+        got = index.nearest(lat, lon, k=k, max_m=max_m)
+        want = _brute(stops, lat, lon, k, max_m)
+        assert [s.stop_id for s in got] == [sid for sid, _ in want]
+        for s, (_, m) in zip(got, want):
+            assert abs(s.distance_m - m) < 0.5
+
+
+def test_save_load_roundtrip(tmp_path, stops):
+    idx = TransitIndex.build("bucharest", stops[:300])
+    path = tmp_path / "bucharest.idx"
+    idx.save(path)
+    back = TransitIndex.load(path)
+    assert back.city == "bucharest" and len(back) == 300 and back.ids == idx.ids
+    assert back.nearest(44.41, 26.11, k=4) == idx.nearest(44.41, 26.11, k=4)
+
+
+def test_covers_and_edge_cases():
+    idx = TransitIndex.build("t", [("A", "A", 44.4, 26.1), ("B", "B", 44.5, 26.2)])
+    assert idx.covers(44.45, 26.15) and not idx.covers(45.5, 26.15)
+    assert idx.nearest(44.4, 26.1, k=0) == []
+    assert [s.stop_id for s in idx.nearest(44.4, 26.1, k=5, max_m=20_000)] == ["A", "B"]
+    empty = TransitIndex.build("e", [])
+    assert len(empty) == 0 and empty.nearest(44.4, 26.1) == [] and not empty.covers(44.4, 26.1)
+    assert walk_minutes(0) == 1 and walk_minutes(800) == 13
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,253 @@
+# tracing.py — in-process spans, counters and latency histograms (no external collector)
+#
+#   with span("offers"):                      -> stage timing (+ errors on exception)
+#   with upstream("amadeus", "by_city"):      -> per upstream call timing, calls/errors counters
+#   record_cache("fx", hit=True)              -> cache hit/miss counters
+#   render_prometheus()                       -> text exposition for GET /metrics
+#   TracingMiddleware                         -> request histogram + optional Server-Timing header
+#
+# Metric names:
+#   stage_duration_seconds{stage}             histogram
+#   stage_errors_total{stage}                 counter
+#   upstream_duration_seconds{service,op}     histogram
+#   upstream_calls_total{service,op}          counter
+#   upstream_errors_total{service,op}         counter
+#   cache_requests_total{cache,result}        counter (result=hit|miss)
+#   http_request_duration_seconds{endpoint,method,status}  histogram
+
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0").lower() in ("1", "true", "yes")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+# ---------- metrics ----------
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str = ""):
+        self.name, self.help = name, help
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        k = _key(labels)
+        with self._lock:
+            self._values[k] = self._values.get(k, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_fmt_labels(k)} {v:g}" for k, v in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str = "", buckets=DEFAULT_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        k = _key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(k, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[i] += 1
+            total[0] += value
+
+    def count(self, **labels) -> int:
+        item = self._values.get(_key(labels))
+        return sum(item[0]) if item else 0
+
+    def render(self) -> List[str]:
+        out = []
+        with self._lock:
+            items = sorted((k, (list(c), s[0])) for k, (c, s) in self._values.items())
+        for k, (counts, total) in items:
+            running = 0
+            for bound, n in zip(self.buckets, counts):
+                running += n
+                out.append(f"{self.name}_bucket{_fmt_labels(k, ('le', f'{bound:g}'))} {running}")
+            running += counts[-1]
+            out.append(f"{self.name}_bucket{_fmt_labels(k, ('le', '+Inf'))} {running}")
+            out.append(f"{self.name}_sum{_fmt_labels(k)} {total:.6f}")
+            out.append(f"{self.name}_count{_fmt_labels(k)} {running}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, **kw):
+        m = self._metrics.get(name)
+        if m is None:
+            with self._lock:
+                m = self._metrics.get(name)
+                if m is None:
+                    m = cls(name, help, **kw)
+                    self._metrics[name] = m
+        return m
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._get(Counter, name, help)
+
+    def histogram(self, name: str, help: str = "", buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name in sorted(self._metrics):
+            m = self._metrics[name]
+            if m.help:
+                lines.append(f"# HELP {name} {m.help}")
+            lines.append(f"# TYPE {name} {m.kind}")
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+
+STAGE_SECONDS = histogram("stage_duration_seconds", "Search pipeline stage latency")
+STAGE_ERRORS = counter("stage_errors_total", "Search pipeline stages that raised")
+UPSTREAM_SECONDS = histogram("upstream_duration_seconds", "Latency of calls to external APIs")
+UPSTREAM_CALLS = counter("upstream_calls_total", "Calls to external APIs")
+UPSTREAM_ERRORS = counter("upstream_errors_total", "Calls to external APIs that raised")
+CACHE_REQUESTS = counter("cache_requests_total", "Cache lookups by result")
+HTTP_SECONDS = histogram("http_request_duration_seconds", "HTTP request latency")
+
+def render_prometheus() -> str:
+    return REGISTRY.render()
+
+
+# ---------- per-request trace (feeds Server-Timing) ----------
+# list of (name, seconds); mutable so spans recorded in threadpool workers
+# (which run with a copy of the request context) land in the same trace
+_trace: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = \
+    contextvars.ContextVar("trace", default=None)
+
+def start_trace() -> contextvars.Token:
+    return _trace.set([])
+
+def current_trace() -> Optional[List[Tuple[str, float]]]:
+    return _trace.get()
+
+def _record(name: str, seconds: float):
+    tr = _trace.get()
+    if tr is not None:
+        tr.append((name, seconds))
+
+@contextmanager
+def span(stage: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        dt = time.perf_counter() - t0
+        STAGE_SECONDS.observe(dt, stage=stage)
+        _record(stage, dt)
+
+@contextmanager
+def upstream(service: str, op: str):
+    UPSTREAM_CALLS.inc(service=service, op=op)
+    t0 = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        UPSTREAM_ERRORS.inc(service=service, op=op)
+        raise
+    finally:
+        dt = time.perf_counter() - t0
+        UPSTREAM_SECONDS.observe(dt, service=service, op=op)
+        _record(f"{service}.{op}", dt)
+
+def record_cache(namespace: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=namespace, result="hit" if hit else "miss")
+
+def server_timing_header(trace: List[Tuple[str, float]], total: Optional[float] = None) -> str:
+    """Aggregate spans by name: ``name;dur=ms;desc="xN"`` (N = number of calls)."""
+    agg: Dict[str, List[float]] = {}
+    for name, dt in trace:
+        a = agg.setdefault(name, [0.0, 0])
+        a[0] += dt
+        a[1] += 1
+    parts = []
+    for name, (dt, n) in agg.items():
+        token = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+        parts.append(f'{token};dur={dt * 1000:.1f}' + (f';desc="x{n}"' if n > 1 else ""))
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+# ---------- ASGI middleware ----------
+class TracingMiddleware:
+    """Times every request; adds Server-Timing when SERVER_TIMING=1."""
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = start_trace()
+        trace = current_trace()
+        t0 = time.perf_counter()
+        status_holder = {"status": 500}
+
+        async def wrapped_send(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+                if self.server_timing and trace is not None:
+                    headers = list(message.get("headers", []))
+                    value = server_timing_header(trace, time.perf_counter() - t0)
+                    headers.append((b"server-timing", value.encode("latin-1")))
+                    message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            endpoint = scope.get("endpoint")
+            name = getattr(endpoint, "__name__", None) or (type(endpoint).__name__ if endpoint else "unmatched")
+            HTTP_SECONDS.observe(time.perf_counter() - t0, endpoint=name,
+                                 method=scope.get("method", ""), status=status_holder["status"])
+            _trace.reset(token)
@@ -0,0 +1,370 @@
+# transit_index.py — offline nearest-station lookups from GTFS stops.txt
+#
+# Google Places answers "nearest transit stop" for every hotel, at a price. For the
+# cities we have GTFS feeds for (Bucharest STB/Metrorex, Budapest BKK, Copenhagen)
+# the stops are imported once into APP_DATA_DIR/transit/<city>.idx and queried in
+# process, with no network:
+#
+#   python transit_index.py import bucharest stb_gtfs.zip metrorex_gtfs.zip
+#   python transit_index.py query 44.4389 26.1170 --k 3
+#   python transit_index.py bench bucharest            # µs per lookup
+#
+#   from transit_index import nearest_stops, nearest_station
+#   nearest_stops(lat, lon, k=3, max_m=800)      -> [Stop(stop_id, name, lat, lon, distance_m)]
+#   nearest_stops_batch([(lat, lon), ...], k=1)  -> one list per point
+#   nearest_station(lat, lon)                    -> same dict as transport.cel_mai_apropiat_transport,
+#                                                   None (covered, nothing near) or MISSING (not covered:
+#                                                   use the Google path)
+#
+# Index layout: the stops are points on the unit sphere (x, y, z) kept in flat
+# array('d') columns, permuted into an implicit KD-tree: the node of range [lo, hi)
+# is the median at (lo + hi) // 2 with its split axis in `axes`. No node objects, so a
+# city of 10k stops is ~400 KB and loads in milliseconds. Chord length on the unit
+# sphere grows with great-circle distance, so Euclidean search gives true nearest stops.
+#
+# Config (env): APP_DATA_DIR, TRANSIT_INDEX_MAX_M, TRANSIT_WALK_M_PER_MIN
+
+from __future__ import annotations
+
+import csv
+import heapq
+import io
+import json
+import math
+import os
+import struct
+import sys
+import threading
+import time
+import zipfile
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from cache import MISSING
+from tracing import counter
+
+INDEX_DIR = Path(os.getenv("APP_DATA_DIR", "./app_data")) / "transit"
+TRANSIT_INDEX_MAX_M = float(os.getenv("TRANSIT_INDEX_MAX_M", "1000"))
+TRANSIT_WALK_M_PER_MIN = float(os.getenv("TRANSIT_WALK_M_PER_MIN", "80"))   # ~4.8 km/h
+WALK_DETOUR = 1.3  # streets are not straight lines
+
+TRANSIT_INDEX_LOOKUPS = counter("transit_index_lookups_total", "Offline transit lookups by outcome")
+
+EARTH_R = 6371008.8
+MAGIC = b"PE5T"
+VERSION = 1
+
+
+class Stop(NamedTuple):
+    stop_id: str
+    name: str
+    lat: float
+    lon: float
+    distance_m: float
+
+
+def _xyz(lat: float, lon: float) -> Tuple[float, float, float]:
+    la, lo = math.radians(lat), math.radians(lon)
+    c = math.cos(la)
+    return c * math.cos(lo), c * math.sin(lo), math.sin(la)
+
+def _chord(m: float) -> float:
+    """Great-circle metres -> chord length on the unit sphere."""
+    return 2.0 * math.sin(min(m / EARTH_R, math.pi) / 2.0)
+
+def _metres(chord: float) -> float:
+    return 2.0 * EARTH_R * math.asin(min(1.0, chord / 2.0))
+
+
+# ---------- index ----------
+class TransitIndex:
+    def __init__(self, city: str, ids: List[str], names: List[str], lat: array, lon: array,
+                 x: array, y: array, z: array, axes: array):
+        self.city = city
+        self.ids = ids
+        self.names = names
+        self.lat, self.lon = lat, lon
+        self.x, self.y, self.z = x, y, z
+        self.axes = axes
+        self.bbox = (min(lat), min(lon), max(lat), max(lon)) if len(lat) else (0.0, 0.0, 0.0, 0.0)
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ---------- build ----------
+    @classmethod
+    def build(cls, city: str, stops: Iterable[Tuple[str, str, float, float]]) -> "TransitIndex":
+        pts = [(sid, name, lat, lon, *_xyz(lat, lon)) for sid, name, lat, lon in stops]
+        n = len(pts)
+        axes = array("b", bytes(n))
+        order: List[int] = list(range(n))
+
+        # iterative median split; each node stores the axis with the largest spread
+        stack = [(0, n)]
+        while stack:
+            lo, hi = stack.pop()
+            if hi - lo <= 0:
+                continue
+            seg = order[lo:hi]
+            spreads = [max(pts[i][4 + a] for i in seg) - min(pts[i][4 + a] for i in seg) for a in range(3)]
+            axis = spreads.index(max(spreads))
+            seg.sort(key=lambda i: pts[i][4 + axis])
+            order[lo:hi] = seg
+            mid = (lo + hi) // 2
+            axes[mid] = axis
+            stack.append((lo, mid))
+            stack.append((mid + 1, hi))
+
+        col = lambda j: array("d", (pts[i][j] for i in order))
+        return cls(city, [pts[i][0] for i in order], [pts[i][1] for i in order],
+                   col(2), col(3), col(4), col(5), col(6), axes)
+
+    # ---------- queries ----------
+    def covers(self, lat: float, lon: float, margin_m: float = TRANSIT_INDEX_MAX_M) -> bool:
+        if not len(self):
+            return False
+        dlat = margin_m / 111_320.0
+        dlon = margin_m / (111_320.0 * max(0.01, math.cos(math.radians(lat))))
+        s, w, n, e = self.bbox
+        return s - dlat <= lat <= n + dlat and w - dlon <= lon <= e + dlon
+
+    def nearest(self, lat: float, lon: float, k: int = 1,
+                max_m: float = TRANSIT_INDEX_MAX_M) -> List[Stop]:
+        if not len(self) or k <= 0:
+            return []
+        q = _xyz(lat, lon)
+        limit = _chord(max_m) ** 2
+        best: List[Tuple[float, int]] = []    # max-heap of (-squared chord, index)
+        X, Y, Z, axes = self.x, self.y, self.z, self.axes
+        stack = [(0, len(self), 0.0)]   # (lo, hi, squared distance to the range's split plane)
+        while stack:
+            lo, hi, plane = stack.pop()
+            if lo >= hi or plane > (-best[0][0] if len(best) == k else limit):
+                continue
+            mid = (lo + hi) // 2
+            dx, dy, dz = X[mid] - q[0], Y[mid] - q[1], Z[mid] - q[2]
+            d2 = dx * dx + dy * dy + dz * dz
+            bound = -best[0][0] if len(best) == k else limit
+            if d2 <= bound:
+                if len(best) == k:
+                    heapq.heapreplace(best, (-d2, mid))
+                else:
+                    heapq.heappush(best, (-d2, mid))
+                bound = -best[0][0] if len(best) == k else limit
+            diff = (dx, dy, dz)[axes[mid]]
+            # diff > 0: query is on the low side of the split
+            near, far = ((lo, mid), (mid + 1, hi)) if diff > 0 else ((mid + 1, hi), (lo, mid))
+            if diff * diff <= bound:
+                stack.append((*far, diff * diff))
+            stack.append((*near, 0.0))   # popped first
+        best.sort(reverse=True)
+        return [Stop(self.ids[i], self.names[i], self.lat[i], self.lon[i], round(_metres(math.sqrt(-d)), 1))
+                for d, i in best]
+
+    # ---------- persistence ----------
+    def save(self, path: Path) -> int:
+        header = json.dumps({"city": self.city, "count": len(self), "ids": self.ids,
+                             "names": self.names, "built_at": time.time()},
+                            ensure_ascii=False).encode("utf-8")
+        body = b"".join(a.tobytes() for a in (self.lat, self.lon, self.x, self.y, self.z)) + self.axes.tobytes()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(MAGIC + struct.pack("<BI", VERSION, len(header)) + header + body)
+        tmp.replace(path)
+        return path.stat().st_size
+
+    @classmethod
+    def load(cls, path: Path) -> "TransitIndex":
+        data = path.read_bytes()
+        if data[:4] != MAGIC:
+            raise ValueError(f"{path}: not a transit index")
+        version, hlen = struct.unpack_from("<BI", data, 4)
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported version {version}")
+        off = 4 + struct.calcsize("<BI")
+        meta = json.loads(data[off:off + hlen].decode("utf-8"))
+        off += hlen
+        n = meta["count"]
+        cols = []
+        for _ in range(5):
+            a = array("d")
+            a.frombytes(data[off:off + 8 * n])
+            cols.append(a)
+            off += 8 * n
+        axes = array("b")
+        axes.frombytes(data[off:off + n])
+        return cls(meta["city"], meta["ids"], meta["names"], *cols, axes)
+
+
+# ---------- GTFS import ----------
+def read_gtfs_stops(feed: Path) -> List[Tuple[str, str, float, float]]:
+    """(stop_id, name, lat, lon) for stops and stations in a GTFS zip (or stops.txt).
+    Entrances, generic nodes and boarding areas (location_type 2-4) are skipped, and
+    platforms of the same station collapse to one entry per name within ~30 m."""
+    if zipfile.is_zipfile(feed):
+        with zipfile.ZipFile(feed) as z:
+            name = next((n for n in z.namelist() if n.rsplit("/", 1)[-1] == "stops.txt"), None)
+            if name is None:
+                raise ValueError(f"{feed}: no stops.txt")
+            text = z.read(name).decode("utf-8-sig")
+    else:
+        text = Path(feed).read_text(encoding="utf-8-sig")
+
+    out, seen = [], set()
+    for row in csv.DictReader(io.StringIO(text)):
+        if (row.get("location_type") or "0").strip() in ("2", "3", "4"):
+            continue
+        try:
+            lat, lon = float(row["stop_lat"]), float(row["stop_lon"])
+        except (KeyError, ValueError):
+            continue
+        name = (row.get("stop_name") or "").strip() or row.get("stop_id", "")
+        key = (name.casefold(), round(lat, 3), round(lon, 3))
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append((f"{feed.stem}:{row.get('stop_id', '')}", name, lat, lon))
+    return out
+
+def import_gtfs(city: str, feeds: Sequence[Path], index_dir: Path = INDEX_DIR) -> Dict[str, object]:
+    stops: List[Tuple[str, str, float, float]] = []
+    for feed in feeds:
+        stops.extend(read_gtfs_stops(Path(feed)))
+    t0 = time.perf_counter()
+    idx = TransitIndex.build(city.casefold(), stops)
+    size = idx.save(index_dir / f"{city.casefold()}.idx")
+    _registry.reload()
+    return {"city": idx.city, "stops": len(idx), "bytes": size,
+            "build_s": round(time.perf_counter() - t0, 3)}
+
+
+# ---------- registry ----------
+class _Registry:
+    def __init__(self, index_dir: Path = INDEX_DIR):
+        self.index_dir = index_dir
+        self._indexes: Optional[List[TransitIndex]] = None
+        self._lock = threading.Lock()
+
+    def indexes(self) -> List[TransitIndex]:
+        if self._indexes is None:
+            with self._lock:
+                if self._indexes is None:
+                    loaded = []
+                    for p in sorted(self.index_dir.glob("*.idx")) if self.index_dir.exists() else []:
+                        try:
+                            loaded.append(TransitIndex.load(p))
+                        except (OSError, ValueError):
+                            continue
+                    self._indexes = loaded
+        return self._indexes
+
+    def reload(self):
+        with self._lock:
+            self._indexes = None
+
+    def for_point(self, lat: float, lon: float, max_m: float) -> Optional[TransitIndex]:
+        for idx in self.indexes():
+            if idx.covers(lat, lon, max_m):
+                return idx
+        return None
+
+_registry = _Registry()
+
+def cities() -> List[str]:
+    return [idx.city for idx in _registry.indexes()]
+
+def covered(lat: float, lon: float, max_m: float = TRANSIT_INDEX_MAX_M) -> bool:
+    return _registry.for_point(lat, lon, max_m) is not None
+
+def nearest_stops(lat: float, lon: float, k: int = 1, max_m: float = TRANSIT_INDEX_MAX_M) -> List[Stop]:
+    """Up to ``k`` stops within ``max_m`` metres, nearest first ([] if not covered)."""
+    idx = _registry.for_point(lat, lon, max_m)
+    return idx.nearest(lat, lon, k, max_m) if idx else []
+
+def nearest_stops_batch(points: Iterable[Tuple[float, float]], k: int = 1,
+                        max_m: float = TRANSIT_INDEX_MAX_M) -> List[List[Stop]]:
+    """nearest_stops for many hotels; consecutive points in the same city reuse the lookup."""
+    out: List[List[Stop]] = []
+    idx: Optional[TransitIndex] = None
+    for lat, lon in points:
+        if idx is None or not idx.covers(lat, lon, max_m):
+            idx = _registry.for_point(lat, lon, max_m)
+        out.append(idx.nearest(lat, lon, k, max_m) if idx else [])
+    return out
+
+def walk_minutes(distance_m: float) -> int:
+    return max(1, math.ceil(distance_m * WALK_DETOUR / TRANSIT_WALK_M_PER_MIN))
+
+def nearest_station(lat, lon, max_m: float = TRANSIT_INDEX_MAX_M):
+    """transport.py-shaped answer from the offline index; MISSING when the point is
+    outside every indexed city (the caller falls back to Google)."""
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return MISSING
+    idx = _registry.for_point(lat, lon, max_m)
+    if idx is None:
+        TRANSIT_INDEX_LOOKUPS.inc(outcome="uncovered")
+        return MISSING
+    found = idx.nearest(lat, lon, 1, max_m)
+    TRANSIT_INDEX_LOOKUPS.inc(city=idx.city, outcome="hit" if found else "none")
+    if not found:
+        return None
+    s = found[0]
+    return {
+        "station_name": s.name,
+        "distance": f"{s.distance_m / 1000:.1f} km" if s.distance_m >= 1000 else f"{int(round(s.distance_m))} m",
+        "duration": f"{walk_minutes(s.distance_m)} mins",
+        "latitude": s.lat,
+        "longitude": s.lon,
+        "source": "gtfs",
+    }
+
+
+# ---------- CLI ----------
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description="GTFS transit stop index")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("import", help="build <city>.idx from GTFS zips / stops.txt")
+    p.add_argument("city")
+    p.add_argument("feeds", nargs="+", type=Path)
+    p = sub.add_parser("query", help="nearest stops to a point")
+    p.add_argument("lat", type=float)
+    p.add_argument("lon", type=float)
+    p.add_argument("--k", type=int, default=3)
+    p.add_argument("--max-m", type=float, default=TRANSIT_INDEX_MAX_M)
+    p = sub.add_parser("bench", help="time random lookups inside a city's bounding box")
+    p.add_argument("city")
+    p.add_argument("--n", type=int, default=10000)
+    sub.add_parser("list", help="indexed cities")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "import":
+        print(json.dumps(import_gtfs(args.city, args.feeds)))
+    elif args.cmd == "query":
+        for s in nearest_stops(args.lat, args.lon, args.k, args.max_m):
+            print(f"{s.distance_m:>8.1f} m  {s.name}  ({s.lat:.5f}, {s.lon:.5f})  {s.stop_id}")
+    elif args.cmd == "list":
+        for idx in _registry.indexes():
+            print(f"{idx.city:<16} {len(idx):>7} stops  bbox={tuple(round(v, 4) for v in idx.bbox)}")
+    elif args.cmd == "bench":
+        import random
+
+        idx = next((i for i in _registry.indexes() if i.city == args.city.casefold()), None)
+        if idx is None:
+            print(f"no index for {args.city}")
+            return 1
+        s, w, n, e = idx.bbox
+        pts = [(random.uniform(s, n), random.uniform(w, e)) for _ in range(args.n)]
+        t0 = time.perf_counter()
+        hits = sum(1 for lat, lon in pts if idx.nearest(lat, lon, 1))
+        dt = time.perf_counter() - t0
+        print(f"{args.city}: {len(idx)} stops, {args.n} lookups, {dt / args.n * 1e6:.1f} µs each, "
+              f"{hits} within {TRANSIT_INDEX_MAX_M:g} m")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,48 @@
 
 #PROGRAM PENTRU A AFLA CEL MAI APROPIAT MIJLOC DE TRANSPORT
 
-import googlemaps
 import os
 from dotenv import load_dotenv
+from cache import MISSING, cached, coord_key
+from tracing import upstream
+from providers import get_provider
+from applog import HOT_SAMPLE, get_logger
+from transit_index import nearest_station
 
 load_dotenv()
+log = get_logger(__name__)
 
-gmaps = googlemaps.Client(key=os.getenv("GOOGLE_MAPS_API_KEY"))
+# clientul Google Maps se face la prima cerere (providers.py), nu la import
+def __getattr__(name):
+    if name == "gmaps":
+        return get_provider("gmaps")
+    raise AttributeError(f"module 'transport' has no attribute {name!r}")
+
+# statiile nu se muta des: tinem rezultatul o saptamana (secunde)
+TRANSIT_CACHE_TTL = int(os.getenv("TRANSIT_CACHE_TTL", str(7 * 24 * 3600)))
 
 def cel_mai_apropiat_transport(lat, lon):
-    
-    results = gmaps.places_nearby(
-        location=(lat, lon),
-        radius=1000,
-        type="transit_station"  
-    )
+    # orasele cu GTFS importat (transit_index.py) se rezolva local, fara Google
+    info = nearest_station(lat, lon)
+    if info is MISSING:
+        info = _statie_apropiata(lat, lon)
+    # se apeleaza pentru fiecare hotel: logam doar un esantion (LOG_HOT_SAMPLE)
+    if info:
+        log.info("transit_found", extra={"station": info["station_name"], "distance": info["distance"],
+                                         "duration": info["duration"], "sample": HOT_SAMPLE})
+    else:
+        log.info("transit_none_nearby", extra={"lat": lat, "lon": lon, "sample": HOT_SAMPLE})
+    return info
+
+@cached("transit_places", ttl=TRANSIT_CACHE_TTL, key=coord_key)
+def _statie_apropiata(lat, lon):
+    gmaps = get_provider("gmaps")
+    with upstream("google", "places_nearby"):
+        results = gmaps.places_nearby(
+            location=(lat, lon),
+            radius=1000,
+            type="transit_station"  
+        )
 
     if results.get("results"):
         cea_mai_apropiata = results["results"][0]
@@ -23,14 +50,18 @@ def cel_mai_apropiat_transport(lat, lon):
         coord = cea_mai_apropiata["geometry"]["location"]
         cd = (coord['lat'], coord['lng']) #coordonate destinatie
         ch = (lat, lon) #coordonate hotel
-        result = gmaps.distance_matrix(origins=[ch], destinations=[cd], mode="walking")
+        with upstream("google", "distance_matrix"):
+            result = gmaps.distance_matrix(origins=[ch], destinations=[cd], mode="walking")
         distance = result["rows"][0]["elements"][0]["distance"]["text"]
         duration = result["rows"][0]["elements"][0]["duration"]["text"]
-        print(f"🚏 Cea mai apropiată stație: {nume}")
-        print(f"Distanta este {distance}. Timpul estimat este {duration}")
-        
-    else:
-        print("Nu am găsit stații de transport în apropiere.")
+        return {
+            "station_name": nume,
+            "distance": distance,
+            "duration": duration,
+            "latitude": cd[0],
+            "longitude": cd[1],
+        }
+    return None
 
 
 #cel_mai_apropiat_transport(48.8566, 2.3522)  # coordonate pentru Paris
@@ -0,0 +1,351 @@
+# upstream_sim.py — deterministic offline stand-in for Amadeus, Google Maps and open.er-api
+#
+# Synthetic fixtures are generated from (seed, city, hotel id, dates), so two runs with the
+# same SimConfig see exactly the same hotels, prices, stations and failures.
+#
+#   sim = UpstreamSimulator(SimConfig(latency_ms=40, error_rate=0.02, seed=7))
+#   with sim.installed():            # patches requests + the SDK clients used by the backend
+#       import server                # no keys, no network
+#       ...
+#   sim.calls                        # {("amadeus", "hotel_offers_search"): 120, ...}
+#
+# Covered endpoints:
+#   amadeus  reference_data.locations.get, reference_data.locations.hotels.by_city.get,
+#            shopping.hotel_offers_search.get
+#   google   places_nearby, distance_matrix (googlemaps client),
+#            POST places:searchNearby (Places API new), GET geocode/json
+#   fx       GET open.er-api.com/v6/latest/<CUR>
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+try:
+    from amadeus import ResponseError as _AmadeusResponseError  # type: ignore
+except Exception:
+    _AmadeusResponseError = Exception  # type: ignore
+
+
+class SimulatedUpstreamError(_AmadeusResponseError):  # type: ignore[misc,valid-type]
+    """Injected failure; an amadeus.ResponseError when the SDK is installed so
+    the backend's ``except ResponseError`` branches are exercised too."""
+
+    def __init__(self, service: str, op: str):
+        Exception.__init__(self, f"simulated {service}.{op} failure")
+        self.service, self.op = service, op
+        self.response = None
+
+
+# city code -> (name, lat, lon, local currency)
+CITIES: Dict[str, Tuple[str, float, float, str]] = {
+    "BUH": ("Bucharest", 44.4268, 26.1025, "RON"),
+    "BUD": ("Budapest", 47.4979, 19.0402, "HUF"),
+    "CPH": ("Copenhagen", 55.6761, 12.5683, "DKK"),
+    "PAR": ("Paris", 48.8566, 2.3522, "EUR"),
+    "LON": ("London", 51.5074, -0.1278, "GBP"),
+    "VIE": ("Vienna", 48.2082, 16.3738, "EUR"),
+    "PRG": ("Prague", 50.0755, 14.4378, "CZK"),
+    "WAW": ("Warsaw", 52.2297, 21.0122, "PLN"),
+}
+
+# 1 unit of currency in EUR
+FX_TO_EUR = {"EUR": 1.0, "RON": 0.201, "HUF": 0.00253, "DKK": 0.134, "GBP": 1.17,
+             "CZK": 0.0398, "PLN": 0.232, "USD": 0.92}
+
+STATION_TYPES = ("subway_station", "bus_station", "train_station", "transit_station")
+
+
+@dataclass
+class SimConfig:
+    seed: int = 1
+    latency_ms: float = 0.0            # mean injected latency per call
+    latency_jitter: float = 0.5        # +- fraction of latency_ms (uniform)
+    error_rate: float = 0.0            # probability that a call fails
+    hotels_per_city: int = 50
+    availability: float = 0.6          # share of hotels with an offer for given dates
+    # per-service overrides, e.g. {"amadeus": 250.0}
+    service_latency_ms: Dict[str, float] = field(default_factory=dict)
+    service_error_rate: Dict[str, float] = field(default_factory=dict)
+
+
+def _unit(*parts) -> float:
+    """Deterministic float in [0, 1) from the given parts."""
+    h = hashlib.blake2b("|".join(str(p) for p in parts).encode(), digest_size=8).digest()
+    return int.from_bytes(h, "big") / 2 ** 64
+
+
+class _Obj:
+    def __init__(self, **kw):
+        self.__dict__.update(kw)
+
+
+class _HTTPResponse:
+    def __init__(self, status_code: int, payload: Any):
+        self.status_code = status_code
+        self._payload = payload
+        self.text = json.dumps(payload)
+        self.ok = 200 <= status_code < 400
+
+    def json(self):
+        return self._payload
+
+
+class UpstreamSimulator:
+    def __init__(self, config: Optional[SimConfig] = None):
+        self.config = config or SimConfig()
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self._seen: Counter = Counter()
+        self._lock = threading.Lock()
+        self.amadeus = self._build_amadeus()
+        self.gmaps = _Obj(places_nearby=self._places_nearby, distance_matrix=self._distance_matrix)
+
+    # ---------- call accounting / injection ----------
+    def _call(self, service: str, op: str, key: Any = ""):
+        # latency/failure depend on (request, n-th time it was seen), not on thread
+        # interleaving, so concurrent runs inject the same faults into the same calls
+        cfg = self.config
+        with self._lock:
+            self.calls[(service, op)] += 1
+            self._seen[(service, op, key)] += 1
+            n = self._seen[(service, op, key)]
+        r_lat = _unit(cfg.seed, service, op, key, n, "latency")
+        r_err = _unit(cfg.seed, service, op, key, n, "error")
+        mean = cfg.service_latency_ms.get(service, cfg.latency_ms)
+        if mean > 0:
+            time.sleep(max(0.0, mean * (1 + cfg.latency_jitter * (2 * r_lat - 1))) / 1000.0)
+        if r_err < cfg.service_error_rate.get(service, cfg.error_rate):
+            with self._lock:
+                self.errors[(service, op)] += 1
+            raise SimulatedUpstreamError(service, op)
+
+    def reset_counts(self):
+        with self._lock:
+            self.calls.clear()
+            self.errors.clear()
+            self._seen.clear()
+
+    # ---------- fixtures ----------
+    def hotels(self, city_code: str) -> List[Dict[str, Any]]:
+        name, lat, lon, _ = CITIES[city_code]
+        out = []
+        for i in range(self.config.hotels_per_city):
+            hid = f"SI{city_code}{i:03d}"
+            # spread hotels over ~6 km around the centre
+            r = 0.05 * math.sqrt(_unit(self.config.seed, hid, "r"))
+            a = 2 * math.pi * _unit(self.config.seed, hid, "a")
+            out.append({
+                "chainCode": "SI",
+                "iataCode": city_code,
+                "hotelId": hid,
+                "name": f"{name} Sim Hotel {i}",
+                "geoCode": {"latitude": round(lat + r * math.cos(a), 5),
+                            "longitude": round(lon + r * math.sin(a), 5)},
+            })
+        return out
+
+    def _hotel(self, hotel_id: str) -> Optional[Dict[str, Any]]:
+        code = hotel_id[2:5]
+        if code not in CITIES or not hotel_id[5:].isdigit():
+            return None
+        i = int(hotel_id[5:])
+        if i >= self.config.hotels_per_city:
+            return None
+        return self.hotels(code)[i]
+
+    def offer(self, hotel_id: str, check_in: str, check_out: str, adults: int) -> Optional[Dict[str, Any]]:
+        hotel = self._hotel(hotel_id)
+        if hotel is None:
+            return None
+        if _unit(self.config.seed, hotel_id, check_in, check_out, "avail") >= self.config.availability:
+            return None
+        from datetime import date
+        nights = max(1, (date.fromisoformat(check_out) - date.fromisoformat(check_in)).days)
+        currency = CITIES[hotel["iataCode"]][3]
+        per_night_eur = 45 + 260 * _unit(self.config.seed, hotel_id, "price") ** 2
+        per_night_eur *= 1 + 0.15 * (_unit(self.config.seed, hotel_id, check_in) - 0.5)
+        total = per_night_eur * nights * (1 + 0.25 * (max(1, int(adults)) - 1)) / FX_TO_EUR[currency]
+        rating = 1 + int(5 * _unit(self.config.seed, hotel_id, "rating"))
+        return {
+            "type": "hotel-offers",
+            "hotel": dict(hotel, rating=str(min(5, rating)), cityCode=hotel["iataCode"]),
+            "available": True,
+            "offers": [{
+                "id": hashlib.md5(f"{hotel_id}{check_in}{check_out}".encode()).hexdigest()[:10].upper(),
+                "checkInDate": check_in,
+                "checkOutDate": check_out,
+                "price": {"currency": currency, "total": f"{total:.2f}"},
+            }],
+        }
+
+    def station(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
+        if _unit(self.config.seed, round(lat, 4), round(lon, 4), "nostation") < 0.05:
+            return None
+        d_lat = (_unit(self.config.seed, lat, lon, "dlat") - 0.5) * 0.012
+        d_lon = (_unit(self.config.seed, lat, lon, "dlon") - 0.5) * 0.012
+        kind = STATION_TYPES[int(_unit(self.config.seed, lat, lon, "kind") * len(STATION_TYPES))]
+        number = int(1000 * _unit(self.config.seed, round(lat, 3), round(lon, 3), "name"))
+        return {"name": f"Sim {kind.split('_')[0].title()} {number}",
+                "lat": round(lat + d_lat, 6), "lng": round(lon + d_lon, 6), "type": kind}
+
+    # ---------- Amadeus SDK surface ----------
+    def _build_amadeus(self):
+        sim = self
+
+        def locations_get(keyword=None, subType=None, **_):
+            sim._call("amadeus", "locations", keyword)
+            key = (keyword or "").strip().casefold()
+            data = [{"type": "location", "subType": "CITY", "name": n.upper(), "iataCode": code}
+                    for code, (n, *_rest) in CITIES.items() if n.casefold().startswith(key)]
+            return _Obj(data=data, result={"data": data})
+
+        def by_city_get(cityCode=None, **_):
+            sim._call("amadeus", "hotels_by_city", cityCode)
+            data = sim.hotels(cityCode) if cityCode in CITIES else []
+            return _Obj(data=data, result={"data": data})
+
+        def offers_get(hotelIds=None, checkInDate=None, checkOutDate=None, adults=1, **_):
+            ids = hotelIds.split(",") if isinstance(hotelIds, str) else list(hotelIds or [])
+            sim._call("amadeus", "hotel_offers_search", (",".join(ids), checkInDate, checkOutDate, adults))
+            data = [o for o in (sim.offer(h, checkInDate, checkOutDate, adults) for h in ids) if o]
+            return _Obj(data=data, result={"data": data})
+
+        return _Obj(
+            reference_data=_Obj(locations=_Obj(get=locations_get, hotels=_Obj(by_city=_Obj(get=by_city_get)))),
+            shopping=_Obj(hotel_offers_search=_Obj(get=offers_get)),
+        )
+
+    def amadeus_client_factory(self, *args, **kwargs):
+        """Drop-in for amadeus.Client(...) (app/main.py builds one per hotel)."""
+        return self.amadeus
+
+    # ---------- googlemaps client surface ----------
+    def _places_nearby(self, location=None, radius=1000, type=None, **_):
+        self._call("google", "places_nearby", tuple(location))
+        st = self.station(*location)
+        if not st:
+            return {"results": [], "status": "ZERO_RESULTS"}
+        return {"results": [{"name": st["name"], "types": [st["type"]],
+                             "geometry": {"location": {"lat": st["lat"], "lng": st["lng"]}}}],
+                "status": "OK"}
+
+    def _distance_matrix(self, origins=None, destinations=None, mode="walking", **_):
+        (lat1, lon1), (lat2, lon2) = origins[0], destinations[0]
+        self._call("google", "distance_matrix", (lat1, lon1, lat2, lon2))
+        meters = _haversine_m(lat1, lon1, lat2, lon2) * 1.3
+        minutes = max(1, round(meters / 80))
+        return {"rows": [{"elements": [{
+            "status": "OK",
+            "distance": {"text": f"{meters / 1000:.1f} km", "value": int(meters)},
+            "duration": {"text": f"{minutes} min" if minutes == 1 else f"{minutes} mins", "value": minutes * 60},
+        }]}], "status": "OK"}
+
+    # ---------- plain HTTP (requests.get / requests.post) ----------
+    def http(self, method: str, url: str, params=None, json=None, **_):
+        u = urlparse(url)
+        try:
+            if u.netloc == "open.er-api.com":
+                cur = u.path.rstrip("/").rsplit("/", 1)[-1].upper()
+                self._call("fx", "latest", cur)
+                if cur not in FX_TO_EUR:
+                    return _HTTPResponse(200, {"result": "error", "error-type": "unsupported-code"})
+                base = FX_TO_EUR[cur]
+                rates = {c: round(base / v, 6) for c, v in FX_TO_EUR.items()}
+                return _HTTPResponse(200, {"result": "success", "base_code": cur, "rates": rates})
+            if u.netloc == "places.googleapis.com":
+                c = json["locationRestriction"]["circle"]["center"]
+                self._call("google", "places_search_nearby", (c["latitude"], c["longitude"]))
+                st = self.station(c["latitude"], c["longitude"])
+                places = [] if not st else [{
+                    "displayName": {"text": st["name"], "languageCode": "en"},
+                    "location": {"latitude": st["lat"], "longitude": st["lng"]},
+                    "primaryType": st["type"], "types": [st["type"], "point_of_interest"],
+                }]
+                return _HTTPResponse(200, {"places": places} if places else {})
+            if u.netloc == "maps.googleapis.com" and u.path.endswith("/geocode/json"):
+                lat, lon = (float(x) for x in params["latlng"].split(","))
+                self._call("google", "geocode", (lat, lon))
+                st = self.station(lat, lon)
+                results = [] if not st else [{"formatted_address": st["name"],
+                                              "geometry": {"location": {"lat": st["lat"], "lng": st["lng"]}}}]
+                return _HTTPResponse(200, {"results": results, "status": "OK" if results else "ZERO_RESULTS"})
+        except SimulatedUpstreamError:
+            return _HTTPResponse(503, {"error": "simulated upstream failure"})
+        raise RuntimeError(f"upstream_sim: unexpected outbound {method} {url}")
+
+    # ---------- patching ----------
+    @contextlib.contextmanager
+    def installed(self):
+        """Route every outbound call of the backend modules to this simulator.
+
+        Patches ``requests.get/post`` and ``amadeus.Client`` first (so importing
+        schimb_euro/baza inside the block stays offline), sets dummy API keys,
+        then points the lazy clients in providers.py at the simulator.
+        """
+        patches: List[Tuple[Any, str, Any]] = []
+
+        def patch(obj, name, value):
+            patches.append((obj, name, getattr(obj, name, None)))
+            setattr(obj, name, value)
+
+        env = {"AMADEUS_CLIENT_ID": "sim", "AMADEUS_CLIENT_SECRET": "sim",
+               "GOOGLE_MAPS_API_KEY": "AIzaSimulatedKey000000000000000000000"}
+        old_env = {k: os.environ.get(k) for k in env}
+        os.environ.update(env)
+
+        import requests  # type: ignore
+        patch(requests, "get", lambda url, **kw: self.http("GET", url, **kw))
+        patch(requests, "post", lambda url, **kw: self.http("POST", url, **kw))
+        try:
+            import amadeus  # type: ignore
+            patch(amadeus, "Client", self.amadeus_client_factory)
+        except ImportError:
+            pass
+        try:
+            import googlemaps  # type: ignore
+            patch(googlemaps, "Client", lambda *a, **kw: self.gmaps)
+        except ImportError:
+            pass
+
+        self._patch_loaded_modules(patch)
+        self._patch_target = patch
+        try:
+            yield self
+        finally:
+            for obj, name, old in reversed(patches):
+                setattr(obj, name, old)
+            import providers
+            providers.reset("amadeus")  # rebuilt lazily with the real SDK next time
+            providers.reset("gmaps")
+            for k, v in old_env.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+
+    def _patch_loaded_modules(self, patch):
+        # baza / transport / new_transport get their clients from providers.py
+        import providers
+        providers.override("amadeus", self.amadeus)
+        providers.override("gmaps", self.gmaps)
+
+    def patch_loaded_modules(self):
+        """Call again after importing backend modules inside ``installed()``."""
+        self._patch_loaded_modules(self._patch_target)
+
+
+def _haversine_m(lat1, lon1, lat2, lon2) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(a))